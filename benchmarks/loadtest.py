@@ -0,0 +1,158 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import json
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+
+from benchmarks.stubs import CoinGeckoStub, Faults, PostgRESTStub
+
+
+# ==============================
+#  HARNESS
+# ==============================
+def _timed(fn, *args, **kwargs):
+    t0 = time.perf_counter()
+    try:
+        return fn(*args, **kwargs), time.perf_counter() - t0, None
+    except Exception as e:  # błąd warstwy danych liczony w raporcie zamiast przerywać test
+        return None, time.perf_counter() - t0, str(e)
+
+
+@contextmanager
+def _patched(module, **attrs):
+    """Podmienia atrybuty modułu na czas testu (jak monkeypatch w testach)."""
+    old = {k: getattr(module, k) for k in attrs}
+    for k, v in attrs.items():
+        setattr(module, k, v)
+    try:
+        yield module
+    finally:
+        for k, v in old.items():
+            setattr(module, k, v)
+
+
+def _latency(samples) -> dict:
+    lat = np.array(samples) * 1000
+    if not len(lat):
+        return {}
+    return {f"p{q}_ms": round(float(np.percentile(lat, q)), 2) for q in (50, 95, 99)}
+
+
+def run_load_test(coins=50, days=365, rounds=3, rate_per_min=6000, fetch_workers=8,
+                  cg_faults=None, rest_faults=None, max_rows=1000, page_size=None):
+    """
+    Uruchamia ETL (fetch_data → insert_data → refresh_coins) i warstwę danych
+    dashboardu na lokalnych zamiennikach CoinGecko/PostgREST. Zwraca raport.
+    """
+    os.environ.setdefault("DB_BACKEND", "supabase")
+    from db import db
+    from etl import fetch_data as fd
+
+    if db.DB_BACKEND != "supabase":
+        raise RuntimeError(f"❌ Test obciążeniowy wymaga DB_BACKEND=supabase (jest {db.DB_BACKEND!r}).")
+
+    cg = CoinGeckoStub(faults=cg_faults).start()
+    rest = PostgRESTStub(faults=rest_faults, max_rows=max_rows).start()
+    coin_ids = [f"coin{i:04d}" for i in range(coins)]
+    report = {"config": {"coins": coins, "days": days, "rounds": rounds, "max_rows": max_rows}}
+    # adresy i klucz podmieniane w już zaimportowanych modułach – nic nie trafia
+    # do prawdziwego Supabase ani CoinGecko z etl/.env, bez względu na kolejność importów
+    stub_headers = {**db.HEADERS, "apikey": "stub", "Authorization": "Bearer stub"}
+    patches = ExitStack()
+    patches.enter_context(_patched(db, SUPABASE_URL=rest.url, HEADERS=stub_headers,
+                                   PAGE_SIZE=page_size or db.PAGE_SIZE))
+    patches.enter_context(_patched(fd, COINGECKO_BASE=cg.url + "/api/v3/", RESPONSE_CACHE=None,
+                                   LOCAL_MIRROR=False))
+    try:
+        # --- ETL ---
+        t0 = time.perf_counter()
+        batch = fd.fetch_data(coin_ids, days_back=days, max_workers=fetch_workers, rate_per_min=rate_per_min)
+        etl_s = time.perf_counter() - t0
+        report["etl"] = {
+            "rows": len(batch),
+            "seconds": round(etl_s, 3),
+            "rows_per_s": round(len(batch) / etl_s) if etl_s else None,
+            "stored_rows": len(rest.tables.get("crypto_prices", {})),
+        }
+
+        # --- warstwa danych dashboardu ---
+        end = datetime.now(timezone.utc)
+        start = end - timedelta(days=days)
+        calls = {"list_coins": [], "get_history_all": [], "get_history": [], "get_kpis": []}
+        errors, rows_read = [], 0
+        t0 = time.perf_counter()
+        for r in range(rounds):
+            for name, fn, args in (
+                ("list_coins", db.list_coins, ()),
+                ("get_history_all", db.get_history_all, (start, end)),
+                ("get_history", db.get_history, (coin_ids[r % coins], start, end)),
+                ("get_kpis", db.get_kpis, (coin_ids, end)),
+            ):
+                out, seconds, err = _timed(fn, *args)
+                calls[name].append(seconds)
+                if err:
+                    errors.append(f"{name}: {err}")
+                elif out is not None and hasattr(out, "__len__"):
+                    rows_read += len(out)
+        read_s = time.perf_counter() - t0
+        report["dashboard"] = {
+            "seconds": round(read_s, 3),
+            "rows_read": rows_read,
+            "rows_per_s": round(rows_read / read_s) if read_s else None,
+            "calls": {k: _latency(v) for k, v in calls.items()},
+            "errors": errors,
+        }
+    finally:
+        patches.close()
+        cg.stop()
+        rest.stop()
+
+    # ponowienia klienta = odpowiedzi 429/5xx wstrzyknięte przez serwery
+    report["coingecko"] = cg.stats.summary()
+    report["postgrest"] = rest.stats.summary()
+    report["retries"] = {
+        "coingecko": report["coingecko"]["injected_429"] + report["coingecko"]["injected_5xx"],
+        "postgrest": report["postgrest"]["injected_429"] + report["postgrest"]["injected_5xx"],
+    }
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test obciążeniowy ETL i dashboardu na lokalnych zamiennikach API.")
+    parser.add_argument("--coins", type=int, default=50)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--rounds", type=int, default=3, help="powtórzenia zapytań dashboardu")
+    parser.add_argument("--rate", type=float, default=6000, help="limit zapytań CoinGecko na minutę")
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--jitter-ms", type=float, default=30)
+    parser.add_argument("--p429", type=float, default=0.02, help="udział odpowiedzi 429 (CoinGecko)")
+    parser.add_argument("--p5xx", type=float, default=0.01, help="udział odpowiedzi 5xx")
+    parser.add_argument("--rest-faults", choices=["none", "writes", "all"], default="writes",
+                        help="gdzie wstrzykiwać błędy PostgREST (odczyty nie mają ponowień)")
+    parser.add_argument("--max-rows", type=int, default=1000, help="max-rows PostgREST na stronę")
+    parser.add_argument("--out", default=None, help="zapisz raport do pliku JSON")
+    args = parser.parse_args()
+
+    cg_faults = Faults(args.latency_ms, args.jitter_ms, args.p429, args.p5xx, retry_after=1, seed=1)
+    rest_faults = Faults(
+        args.latency_ms, args.jitter_ms,
+        p429=0.0 if args.rest_faults == "none" else args.p429,
+        p5xx=0.0 if args.rest_faults == "none" else args.p5xx,
+        methods=("POST",) if args.rest_faults == "writes" else None, seed=2,
+    )
+    report = run_load_test(args.coins, args.days, args.rounds, args.rate,
+                           cg_faults=cg_faults, rest_faults=rest_faults, max_rows=args.max_rows)
+    print(json.dumps(report, indent=2))
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Raport zapisany do {args.out}")
@@ -0,0 +1,178 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from benchmarks import synthetic
+from dashboard.downsample import downsample
+from db.db import frame_to_records
+from etl import fetch_data as fd
+from etl import transform_data as td
+from etl.analytics import Analysis
+from etl.correlation import corr_blocked
+from etl.indicators import compute_indicators
+from etl.rollups import compute_rollups
+
+# Skale: od obecnych 9 monet dziennie do 1000 monet z danymi minutowymi
+PRESETS = {
+    "daily9":     {"coins": 9,    "points": 365,   "freq": "D"},
+    "daily1000":  {"coins": 1000, "points": 365,   "freq": "D"},
+    "hourly100":  {"coins": 100,  "points": 2160,  "freq": "h"},
+    "minute9":    {"coins": 9,    "points": 10080, "freq": "min"},
+    "minute1000": {"coins": 1000, "points": 1440,  "freq": "min"},
+}
+
+# domyślny próg regresji względem zapisanego wyniku (--baseline)
+TOLERANCE = float(os.getenv("BENCH_TOLERANCE", "0.25"))
+
+
+# ==============================
+#  MEASURE
+# ==============================
+def measure(fn, rows: int, repeat: int = 3) -> dict:
+    """Najlepszy czas z `repeat` przebiegów, przepustowość i szczyt pamięci (tracemalloc, osobny przebieg)."""
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best = min(times)
+    return {
+        "rows": rows,
+        "best_s": round(best, 6),
+        "median_s": round(float(np.median(times)), 6),
+        "rows_per_s": round(rows / best) if best > 0 else None,
+        "peak_mb": round(peak / 2**20, 2),
+    }
+
+
+# ==============================
+#  CASES
+# ==============================
+def _pandas_dashboard(hist):
+    """Dawna ścieżka dashboardu: pivot → index 100 / pct_change → corr / cumprod."""
+    wide = hist.pivot_table(index="ts", columns="coin_id", values="price")
+    norm = wide / wide.bfill().iloc[0] * 100
+    rets = wide.pct_change()
+    return norm, rets.corr(), (1 + rets).cumprod() - 1
+
+
+def _analysis_dashboard(hist):
+    a = Analysis(hist)
+    return a.index100_long(), a.corr(), a.cum_returns_long()
+
+
+def _parse_payloads(payloads):
+    frames = [fd._frame_from_chart(coin, *fd._chart_arrays(data)) for coin, data in payloads.items()]
+    return fd.concat_batches(frames)
+
+
+def _serialize_json(batch, chunk_size=1000):
+    size = 0
+    for i in range(0, len(batch), chunk_size):
+        size += len(json.dumps(frame_to_records(batch.iloc[i:i + chunk_size])))
+    return size
+
+
+def _serialize_csv(batch):
+    return len(batch.to_csv(header=False, index=False, date_format="%Y-%m-%dT%H:%M:%S.%f%z"))
+
+
+def cases(cfg: dict) -> dict:
+    """Przypadki (nazwa → (funkcja, liczba wierszy)) dla jednej skali danych."""
+    hist = synthetic.history(cfg["coins"], cfg["points"], cfg["freq"], gap_rate=0.01)
+    single = hist[hist["coin_id"] == hist["coin_id"].iloc[0]][["ts", "price", "volume"]]
+    post = td.allcoins_postprocess(hist)
+    payloads = synthetic.chart_payloads(cfg["coins"], cfg["points"], cfg["freq"])
+    batch = _parse_payloads(payloads)
+    rets = Analysis(hist).returns
+    n = len(hist)
+
+    return {
+        "transform.history_postprocess": (lambda: td.history_postprocess(single), len(single)),
+        "transform.allcoins_postprocess": (lambda: td.allcoins_postprocess(hist), n),
+        "transform.add_index_100": (lambda: td.add_index_100(post), n),
+        "transform.volume_with_share": (lambda: td.volume_with_share(post), n),
+        "dashboard.pandas_pivot_corr_cumprod": (lambda: _pandas_dashboard(hist), n),
+        "dashboard.analysis_matrix": (lambda: _analysis_dashboard(hist), n),
+        "dashboard.corr_blocked_float32": (lambda: corr_blocked(rets), n),
+        "dashboard.downsample_lttb": (lambda: downsample(hist, "ts", "price", "coin_id"), n),
+        "fetch.parse_market_chart": (lambda: _parse_payloads(payloads), len(batch)),
+        "insert.serialize_json": (lambda: _serialize_json(batch), len(batch)),
+        "insert.serialize_csv": (lambda: _serialize_csv(batch), len(batch)),
+        "derived.compute_rollups": (lambda: compute_rollups(hist), n),
+        "derived.compute_indicators": (lambda: compute_indicators(hist), n),
+    }
+
+
+# ==============================
+#  RUN / REPORT
+# ==============================
+def run(presets, repeat: int = 3, only: str = None) -> dict:
+    results = {}
+    for name in presets:
+        cfg = PRESETS[name]
+        print(f"\n⏱️ {name}: {cfg['coins']} monet × {cfg['points']} punktów ({cfg['freq']})")
+        for case, (fn, rows) in cases(cfg).items():
+            if only and only not in case:
+                continue
+            r = measure(fn, rows, repeat)
+            results[f"{name}/{case}"] = r
+            print(f"  {case:<38} {r['best_s'] * 1000:>10.1f} ms  {r['rows_per_s'] or 0:>12,} wierszy/s  "
+                  f"{r['peak_mb']:>8.1f} MB")
+    return results
+
+
+def compare(results: dict, baseline: dict, tolerance: float = TOLERANCE) -> list:
+    """Przypadki wolniejsze od zapisanego wyniku o więcej niż `tolerance` (ułamek)."""
+    slower = []
+    for key, r in results.items():
+        base = baseline.get(key)
+        if base and r["best_s"] > base["best_s"] * (1 + tolerance):
+            slower.append((key, base["best_s"], r["best_s"]))
+    return slower
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarki ścieżek ETL i dashboardu na danych syntetycznych.")
+    parser.add_argument("--preset", action="append", choices=sorted(PRESETS),
+                        help="skala danych (można podać kilka; domyślnie daily9)")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--only", default=None, help="tylko przypadki zawierające ten tekst")
+    parser.add_argument("--out", default=None, help="zapisz wyniki do pliku JSON")
+    parser.add_argument("--baseline", default=None, help="porównaj z wcześniejszym plikiem JSON")
+    args = parser.parse_args()
+
+    results = run(args.preset or ["daily9"], args.repeat, args.only)
+
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"python": platform.python_version(), "pandas": pd.__version__,
+                       "numpy": np.__version__, "results": results}, f, indent=2)
+        print(f"\n💾 Wyniki zapisane do {args.out}")
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            slower = compare(results, json.load(f)["results"])
+        for key, before, after in slower:
+            print(f"⚠️ Regresja {key}: {before * 1000:.1f} ms → {after * 1000:.1f} ms")
+        if slower:
+            sys.exit(1)
+        print("✅ Brak regresji względem wyniku bazowego.")
@@ -0,0 +1,368 @@
+# benchmarks/stubs.py
+"""
+Lokalne zamienniki CoinGecko i PostgREST (Supabase) do testów obciążeniowych.
+
+Oba serwery mają konfigurowalne opóźnienie, wstrzykiwanie 429/5xx i limit
+wierszy na stronę (max-rows PostgREST) oraz zbierają czasy obsługi zapytań.
+"""
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlsplit
+
+import numpy as np
+import pandas as pd
+
+DAY_MS = 86_400_000
+HOUR_MS = 3_600_000
+DATE_COLUMNS = {"date_", "bucket", "first_date", "last_date", "updated_at"}
+_RANGE_RE = re.compile(r"(\d+)-(\d+)")
+
+
+# ==============================
+#  FAULTS & STATS
+# ==============================
+class Faults:
+    """Opóźnienie (ms, z losowym rozrzutem) i prawdopodobieństwo odpowiedzi 429 / 5xx."""
+
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, p429=0.0, p5xx=0.0, retry_after=1, methods=None, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.p429 = p429
+        self.p5xx = p5xx
+        self.retry_after = retry_after
+        self.methods = methods  # np. ("POST",) – błędy tylko dla zapisów; None = wszystkie
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def sleep(self):
+        with self._lock:
+            delay = self.latency_ms + (self._rng.uniform(0, self.jitter_ms) if self.jitter_ms else 0.0)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def pick(self, method):
+        """Kod błędu do wstrzyknięcia albo None."""
+        if self.methods is not None and method not in self.methods:
+            return None
+        with self._lock:
+            r = self._rng.random()
+        if r < self.p429:
+            return 429
+        if r < self.p429 + self.p5xx:
+            return 503
+        return None
+
+
+class Stats:
+    """Czasy obsługi i kody odpowiedzi serwera."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.latencies = []
+        self.codes = {}
+
+    def record(self, seconds, code):
+        with self._lock:
+            self.latencies.append(seconds)
+            self.codes[code] = self.codes.get(code, 0) + 1
+
+    def summary(self) -> dict:
+        with self._lock:
+            lat = np.array(self.latencies) * 1000
+            codes = dict(self.codes)
+        out = {"requests": int(len(lat)), "codes": codes,
+               "injected_429": codes.get(429, 0), "injected_5xx": codes.get(503, 0)}
+        if len(lat):
+            out.update({f"p{q}_ms": round(float(np.percentile(lat, q)), 2) for q in (50, 95, 99)})
+            out["max_ms"] = round(float(lat.max()), 2)
+        return out
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send(self, code, body=None, headers=None):
+        data = json.dumps(body).encode() if body is not None else b""
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _handle(self, method):
+        t0 = time.perf_counter()
+        srv = self.server
+        srv.faults.sleep()
+        code = srv.faults.pick(method)
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        if code == 429:
+            self._send(429, {"error": "rate limited"}, {"Retry-After": str(srv.faults.retry_after)})
+        elif code:
+            self._send(code, {"error": "injected"})
+        else:
+            url = urlsplit(self.path)
+            code, payload, headers = srv.route(method, url.path, parse_qsl(url.query), self.headers, body)
+            self._send(code, payload, headers)
+        srv.stats.record(time.perf_counter() - t0, code or 200)
+
+    def do_GET(self):
+        self._handle("GET")
+
+    def do_POST(self):
+        self._handle("POST")
+
+    def do_DELETE(self):
+        self._handle("DELETE")
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, port=0, faults=None):
+        super().__init__(("127.0.0.1", port), _Handler)
+        self.faults = faults or Faults()
+        self.stats = Stats()
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+
+# ==============================
+#  COINGECKO
+# ==============================
+class CoinGeckoStub(_StubServer):
+    """
+    /coins/{id}/market_chart (days, interval=daily) i /coins/{id}/market_chart/range
+    (from, to – ziarnistość jak w CoinGecko: ≤1 dzień 5 min, ≤90 dni godzinowo, dalej dziennie)
+    oraz /coins/markets (ids albo strony per_page/page z uniwersum `universe` monet).
+    Ceny są deterministyczne dla (moneta, ts), więc powtórzone zapytania dają te same dane.
+    """
+
+    def __init__(self, port=0, faults=None, now_ms=None, universe=1000):
+        super().__init__(port, faults)
+        self.now_ms = now_ms
+        self.universe = [f"coin{i:04d}" for i in range(universe)]
+
+    @staticmethod
+    def _points(coin, ts):
+        seed = zlib.crc32(coin.encode())
+        base = 1 + seed % 50_000
+        phase = (ts // HOUR_MS + seed) % 10_000
+        prices = base * (1 + 0.1 * np.sin(phase / 97.0))
+        volumes = 1e6 * (1 + (phase % 17))
+        return ([[int(t), float(p)] for t, p in zip(ts, prices)],
+                [[int(t), float(v)] for t, v in zip(ts, volumes)])
+
+    def _markets(self, params, now):
+        per_page = min(int(params.get("per_page", 100)), 250)
+        if params.get("ids"):
+            ids = params["ids"].split(",")[:per_page]
+        else:
+            page = int(params.get("page", 1))
+            ids = self.universe[(page - 1) * per_page:page * per_page]
+        rows = []
+        for coin in ids:
+            prices, volumes = self._points(coin, np.array([now], dtype="int64"))
+            price, volume = prices[0][1], volumes[0][1]
+            rows.append({
+                "id": coin, "symbol": coin[:4], "name": coin.title(),
+                "current_price": price, "total_volume": volume, "market_cap": price * 1e7,
+                "high_24h": price * 1.02, "low_24h": price * 0.98, "price_change_percentage_24h": 1.5,
+                "last_updated": pd.Timestamp(now, unit="ms", tz="UTC").isoformat(),
+            })
+        return rows
+
+    def route(self, method, path, query, headers, body):
+        parts = [p for p in path.split("/") if p]
+        if "coins" not in parts:
+            return 404, {"error": "not found"}, None
+        i = parts.index("coins")
+        params = dict(query)
+        now = self.now_ms or int(time.time() * 1000)
+        if parts[i + 1:] == ["markets"]:
+            return 200, self._markets(params, now), None
+        coin, rest = (parts[i + 1], parts[i + 2:]) if len(parts) > i + 1 else (None, [])
+        if rest not in (["market_chart"], ["market_chart", "range"]):
+            return 404, {"error": "not found"}, None
+        if rest[-1] == "range":
+            lo, hi = int(params["from"]) * 1000, int(params["to"]) * 1000
+            span = hi - lo
+            step = 300_000 if span <= DAY_MS else HOUR_MS if span <= 90 * DAY_MS else DAY_MS
+            ts = np.arange(lo - lo % step + step, hi + 1, step, dtype="int64")
+        else:
+            days = int(params.get("days", 1))
+            end = now - now % DAY_MS
+            ts = end - DAY_MS * np.arange(days, -1, -1, dtype="int64")
+        prices, volumes = self._points(coin, ts)
+        return 200, {"prices": prices, "total_volumes": volumes, "market_caps": prices}, None
+
+
+# ==============================
+#  POSTGREST
+# ==============================
+def _coerce(series: pd.Series, column: str):
+    if column in DATE_COLUMNS:
+        return pd.to_datetime(series, utc=True, errors="coerce", format="ISO8601")
+    return series
+
+
+def _parse_in(value: str) -> list:
+    return [v.strip().strip('"') for v in value[value.index("(") + 1:value.rindex(")")].split(",") if v]
+
+
+class PostgRESTStub(_StubServer):
+    """
+    Tabele w pamięci z upsertem (on_conflict), filtrami eq/neq/gt/gte/lt/lte/in
+    i and=(...), select, order, stronicowaniem nagłówkiem Range z limitem
+    `max_rows` (Content-Range z count=exact) oraz RPC refresh_coins
+    i ensure_monthly_partitions.
+    """
+
+    KEYS = {"crypto_prices": ("coin_id", "date_"), "coins": ("coin_id",), "coin_snapshots": ("coin_id",)}
+
+    def __init__(self, port=0, faults=None, max_rows=1000):
+        super().__init__(port, faults)
+        self.max_rows = max_rows
+        self.tables = {}   # tabela -> {klucz: wiersz}
+        self._frames = {}  # tabela -> DataFrame (unieważniany przy zapisie)
+        self._lock = threading.Lock()
+
+    # ---- zapis ----
+    def upsert(self, table, rows, key):
+        with self._lock:
+            store = self.tables.setdefault(table, {})
+            for r in rows:
+                k = tuple(r.get(c) for c in key)
+                if k in store:
+                    store[k].update(r)
+                else:
+                    store[k] = dict(r)
+            self._frames.pop(table, None)
+
+    def frame(self, table) -> pd.DataFrame:
+        with self._lock:
+            df = self._frames.get(table)
+            if df is None:
+                df = pd.DataFrame(list(self.tables.get(table, {}).values()))
+                for col in df.columns:
+                    df[col] = _coerce(df[col], col)
+                self._frames[table] = df
+            return df
+
+    def refresh_coins(self, coin_ids=None):
+        df = self.frame("crypto_prices")
+        if df.empty:
+            return 0
+        if coin_ids:
+            df = df[df["coin_id"].isin(coin_ids)]
+        g = df.sort_values("date_").groupby("coin_id")
+        out = pd.DataFrame({
+            "name": g["name"].last(), "symbol": g["symbol"].last(),
+            "first_date": g["date_"].min(), "last_date": g["date_"].max(), "row_count": g.size(),
+        }).reset_index()
+        self.upsert("coins", _records(out), ("coin_id",))
+        return len(out)
+
+    # ---- odczyt ----
+    @staticmethod
+    def _apply(df, column, expr):
+        op, _, value = expr.partition(".")
+        if column not in df.columns:
+            return df.iloc[:0]
+        col = df[column]
+        if op == "in":
+            return df[col.astype(str).isin(_parse_in(value))]
+        if column in DATE_COLUMNS:
+            value = pd.Timestamp(value)
+            value = value.tz_convert("UTC") if value.tzinfo else value.tz_localize("UTC")
+        elif pd.api.types.is_numeric_dtype(col):
+            value = float(value)
+        ops = {"eq": col == value, "neq": col != value, "gt": col > value,
+               "gte": col >= value, "lt": col < value, "lte": col <= value}
+        return df[ops[op]]
+
+    def select(self, table, query, headers):
+        df = self.frame(table)
+        params = [(k, v) for k, v in query]
+        select = dict(params).get("select", "*")
+        order = dict(params).get("order")
+        for k, v in params:
+            if k in ("select", "order", "limit", "offset", "on_conflict"):
+                continue
+            if k == "and":
+                for cond in v.strip("()").split(","):
+                    column, _, expr = cond.partition(".")
+                    df = self._apply(df, column, expr)
+            else:
+                df = self._apply(df, k, v)
+        if order and not df.empty:
+            cols = [o.split(".")[0] for o in order.split(",")]
+            asc = [not o.endswith(".desc") for o in order.split(",")]
+            df = df.sort_values(cols, ascending=asc, kind="stable")
+        total = len(df)
+        lo, hi = 0, total - 1
+        m = _RANGE_RE.match(headers.get("Range", ""))
+        if m:
+            lo, hi = int(m.group(1)), int(m.group(2))
+        hi = min(hi, lo + self.max_rows - 1, total - 1)
+        page = df.iloc[lo:hi + 1]
+        if select != "*":
+            page = page[[c for c in select.split(",") if c in page.columns]]
+        counted = "count=exact" in headers.get("Prefer", "")
+        content_range = f"{lo}-{max(hi, lo - 1)}/{total if counted else '*'}"
+        return _records(page), content_range
+
+    def route(self, method, path, query, headers, body):
+        parts = path.strip("/").split("/")
+        if parts[:2] != ["rest", "v1"] or len(parts) < 3:
+            return 404, {"error": "not found"}, None
+        if parts[2] == "rpc":
+            payload = json.loads(body or b"{}")
+            if parts[-1] == "refresh_coins":
+                return 200, self.refresh_coins(payload.get("p_coin_ids")), None
+            if parts[-1] == "ensure_monthly_partitions":
+                return 200, 0, None  # tabele w pamięci nie mają partycji
+            return 404, {"error": "not found"}, None
+        table = parts[2]
+        if method == "POST":
+            params = dict(query)
+            key = tuple(params.get("on_conflict", ",".join(self.KEYS.get(table, ("id",)))).split(","))
+            self.upsert(table, json.loads(body or b"[]"), key)
+            return 201, None, None
+        if method == "DELETE":
+            with self._lock:
+                self.tables.pop(table, None)
+                self._frames.pop(table, None)
+            return 204, None, None
+        rows, content_range = self.select(table, query, headers)
+        return 200, rows, {"Content-Range": content_range}
+
+
+def _records(df: pd.DataFrame) -> list:
+    df = df.copy()
+    for col in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%dT%H:%M:%S+00:00")
+    return df.astype(object).where(df.notna(), None).to_dict("records")
@@ -0,0 +1,62 @@
+# benchmarks/synthetic.py
+import numpy as np
+import pandas as pd
+
+# częstotliwości próbkowania → krok w ms
+FREQ_MS = {"D": 86_400_000, "h": 3_600_000, "5min": 300_000, "min": 60_000}
+
+
+def coin_ids(n_coins: int) -> list:
+    return [f"coin{i:04d}" for i in range(n_coins)]
+
+
+def _walk(n_coins: int, n_points: int, seed: int):
+    """Ceny (n_points × n_coins) z geometrycznego błądzenia losowego i wolumeny – deterministycznie."""
+    rng = np.random.default_rng(seed)
+    start = rng.uniform(0.01, 50_000, n_coins)
+    steps = rng.normal(0.0, 0.03, (n_points, n_coins))
+    prices = start * np.exp(np.cumsum(steps, axis=0))
+    volumes = rng.lognormal(15, 1.0, (n_points, n_coins))
+    return prices, volumes
+
+
+def timestamps_ms(n_points: int, freq: str = "D", end: str = "2024-12-31") -> np.ndarray:
+    step = FREQ_MS[freq]
+    last = int(pd.Timestamp(end, tz="UTC").value // 1_000_000) // step * step
+    return last - step * np.arange(n_points - 1, -1, -1, dtype="int64")
+
+
+def history(n_coins: int = 9, n_points: int = 365, freq: str = "D", seed: int = 42,
+            gap_rate: float = 0.0) -> pd.DataFrame:
+    """
+    Tabela długa jak z get_history_all: coin_id, name, symbol, ts, price, volume.
+    `gap_rate` losowo usuwa część punktów (monety z lukami / krótszą historią).
+    """
+    prices, volumes = _walk(n_coins, n_points, seed)
+    ts = pd.to_datetime(timestamps_ms(n_points, freq), unit="ms", utc=True)
+    ids = np.array(coin_ids(n_coins), dtype=object)
+    df = pd.DataFrame({
+        "coin_id": np.tile(ids, n_points),
+        "ts": np.repeat(ts, n_coins),
+        "price": prices.ravel(),
+        "volume": volumes.ravel(),
+    })
+    if gap_rate:
+        keep = np.random.default_rng(seed + 1).random(len(df)) >= gap_rate
+        df = df[keep]
+    df["name"] = df["coin_id"].str.capitalize()
+    df["symbol"] = df["coin_id"].str[:3].str.upper()
+    return df[["coin_id", "name", "symbol", "ts", "price", "volume"]].reset_index(drop=True)
+
+
+def chart_payloads(n_coins: int = 9, n_points: int = 365, freq: str = "D", seed: int = 42) -> dict:
+    """Odpowiedzi CoinGecko market_chart ({coin_id: {"prices": [[ts, p]], "total_volumes": ...}})."""
+    prices, volumes = _walk(n_coins, n_points, seed)
+    ts = timestamps_ms(n_points, freq).tolist()
+    out = {}
+    for j, coin in enumerate(coin_ids(n_coins)):
+        out[coin] = {
+            "prices": [list(p) for p in zip(ts, prices[:, j].tolist())],
+            "total_volumes": [list(v) for v in zip(ts, volumes[:, j].tolist())],
+        }
+    return out
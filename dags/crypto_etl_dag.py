@@ -0,0 +1,61 @@
+# dags/crypto_etl_dag.py
+import os
+import sys
+from datetime import datetime, timedelta
+
+from airflow import DAG
+from airflow.operators.python import PythonOperator
+
+# katalog projektu (dags/..) – importy etl/db jak w skryptach
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from etl.fetch_data import DEFAULT_COIN_IDS, RATE_PER_MIN  # noqa: E402
+from etl.pipeline import FINALIZE, STAGES, run_task  # noqa: E402
+
+# Lista monet (np. CRYPTO_COIN_IDS=bitcoin,ethereum); domyślnie jak w fetch_data
+COIN_IDS = [c for c in os.getenv("CRYPTO_COIN_IDS", ",".join(DEFAULT_COIN_IDS)).split(",") if c]
+
+# Zadania naraz; każde extract ma własny limiter, więc dostaje 1/MAX_ACTIVE_TASKS
+# limitu CoinGecko – łącznie DAG nie przekracza COINGECKO_RATE_PER_MIN
+MAX_ACTIVE_TASKS = int(os.getenv("COINGECKO_MAX_WORKERS", "4"))
+TASK_RATE_PER_MIN = RATE_PER_MIN / MAX_ACTIVE_TASKS
+
+default_args = {
+    "owner": "crypto-etl",
+    "retries": 3,
+    "retry_delay": timedelta(minutes=5),
+}
+
+# ten sam graf co etl/pipeline.run_pipeline: per moneta extract → transform → load,
+# potem finalize; run_id = data uruchomienia, więc ponowienia korzystają z punktów kontrolnych.
+# Zadania przekazują sobie dane przez pliki w PIPELINE_DIR (paczki .parquet i znaczniki .done),
+# a finalize czyta paczki wszystkich monet – wszystkie workery muszą widzieć ten sam katalog
+# (LocalExecutor albo PIPELINE_DIR na wspólnym wolumenie przy Celery/Kubernetes).
+with DAG(
+    dag_id="crypto_etl",
+    default_args=default_args,
+    start_date=datetime(2024, 1, 1),
+    schedule="0 3 * * *",
+    catchup=False,
+    max_active_tasks=MAX_ACTIVE_TASKS,
+    tags=["crypto"],
+) as dag:
+    finalize = PythonOperator(
+        task_id=FINALIZE,
+        python_callable=run_task,
+        op_kwargs={"stage": FINALIZE, "run_id": "{{ ds }}", "coin_ids": COIN_IDS},
+        trigger_rule="all_done",  # załadowane monety są finalizowane mimo błędów innych
+    )
+
+    for coin in COIN_IDS:
+        tasks = [
+            PythonOperator(
+                task_id=f"{stage}_{coin}",
+                python_callable=run_task,
+                op_kwargs={"stage": stage, "coin": coin, "run_id": "{{ ds }}", "rate_per_min": TASK_RATE_PER_MIN},
+            )
+            for stage in STAGES
+        ]
+        tasks[0] >> tasks[1] >> tasks[2] >> finalize
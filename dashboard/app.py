@@ -14,22 +14,75 @@ ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 if ROOT not in sys.path:
     sys.path.append(ROOT)
 
-from db.db import list_coins, get_history, get_history_all  # noqa: E402
+from db.db import list_coins, get_rollups, get_indicators  # noqa: E402
+from db.query import HistoryQuery  # noqa: E402
+from etl.analytics import Analysis, kpis  # noqa: E402
+from etl.correlation import CorrelationCache, correlate, fingerprint  # noqa: E402
+from etl.metrics import METRICS, cache_miss, track_cache  # noqa: E402
+from dashboard.cache import ALL, SegmentCache  # noqa: E402
+from dashboard.downsample import downsample, bucket_mean, render_mode  # noqa: E402
+from dashboard.loader import Prefetch  # noqa: E402
 
 # =========================
 #        Cache
 # =========================
+# track_cache mierzy czas wywołań; cache_miss() w ciele funkcji oznacza chybienie
+@track_cache("list_coins")
 @st.cache_data(ttl=300)
 def cached_list_coins() -> pd.DataFrame:
+    cache_miss()
     return list_coins()
 
-@st.cache_data(ttl=300, show_spinner=False)
-def cached_get_history(cid: str, start: datetime, end: datetime) -> pd.DataFrame:
-    return get_history(cid, start, end)
+# kolumny potrzebne wykresom – nazwy monet pochodzą z list_coins, nie z historii
+HISTORY_FIELDS = ("coin_id", "price", "volume", "ts")
+# do tylu wybranych monet historia idzie jednym zapytaniem coin_id=in.(…), powyżej – jednym dla wszystkich
+COIN_QUERY_MAX = int(os.getenv("DASHBOARD_COIN_QUERIES", "5"))
+
+def _fetch_history(scope, start: datetime, end: datetime) -> pd.DataFrame:
+    # scope: ALL, jedna moneta albo krotka monet (SegmentCache.get)
+    cache_miss()
+    query = HistoryQuery(start, end).select(*HISTORY_FIELDS)
+    if scope == ALL:
+        return query.fetch()
+    return query.coins([scope] if isinstance(scope, str) else list(scope)).fetch()
+
+@st.cache_resource
+def history_cache() -> SegmentCache:
+    # segmenty miesięczne współdzielone między sesjami; zmiana zakresu dociąga tylko brakujące miesiące
+    return SegmentCache(_fetch_history, max_bytes=int(os.getenv("DASHBOARD_CACHE_MB", "256")) * 2**20)
+
+@track_cache("get_history")
+def cached_get_history(scope, start: datetime, end: datetime) -> pd.DataFrame:
+    return history_cache().get(scope, start, end)
+
+@track_cache("get_history_all")
+def cached_get_history_all(start: datetime, end: datetime) -> pd.DataFrame:
+    return history_cache().get(ALL, start, end)
 
+@track_cache("get_indicators")
 @st.cache_data(ttl=300, show_spinner=False)
-def cached_get_history_all(start: datetime, end: datetime) -> pd.DataFrame:
-    return get_history_all(start, end)
+def cached_get_indicators(cid: str, start: datetime, end: datetime) -> pd.DataFrame:
+    cache_miss()
+    return get_indicators(cid, start, end)
+
+@st.cache_resource
+def corr_cache() -> CorrelationCache:
+    # macierze korelacji współdzielone między sesjami; TTL jak w pozostałych cache
+    return CorrelationCache(int(os.getenv("DASHBOARD_CORR_CACHE", "32")), ttl=300)
+
+@track_cache("correlation")
+def cached_correlation(start: datetime, end: datetime, window, coins: tuple, rets: np.ndarray):
+    def compute():
+        cache_miss()
+        return correlate(rets, coins, window)
+    # fingerprint zwrotów w kluczu – nowe dane ETL w bieżącym miesiącu unieważniają wpis
+    return corr_cache().get((start, end, window, coins, fingerprint(rets)), compute)
+
+@track_cache("get_rollups")
+@st.cache_data(ttl=300, show_spinner=False)
+def cached_get_rollups(period: str, start: datetime, end: datetime) -> pd.DataFrame:
+    cache_miss()
+    return get_rollups(period, start, end)
 
 # =========================
 #        Utils
@@ -54,21 +107,38 @@ def next_month(year: int, month: int) -> tuple[int, int]:
 def last_month_start(year: int, month: int) -> datetime:
     return first_day(*next_month(year, month))
 
+def history_scope(ids: list):
+    """Zakres cached_get_history: ID jednej monety albo krotka ID (jedno zapytanie coin_id=in.(…))."""
+    return ids[0] if len(ids) == 1 else tuple(ids)
+
+def page_queries(state, now: datetime) -> list:
+    """
+    Zapytania strony dla bieżących filtrów: wartości widżetów z session_state
+    (Streamlit zapisuje je przed ponownym przebiegiem) albo wartości domyślne.
+    """
+    start = first_day(state.get("start_year", now.year - 1), state.get("start_month", now.month))
+    end = last_month_start(state.get("end_year", now.year), state.get("end_month", now.month))
+    calls = [(cached_list_coins,)]
+    if end <= start:
+        return calls
+    calls += [(cached_get_rollups, "month", start, end), (cached_get_rollups, "day", start, end)]
+    # wybrane monety – ID z mapy nazw zapamiętanej w poprzednim przebiegu
+    selection = state.get("coins", ["All"])
+    ids = [state.get("name_to_id", {}).get(n) for n in selection]
+    if "All" in selection or not selection or None in ids or len(ids) > COIN_QUERY_MAX:
+        calls.append((cached_get_history_all, start, end))
+    else:
+        calls.append((cached_get_history, history_scope(ids), start, end))
+    if len(ids) == 1 and ids[0]:
+        calls.append((cached_get_indicators, ids[0], start, end))
+    return calls
+
 def add_mas(df: pd.DataFrame, price_col: str = "price", windows=(7, 30)) -> pd.DataFrame:
     df = df.sort_values("ts").copy()
     for w in windows:
         df[f"MA{w}"] = df[price_col].rolling(window=w, min_periods=1).mean()
     return df
 
-def index_to_100(df: pd.DataFrame, price_col: str = "price", group_col: str = "coin_id") -> pd.DataFrame:
-    out = []
-    for _, g in df.sort_values("ts").groupby(group_col, sort=False):
-        g = g.copy()
-        base = g[price_col].iloc[0]
-        g["price_norm"] = (g[price_col] / base) * 100.0 if pd.notna(base) and base != 0 else np.nan
-        out.append(g)
-    return pd.concat(out, ignore_index=True) if out else df.copy()
-
 def nice_delta_pct(cur: float, ref: float) -> float:
     try:
         return (cur / ref - 1.0) * 100.0
@@ -90,7 +160,11 @@ def build_color_map(names: list[str]) -> dict[str, str]:
 st.set_page_config(page_title="CryptoCurrencies Dashboard", layout="wide")
 st.title("CryptoCurrencies Dashboard")
 
-coins_df = cached_list_coins()
+# wszystkie zapytania strony naraz; dalej każdy wykres czeka tylko na swoje dane
+now = datetime.now(timezone.utc)
+load = Prefetch(page_queries(st.session_state, now))
+
+coins_df = load(cached_list_coins)
 if coins_df.empty:
     st.warning("Brak danych w bazie. Uruchom ETL (fetch → save).")
     st.stop()
@@ -99,17 +173,18 @@ coins_df = coins_df.sort_values("name")
 all_names = coins_df["name"].tolist()
 name_to_id = dict(zip(coins_df["name"], coins_df["coin_id"]))
 id_to_name = dict(zip(coins_df["coin_id"], coins_df["name"]))
+st.session_state["name_to_id"] = name_to_id
 
 # ---- filtry ----
 col_f1, col_f2, col_f3, col_f4, col_f5 = st.columns([2, 1, 1, 1, 1])
-now = datetime.now(timezone.utc)
 one_year_ago = (datetime.now() - timedelta(days=365)).date()
 with col_f1:
     selection = st.multiselect(
         f"Wybierz kryptowalutę i zakres dat od {one_year_ago} do {now.date()}",
         ["All"] + all_names,
         default=["All"],
-        help="Możesz wybrać jedną, kilka lub All."
+        help="Możesz wybrać jedną, kilka lub All.",
+        key="coins",
     )
 
     # --- logika poprawnego działania 'All' ---
@@ -121,14 +196,14 @@ with col_f1:
 years = list(range(now.year - 1, now.year + 1))
 
 with col_f2:
-    start_year = st.selectbox("Start year", years, index=max(0, years.index(now.year) - 1))
+    start_year = st.selectbox("Start year", years, index=max(0, years.index(now.year) - 1), key="start_year")
 with col_f3:
-    start_month = st.selectbox("Start month", list(range(1, 13)), index=now.month - 1)
+    start_month = st.selectbox("Start month", list(range(1, 13)), index=now.month - 1, key="start_month")
 
 with col_f4:
-    end_year = st.selectbox("End year", years, index=years.index(now.year))
+    end_year = st.selectbox("End year", years, index=years.index(now.year), key="end_year")
 with col_f5:
-    end_month = st.selectbox("End month", list(range(1, 13)), index=now.month - 1)
+    end_month = st.selectbox("End month", list(range(1, 13)), index=now.month - 1, key="end_month")
 
 start_dt = first_day(start_year, start_month)
 end_dt = last_month_start(end_year, end_month)  # [start_dt, end_dt)
@@ -145,24 +220,39 @@ color_map = build_color_map(selected_names)
 # =========================
 #    Dane do wykresów
 # =========================
-hist_all = ensure_ts_utc(cached_get_history_all(start_dt, end_dt))
-hist_all = hist_all[hist_all["coin_id"].isin(selected_ids)].copy()
+if "All" in selection or not selection or len(selected_ids) > COIN_QUERY_MAX:
+    hist_all = ensure_ts_utc(load(cached_get_history_all, start_dt, end_dt))
+    hist_all = hist_all[hist_all["coin_id"].isin(selected_ids)].copy()
+else:
+    # tylko wiersze wybranych monet – jedno zapytanie z filtrem coin_id=in.(…) po stronie bazy
+    hist_all = ensure_ts_utc(load(cached_get_history, history_scope(selected_ids), start_dt, end_dt))
 
 if hist_all.empty:
     st.info("Brak danych w zaznaczonym zakresie.")
     st.stop()
 
+# jedna macierz (czas × moneta) dla indeksu 100, zwrotów, korelacji i ryzyka
+analysis = Analysis(hist_all)
+
 # =========================
 #        KPI
 # =========================
 if len(selected_ids) == 1:
     # pojedyncza moneta
     cid = selected_ids[0]
-    single = ensure_ts_utc(cached_get_history(cid, start_dt, end_dt))
+    single = ensure_ts_utc(load(cached_get_history, cid, start_dt, end_dt))
     if single.empty:
         st.info("Brak danych dla wybranej kryptowaluty.")
     else:
-        single = add_mas(single.rename(columns={"ts": "ts", "price": "price"}), "price", windows=(7, 30))
+        # MA7/MA30 zapisane przez ETL (liczone na pełnej historii); brak → liczymy lokalnie
+        ind = load(cached_get_indicators, cid, start_dt, end_dt)
+        if not ind.empty:
+            single = single.sort_values("ts").merge(
+                ind[["ts", "sma7", "sma30"]].rename(columns={"sma7": "MA7", "sma30": "MA30"}),
+                on="ts", how="left",
+            )
+        if ind.empty or single[["MA7", "MA30"]].isna().any().any():
+            single = add_mas(single.drop(columns=["MA7", "MA30"], errors="ignore"), "price", windows=(7, 30))
         latest = single.sort_values("ts").iloc[-1]
         k1, k2, k3 = st.columns(3)
         with k1:
@@ -179,16 +269,18 @@ if len(selected_ids) == 1:
             "niżej, może sygnalizować lokalną słabość rynku."
         )
 
-        # Price + MA
+        # Price + MA (punkty wybrane po cenie, MA z tych samych wierszy)
+        plot = downsample(single, "ts", "price")
+        Scatter = go.Scattergl if render_mode(3 * len(plot)) == "webgl" else go.Scatter
         fig = go.Figure()
-        fig.add_trace(go.Scatter(
-            x=single["ts"], y=single["price"], mode="lines", name="Price",
+        fig.add_trace(Scatter(
+            x=plot["ts"], y=plot["price"], mode="lines", name="Price",
             line=dict(width=2, color=color_map[id_to_name[cid]])
         ))
-        fig.add_trace(go.Scatter(x=single["ts"], y=single["MA7"],  mode="lines", name="MA 7",
-                                 line=dict(width=1.5, dash="dash")))
-        fig.add_trace(go.Scatter(x=single["ts"], y=single["MA30"], mode="lines", name="MA 30",
-                                 line=dict(width=1.5, dash="dot")))
+        fig.add_trace(Scatter(x=plot["ts"], y=plot["MA7"],  mode="lines", name="MA 7",
+                              line=dict(width=1.5, dash="dash")))
+        fig.add_trace(Scatter(x=plot["ts"], y=plot["MA30"], mode="lines", name="MA 30",
+                              line=dict(width=1.5, dash="dot")))
         fig.update_layout(
             title=f"{id_to_name[cid]} — Cena i Średnie 7 i 30 dni",
             xaxis_title="Czas", yaxis_title="Cena",
@@ -199,20 +291,16 @@ if len(selected_ids) == 1:
 else:
     # wiele monet → kafelki
     recent_start = now - timedelta(days=60)
-    thr7 = pd.Timestamp(now - timedelta(days=7))
-    thr30 = pd.Timestamp(now - timedelta(days=30))
-    if thr7.tz is None:   thr7 = thr7.tz_localize("UTC")
-    if thr30.tz is None:  thr30 = thr30.tz_localize("UTC")
+
+    # KPI wszystkich monet naraz z już pobranego hist_all (bez zapytania na monetę)
+    recent = hist_all[hist_all["ts"] >= pd.Timestamp(max(start_dt, recent_start))]
+    kpi = kpis(recent, now).set_index("coin_id")
 
     tiles = []
     for cid in selected_ids:
-        df = ensure_ts_utc(cached_get_history(cid, max(start_dt, recent_start), end_dt))
-        if df.empty:
+        if cid not in kpi.index:
             continue
-        df = df.sort_values("ts")
-        cur = df["price"].iloc[-1]
-        avg7  = df.loc[df["ts"] >= thr7,  "price"].mean()
-        avg30 = df.loc[df["ts"] >= thr30, "price"].mean()
+        cur, avg7, avg30 = kpi.loc[cid, ["cur", "avg7", "avg30"]]
         tiles.append({
             "name": id_to_name[cid],
             "cur": cur,
@@ -247,7 +335,7 @@ st.caption(
 
 # 1) Indeks 100 na starcie okresu
 st.subheader("Cena (indeksowana do 100% w okresie rozpoczęcia)")
-norm = index_to_100(hist_all.rename(columns={"price": "price"}), price_col="price", group_col="coin_id")
+norm = downsample(analysis.index100_long(), "ts", "price_norm", "coin_id")
 norm["name"] = norm["coin_id"].map(id_to_name)
 
 fig_norm = px.line(
@@ -255,6 +343,7 @@ fig_norm = px.line(
     color_discrete_map=color_map,
     labels={"ts": "Czas", "price_norm": "Indeks (100%=początkowy)"},
     height=380,
+    render_mode=render_mode(len(norm)),
 )
 fig_norm.update_layout(legend=dict(orientation="h", yanchor="bottom", y=1.02, xanchor="right", x=1),
                        margin=dict(l=20, r=20, t=60, b=20))
@@ -268,9 +357,14 @@ st.caption(
     "Suma całkowitego wolumenu handlu dla każdej kryptowaluty w wybranym okresie. "
     "Wysoki wolumen zwykle oznacza dużą aktywność inwestorów oraz lepszą płynność rynku."
 )
-vol = (hist_all.groupby("coin_id", as_index=False)["volume"].sum()
-       .assign(name=lambda d: d["coin_id"].map(id_to_name)))
-vol = vol.sort_values("volume", ascending=False)
+# agregaty miesięczne z ETL – zakres filtrów jest wyrównany do miesięcy
+monthly = load(cached_get_rollups, "month", start_dt, end_dt)
+if not monthly.empty:
+    monthly = monthly[(monthly["bucket"] < end_dt) & monthly["coin_id"].isin(selected_ids)]
+    vol = monthly.groupby("coin_id", as_index=False)["volume"].sum()
+else:
+    vol = hist_all.groupby("coin_id", as_index=False)["volume"].sum()
+vol = vol.assign(name=lambda d: d["coin_id"].map(id_to_name)).sort_values("volume", ascending=False)
 
 fig_bar = px.bar(
     vol, x="name", y="volume", color="name",
@@ -315,27 +409,50 @@ st.caption(
     "a wartości ujemne sugerują przeciwny kierunek zmian. To przydatne narzędzie "
     "do oceny dywersyfikacji portfela."
 )
-pivot = hist_all.pivot_table(index="ts", columns="coin_id", values="price").copy()
-
-# index → datetime UTC (bez błędów dla datetime64[ns, UTC])
-if not pd.api.types.is_datetime64_any_dtype(pivot.index):
-    pivot.index = pd.to_datetime(pivot.index, errors="coerce", utc=True)
-elif getattr(pivot.index, "tz", None) is None:
-    pivot.index = pd.to_datetime(pivot.index, utc=True)
-
-rets = pivot.sort_index().pct_change().dropna(how="all")
-if rets.shape[0] >= 5 and rets.shape[1] >= 2:
-    corr = rets.corr()
+# duże uniwersum: heatmapa wycinka (monety z najsilniejszych par), bez etykiet wartości
+CORR_MAX_COINS = int(os.getenv("DASHBOARD_CORR_MAX_COINS", "60"))
+CORR_TEXT_MAX = 20
+CORR_WINDOWS = {"Cały zakres": None, "30 dni": 30, "90 dni": 90}
+
+if analysis.n_return_rows >= 5 and analysis.matrix.shape[1] >= 2:
+    corr_window = CORR_WINDOWS[st.radio("Okno korelacji", list(CORR_WINDOWS), horizontal=True)]
+    corr_res = cached_correlation(start_dt, end_dt, corr_window, tuple(analysis.matrix.coins), analysis.returns)
+    corr = corr_res.submatrix(CORR_MAX_COINS)
     corr.columns = [id_to_name.get(c, c) for c in corr.columns]
     corr.index   = [id_to_name.get(i, i) for i in corr.index]
 
     fig_corr = px.imshow(
-        corr, text_auto=".2f", aspect="auto",
+        corr, text_auto=".2f" if len(corr) <= CORR_TEXT_MAX else False, aspect="auto",
         color_continuous_scale="RdYlGn", zmin=-1, zmax=1,
         labels=dict(color="corr"),
     )
-    fig_corr.update_layout(height=500, margin=dict(l=20, r=20, t=40, b=20))
+    fig_corr.update_layout(height=500 if len(corr) <= CORR_TEXT_MAX else 800, margin=dict(l=20, r=20, t=40, b=20))
+    if len(corr_res.coins) > len(corr):
+        st.caption(f"Wycinek {len(corr)} z {len(corr_res.coins)} monet – najsilniej powiązane, ułożone w klastry.")
     st.plotly_chart(fig_corr, use_container_width=True, key="correlation")
+
+    if len(corr_res.coins) > 2:
+        def _named(pairs):
+            return pairs.assign(coin_a=pairs["coin_a"].map(lambda c: id_to_name.get(c, c)),
+                                coin_b=pairs["coin_b"].map(lambda c: id_to_name.get(c, c)))
+
+        most, least = corr_res.top_pairs(10), corr_res.top_pairs(10, largest=False)
+        c_top, c_low = st.columns(2)
+        with c_top:
+            st.caption("Najsilniej skorelowane pary")
+            st.dataframe(_named(most), hide_index=True, use_container_width=True)
+        with c_low:
+            st.caption("Najsłabiej skorelowane pary")
+            st.dataframe(_named(least), hide_index=True, use_container_width=True)
+
+        # korelacja krocząca trzech najsilniejszych par – czy związek jest stabilny w czasie
+        roll_window = corr_window or 30
+        if analysis.n_return_rows > roll_window:
+            rolling = corr_res.rolling(most.head(3), roll_window, analysis.matrix.ts, names=id_to_name)
+            fig_roll = px.line(rolling, x="ts", y="corr", color="pair",
+                               labels={"ts": "Data", "corr": f"Korelacja ({roll_window} dni)", "pair": "Para"})
+            fig_roll.update_layout(height=320, margin=dict(l=20, r=20, t=40, b=20))
+            st.plotly_chart(fig_roll, use_container_width=True, key="correlation_rolling")
 else:
     st.caption("Brak danych dla obliczenia korelacji")
 
@@ -351,10 +468,8 @@ st.caption(
 )
 
 
-# Oblicz dzienne zwroty i skumulowany zwrot
-returns = hist_all.pivot(index="ts", columns="coin_id", values="price").pct_change()
-cum_returns = (1 + returns).cumprod() - 1
-cum_returns = cum_returns.reset_index().melt(id_vars="ts", var_name="coin_id", value_name="cum_return")
+# Skumulowany zwrot z macierzy dziennych zwrotów
+cum_returns = downsample(analysis.cum_returns_long(), "ts", "cum_return", "coin_id")
 
 fig_cum = px.line(
     cum_returns,
@@ -363,6 +478,7 @@ fig_cum = px.line(
     color="coin_id",
     title="Cumulative Returns Over Time",
     labels={"cum_return": "Kumulowany zwrot", "ts": "Data", "coin": "Kryptowaluta"},
+    render_mode=render_mode(len(cum_returns)),
 )
 
 fig_cum.update_layout(
@@ -378,12 +494,17 @@ st.plotly_chart(fig_cum, use_container_width=True, key="cumulative_returns")
 # ==============================
 st.subheader("Ryzyko vs Zwrot")
 
-# policz średni zwrot i odchylenie standardowe
-risk_return = (
-    returns.agg(["mean", "std"])
-    .T.reset_index()
-    .rename(columns={"index": "coin_id", "mean": "avg_return", "std": "volatility"})
-)
+# średni zwrot i odchylenie standardowe z dziennych agregatów (kolumna ret)
+daily = load(cached_get_rollups, "day", start_dt, end_dt)
+if not daily.empty:
+    daily = daily[(daily["bucket"] < end_dt) & daily["coin_id"].isin(selected_ids)]
+    risk_return = (
+        daily.groupby("coin_id")["ret"].agg(["mean", "std"])
+        .reset_index()
+        .rename(columns={"mean": "avg_return", "std": "volatility"})
+    )
+else:
+    risk_return = analysis.risk_return()
 
 fig_risk = px.scatter(
     risk_return,
@@ -427,6 +548,8 @@ st.caption(
 # Użyj wolumenu zamiast kapitalizacji rynkowej (jeśli brak kolumny 'market_cap')
 market_share = hist_all.copy()
 market_share["share"] = market_share["volume"] / market_share.groupby("ts")["volume"].transform("sum")
+# wykres skumulowany – wspólne przedziały czasu dla wszystkich monet
+market_share = bucket_mean(market_share, "ts", "share", "coin_id")
 
 
 fig_share_evo = px.area(
@@ -458,3 +581,7 @@ st.caption(
     "Wybieranie jednej kryptowaluty pokaże szczegółowe metryki, w tym cenę i średnie 7 i 30 dni."
 )
 
+
+# metryki procesu dashboardu (czas trafień/chybień cache) – np. dla textfile collectora Prometheusa
+if os.getenv("DASHBOARD_METRICS", "0") == "1":
+    METRICS.export("dashboard")
@@ -0,0 +1,164 @@
+# dashboard/cache.py
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+
+import pandas as pd
+
+ALL = "*"  # zakres "wszystkie monety"
+HISTORY_COLUMNS = ["coin_id", "price", "volume", "ts"]
+
+
+# =========================
+#        Miesiące
+# =========================
+def month_start(dt: datetime) -> datetime:
+    dt = dt.astimezone(timezone.utc) if dt.tzinfo else dt.replace(tzinfo=timezone.utc)
+    return datetime(dt.year, dt.month, 1, tzinfo=timezone.utc)
+
+
+def add_month(dt: datetime) -> datetime:
+    return dt.replace(year=dt.year + 1, month=1) if dt.month == 12 else dt.replace(month=dt.month + 1)
+
+
+def months_between(start: datetime, end: datetime) -> list:
+    """Początki miesięcy pokrywających [start, end) – koniec wyłączny, jak end_dt w aplikacji."""
+    out, m = [], month_start(start)
+    while m < end:
+        out.append(m)
+        m = add_month(m)
+    return out
+
+
+# =========================
+#     Segment cache
+# =========================
+class SegmentCache:
+    """
+    Cache historii w segmentach miesięcznych (per moneta albo ALL).
+
+    Dowolny zakres [start, end) składany jest z segmentów; pobierane są tylko brakujące
+    miesiące (sąsiednie braki – jednym zapytaniem). Segmenty bliskie "teraz"
+    wygasają po `ttl_recent` sekundach (ETL dopisuje nowe dni), starsze po
+    `ttl_old`. Po przekroczeniu `max_bytes` usuwane są najdawniej używane (LRU).
+    """
+
+    def __init__(self, fetch, max_bytes: int = 256 * 2**20, ttl_recent: int = 300, ttl_old: int = 24 * 3600):
+        self.fetch = fetch  # fetch(scope, start, end) -> DataFrame z kolumną ts
+        self.max_bytes = max_bytes
+        self.ttl_recent = ttl_recent
+        self.ttl_old = ttl_old
+        self._segments = OrderedDict()  # (scope, miesiąc) -> (df, bajty, czas pobrania)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    # ---- segmenty ----
+    def _ttl(self, month: datetime) -> int:
+        recent = datetime.now(timezone.utc) - timedelta(days=2)
+        return self.ttl_recent if add_month(month) > recent else self.ttl_old
+
+    def _lookup(self, scope, month):
+        """Segment dla (scope, miesiąc); dla monety może go obsłużyć segment ALL."""
+        now = time.monotonic()
+        for key in ((scope, month), (ALL, month)) if scope != ALL else ((ALL, month),):
+            entry = self._segments.get(key)
+            if entry is None:
+                continue
+            df, _, fetched = entry
+            if now - fetched > self._ttl(month):
+                self._drop(key)
+                continue
+            self._segments.move_to_end(key)
+            return df if key[0] == scope else df[df["coin_id"] == scope]
+        return None
+
+    def _drop(self, key):
+        _, nbytes, _ = self._segments.pop(key)
+        self._bytes -= nbytes
+
+    def _store(self, scope, month, df):
+        key = (scope, month)
+        if key in self._segments:
+            self._drop(key)
+        nbytes = int(df.memory_usage(deep=True).sum())
+        self._segments[key] = (df, nbytes, time.monotonic())
+        self._bytes += nbytes
+        while self._bytes > self.max_bytes and len(self._segments) > 1:
+            self._drop(next(iter(self._segments)))
+
+    # ---- API ----
+    def get(self, scope, start: datetime, end: datetime) -> pd.DataFrame:
+        """
+        Historia dla `scope`: ALL, jedna moneta albo krotka monet. Dla kilku
+        monet brakujące segmenty (moneta, miesiąc) dociągane są jednym
+        zapytaniem na ciąg miesięcy – fetch dostaje krotkę monet (coin_id=in.(...)),
+        a wynik dzielony jest na segmenty per moneta, wspólne z widokami jednej monety.
+        """
+        scopes = [scope] if isinstance(scope, str) else list(dict.fromkeys(scope))
+        months = months_between(start, end)
+        parts, missing = {}, {}  # missing: miesiąc -> monety bez segmentu
+        with self._lock:
+            for m in months:
+                for sc in scopes:
+                    df = self._lookup(sc, m)
+                    if df is None:
+                        missing.setdefault(m, []).append(sc)
+                    else:
+                        parts[(sc, m)] = df
+        n_missing = sum(len(v) for v in missing.values())
+        self.hits += len(months) * len(scopes) - n_missing
+        self.misses += n_missing
+
+        for run in _runs(sorted(missing)):
+            lo, hi = run[0], add_month(run[-1])
+            run_scopes = [sc for sc in scopes if any(sc in missing[m] for m in run)]
+            target = run_scopes[0] if len(run_scopes) == 1 else tuple(run_scopes)
+            fetched = _normalize(self.fetch(target, lo, hi - timedelta(microseconds=1)))
+            seg_month = fetched["ts"].dt.tz_convert("UTC").dt.tz_localize(None).dt.to_period("M").dt.start_time
+            with self._lock:
+                for m in run:
+                    in_month = fetched[seg_month == pd.Timestamp(m.replace(tzinfo=None))]
+                    for sc in run_scopes:
+                        seg = in_month if sc == ALL else in_month[in_month["coin_id"] == sc]
+                        seg = seg.reset_index(drop=True)
+                        self._store(sc, m, seg)
+                        parts[(sc, m)] = seg
+
+        frames = [parts[(sc, m)] for m in months for sc in scopes if not parts[(sc, m)].empty]
+        if not frames:
+            return pd.DataFrame(columns=HISTORY_COLUMNS)
+        out = pd.concat(frames, ignore_index=True)
+        lo, hi = pd.Timestamp(start), pd.Timestamp(end)
+        out = out[(out["ts"] >= lo) & (out["ts"] < hi)]
+        return out.sort_values(["ts", "coin_id"], kind="stable").reset_index(drop=True)
+
+    def stats(self) -> dict:
+        return {"segments": len(self._segments), "bytes": self._bytes, "hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        with self._lock:
+            self._segments.clear()
+            self._bytes = 0
+
+
+def _runs(months: list) -> list:
+    """Grupuje kolejne miesiące w ciągłe przedziały (jedno zapytanie na przedział)."""
+    runs = []
+    for m in months:
+        if runs and add_month(runs[-1][-1]) == m:
+            runs[-1].append(m)
+        else:
+            runs.append([m])
+    return runs
+
+
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    if df is None or df.empty:
+        return pd.DataFrame({c: pd.Series(dtype="datetime64[ns, UTC]" if c == "ts" else object)
+                             for c in HISTORY_COLUMNS})
+    df = df.copy()
+    df["ts"] = pd.to_datetime(df["ts"], utc=True, errors="coerce")
+    return df.dropna(subset=["ts"])
@@ -0,0 +1,107 @@
+# dashboard/downsample.py
+import os
+
+import numpy as np
+import pandas as pd
+
+# maks. liczba punktów na serię wysyłana do przeglądarki
+MAX_POINTS = int(os.getenv("DASHBOARD_MAX_POINTS", "1000"))
+# powyżej tylu punktów na wykres przełączamy się na WebGL (scattergl)
+WEBGL_POINTS = int(os.getenv("DASHBOARD_WEBGL_POINTS", "5000"))
+
+
+# =========================
+#     Algorytmy
+# =========================
+def _as_float(x) -> np.ndarray:
+    x = pd.Series(x)
+    if pd.api.types.is_datetime64_any_dtype(x):
+        return x.astype("int64").to_numpy(dtype="float64")
+    return x.to_numpy(dtype="float64")
+
+
+def lttb(x, y, n: int) -> np.ndarray:
+    """
+    Largest-Triangle-Three-Buckets: indeksy `n` punktów najlepiej oddających
+    kształt serii (pierwszy i ostatni zawsze zachowane). x rosnąco, bez NaN.
+    """
+    size = len(y)
+    if n >= size or n < 3:
+        return np.arange(size)
+    x = _as_float(x)
+    y = np.asarray(y, dtype="float64")
+
+    edges = np.linspace(1, size - 1, n - 1).astype(int)  # n-2 kubełków między skrajnymi punktami
+    out = np.empty(n, dtype=int)
+    out[0], out[-1] = 0, size - 1
+    a = 0
+    for i in range(n - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # średnia następnego kubełka (dla ostatniego – ostatni punkt)
+        nlo, nhi = hi, edges[i + 2] if i + 2 < len(edges) else size
+        cx, cy = x[nlo:nhi].mean(), y[nlo:nhi].mean()
+        area = np.abs((x[a] - cx) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (cy - y[a]))
+        a = lo + int(area.argmax())
+        out[i + 1] = a
+    return out
+
+
+def minmax(y, n: int) -> np.ndarray:
+    """Min i max w każdym z n/2 kubełków – zachowuje skrajne wartości (piki)."""
+    size = len(y)
+    if n >= size or n < 4:
+        return np.arange(size)
+    y = np.asarray(y, dtype="float64")
+    edges = np.linspace(0, size, n // 2 + 1).astype(int)
+    idx = set()
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            idx.add(lo + int(y[lo:hi].argmin()))
+            idx.add(lo + int(y[lo:hi].argmax()))
+    return np.array(sorted(idx | {0, size - 1}))
+
+
+# =========================
+#     Ramki danych
+# =========================
+def downsample(df: pd.DataFrame, x: str, y: str, group: str = None, n: int = None,
+               method: str = "lttb") -> pd.DataFrame:
+    """
+    Zmniejsza tabelę długą do ≤ n punktów na serię (per `group`).
+    Indeksy liczone po kolumnie `y` – pozostałe kolumny wiersza (np. MA) idą razem z nim.
+    """
+    n = n or MAX_POINTS
+    if df.empty:
+        return df
+    groups = df.groupby(group, sort=False) if group else [(None, df)]
+    parts = []
+    for _, g in groups:
+        g = g[g[y].notna()].sort_values(x, kind="stable")
+        if len(g) <= n:
+            parts.append(g)
+            continue
+        idx = lttb(g[x], g[y], n) if method == "lttb" else minmax(g[y], n)
+        parts.append(g.iloc[idx])
+    return pd.concat(parts, ignore_index=True) if parts else df.iloc[:0]
+
+
+def bucket_mean(df: pd.DataFrame, x: str, y: str, group: str, n: int = None) -> pd.DataFrame:
+    """
+    Średnie w ≤ n wspólnych przedziałach czasu – dla wykresów skumulowanych
+    (area), gdzie wszystkie serie muszą mieć te same punkty x.
+    """
+    n = n or MAX_POINTS
+    if df.empty or df[x].nunique() <= n:
+        return df
+    bins = pd.cut(_as_float(df[x]), n, labels=False)
+    out = (df.assign(_bin=bins)
+             .groupby(["_bin", group], as_index=False, sort=True)
+             .agg(**{x: (x, "min"), y: (y, "mean")}))
+    # wspólny x kubełka dla wszystkich serii
+    out[x] = out.groupby("_bin")[x].transform("min")
+    return out.drop(columns="_bin")
+
+
+def render_mode(n_points: int) -> str:
+    """"webgl" dla dużych wykresów (render_mode w plotly.express), inaczej "svg"."""
+    return "webgl" if n_points > WEBGL_POINTS else "svg"
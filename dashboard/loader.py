@@ -0,0 +1,44 @@
+# dashboard/loader.py
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+except ImportError:  # starsze wersje Streamlit
+    add_script_run_ctx = get_script_run_ctx = None
+
+# Ile zapytań strony naraz (każde chybienie cache to osobne zapytanie HTTP / SQL)
+MAX_WORKERS = int(os.getenv("DASHBOARD_LOAD_WORKERS", "6"))
+
+
+class Prefetch:
+    """
+    Zapytania potrzebne stronie uruchomione równolegle w puli wątków.
+    `calls` to krotki (funkcja, *argumenty) – zwykle funkcje z cache, więc
+    wyniki trafiają do cache Streamlit. Wywołanie prefetch(fn, *args) czeka
+    tylko na to jedno zapytanie (albo wykonuje je od razu, jeśli nie było
+    zaplanowane). Czas do pierwszego wykresu wyznacza najwolniejsze
+    zapytanie, nie suma wszystkich.
+    """
+
+    def __init__(self, calls, max_workers: int = None):
+        ctx = get_script_run_ctx() if get_script_run_ctx else None
+
+        def attach():
+            # kontekst sesji w wątku – st.cache_data działa jak w wątku skryptu
+            if ctx is not None:
+                add_script_run_ctx(threading.current_thread(), ctx)
+
+        calls = list(dict.fromkeys(tuple(c) for c in calls))
+        workers = max(1, min(max_workers or MAX_WORKERS, len(calls) or 1))
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch", initializer=attach)
+        self.futures = {call: pool.submit(*call) for call in calls}
+        pool.shutdown(wait=False)
+
+    def __call__(self, fn, *args):
+        future = self.futures.get((fn, *args))
+        return future.result() if future is not None else fn(*args)
+
+    def __contains__(self, call) -> bool:
+        return tuple(call) in self.futures
@@ -1,7 +1,12 @@
 import os
+import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
 from dotenv import load_dotenv
 import pandas as pd
+from db.query import FIELDS, HistoryQuery, bucket_frame
+from etl.metrics import METRICS
 
 # Wczytanie .env
 load_dotenv("etl/.env", encoding="utf-8")
@@ -9,6 +14,26 @@ load_dotenv("etl/.env", encoding="utf-8")
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_ANON_KEY")
 TABLE = os.getenv("DATA_TABLE", "crypto_prices")
+COINS_TABLE = os.getenv("COINS_TABLE", "coins")
+ROLLUPS_TABLE = os.getenv("ROLLUPS_TABLE", "crypto_rollups")
+INDICATORS_TABLE = os.getenv("INDICATORS_TABLE", "crypto_indicators")
+STATE_TABLE = os.getenv("INDICATOR_STATE_TABLE", "indicator_state")
+SNAPSHOTS_TABLE = os.getenv("SNAPSHOTS_TABLE", "coin_snapshots")
+
+# Backend: "supabase" (PostgREST, domyślnie), "postgres" (psycopg2, db/postgres.py)
+# albo "parquet" (lokalna kopia kolumnowa, db/mirror.py)
+DB_BACKEND = os.getenv("DB_BACKEND", "supabase").lower()
+
+# Zapis wsadowy: rozmiar paczki, równoległość, liczba ponowień
+CHUNK_SIZE = int(os.getenv("DB_CHUNK_SIZE", "1000"))
+MAX_WORKERS = int(os.getenv("DB_MAX_WORKERS", "4"))
+MAX_RETRIES = int(os.getenv("DB_MAX_RETRIES", "3"))
+
+# Tabele historyczne partycjonowane miesięcznie (migracje 0003 i 0007)
+PARTITIONED_TABLES = [TABLE, "crypto_prices_hourly", "crypto_prices_5m"]
+
+# Odczyt stronicowany (domyślny limit max-rows w Supabase to 1000)
+PAGE_SIZE = int(os.getenv("DB_PAGE_SIZE", "1000"))
 
 HEADERS = {
     "apikey": SUPABASE_KEY,
@@ -20,15 +45,70 @@ HEADERS = {
 # ==============================
 #  INSERT
 # ==============================
-def insert_data(records):
-    url = f"{SUPABASE_URL}/rest/v1/{TABLE}?on_conflict=coin_id,date_"
-    
-    res = requests.post(url, headers=HEADERS, json=records)
+def _post_chunk(url, chunk, max_retries, table=TABLE):
+    """
+    Wysyła jedną paczkę. Upsert (on_conflict=coin_id,date_) jest idempotentny,
+    więc paczkę można bezpiecznie powtórzyć po timeoucie lub 5xx/429.
+    Zwraca None przy sukcesie albo opis ostatniego błędu.
+    """
+    error = None
+    with METRICS.timer("crypto_etl_upsert_chunk_seconds", "Czas zapisu paczki (z ponowieniami)", table=table):
+        for attempt in range(max_retries + 1):
+            try:
+                res = requests.post(url, headers=HEADERS, json=chunk, timeout=60)
+            except requests.RequestException as e:
+                error, reason = str(e), "network"
+            else:
+                if res.status_code in (200, 201, 204):
+                    return None
+                error, reason = f"{res.status_code}: {res.text[:200]}", str(res.status_code)
+                # błędy 4xx (poza 408/429) nie znikną po ponowieniu
+                if res.status_code < 500 and res.status_code not in (408, 429):
+                    return error
+            if attempt < max_retries:
+                METRICS.inc("crypto_etl_http_retries_total", 1, "Ponowienia zapytań HTTP",
+                            source="postgrest", reason=reason)
+                time.sleep(min(2 ** attempt, 30))
+    return error
+
+
+def insert_data(records, chunk_size: int = None, max_workers: int = None, max_retries: int = None,
+                table: str = None, on_conflict: str = "coin_id,date_"):
+    """
+    Upsert rekordów w paczkach po `chunk_size`, maks. `max_workers` naraz.
+    `records` to lista słowników albo DataFrame (paczki zamieniane na JSON
+    dopiero przy wysyłce). Zwraca {"written", "failed", "chunks", "failed_chunks", "errors"}.
+    """
+    url = f"{SUPABASE_URL}/rest/v1/{table or TABLE}?on_conflict={on_conflict}"
+    chunk_size = chunk_size or CHUNK_SIZE
+    max_retries = MAX_RETRIES if max_retries is None else max_retries
+
+    is_frame = isinstance(records, pd.DataFrame)
+    rows = records.iloc if is_frame else records
+    chunks = [rows[i:i + chunk_size] for i in range(0, len(records), chunk_size)]
+    workers = max(1, min(max_workers or MAX_WORKERS, len(chunks) or 1))
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        errors = list(pool.map(
+            lambda c: _post_chunk(url, frame_to_records(c) if is_frame else c, max_retries, table or TABLE), chunks
+        ))
 
-    if res.status_code in (200, 201, 204):
-        print(f"✅ Upsert udany — {len(records)} rekordów dodano lub zaktualizowano.")
+    failed = [(c, e) for c, e in zip(chunks, errors) if e is not None]
+    stats = {
+        "written": len(records) - sum(len(c) for c, _ in failed),
+        "failed": sum(len(c) for c, _ in failed),
+        "chunks": len(chunks),
+        "failed_chunks": len(failed),
+        "errors": [e for _, e in failed],
+    }
+    METRICS.inc("crypto_etl_rows_written_total", stats["written"], "Zapisane wiersze", table=table or TABLE)
+    METRICS.inc("crypto_etl_rows_failed_total", stats["failed"], "Wiersze z nieudanych paczek", table=table or TABLE)
+
+    if not failed:
+        print(f"✅ Upsert udany — {stats['written']} rekordów dodano lub zaktualizowano ({stats['chunks']} paczek).")
     else:
-        print(f"⚠️ Błąd ({res.status_code}): {res.text}")
+        print(f"⚠️ Upsert częściowy — zapisano {stats['written']}, błąd dla {stats['failed']} rekordów "
+              f"({stats['failed_chunks']}/{stats['chunks']} paczek). Pierwszy błąd: {stats['errors'][0]}")
+    return stats
 
 
 
@@ -38,40 +118,83 @@ def insert_data(records):
 # ==============================
 def list_coins():
     """
-    Zwraca listę unikalnych kryptowalut: coin_id + name.
+    Zwraca listę kryptowalut z wymiaru `coins`: coin_id, name, symbol,
+    first_date, last_date, row_count. Koszt zależy od liczby monet, nie od historii.
     """
-    url = f"{SUPABASE_URL}/rest/v1/{TABLE}"
+    url = f"{SUPABASE_URL}/rest/v1/{COINS_TABLE}"
     params = {
-        "select": "coin_id,name",
+        "select": "coin_id,name,symbol,first_date,last_date,row_count",
         "order": "coin_id",
     }
     res = requests.get(url, headers=HEADERS, params=params)
     res.raise_for_status()
 
-    df = pd.DataFrame(res.json()).drop_duplicates(["coin_id"])
-    return df
+    return pd.DataFrame(res.json(), columns=params["select"].split(","))
+
+
+def refresh_coins(coin_ids=None):
+    """Przelicza wymiar `coins` (RPC refresh_coins) dla podanych monet lub wszystkich."""
+    url = f"{SUPABASE_URL}/rest/v1/rpc/refresh_coins"
+    payload = {"p_coin_ids": list(coin_ids) if coin_ids is not None else None}
+    res = requests.post(url, headers=HEADERS, json=payload, timeout=60)
+    if not res.ok:
+        print(f"⚠️ Błąd odświeżania wymiaru coins ({res.status_code}): {res.text}")
+        return 0
+    return res.json()
+
+
+def ensure_partitions(start, end, tables=None):
+    """
+    Miesięczne partycje pokrywające [start, end] (RPC ensure_monthly_partitions) –
+    bez nich wiersze trafiają do partycji DEFAULT i zapytania nie pomijają
+    partycji. Wołane przed zapisem paczki; istniejące partycje są pomijane.
+    """
+    url = f"{SUPABASE_URL}/rest/v1/rpc/ensure_monthly_partitions"
+    created = 0
+    for table in tables or PARTITIONED_TABLES:
+        payload = {"p_table": table, "p_from": pd.Timestamp(start).isoformat(), "p_to": pd.Timestamp(end).isoformat()}
+        res = requests.post(url, headers=HEADERS, json=payload, timeout=60)
+        if not res.ok:
+            print(f"⚠️ Błąd tworzenia partycji {table} ({res.status_code}): {res.text}")
+            continue
+        created += res.json() or 0
+    return created
+
+
+def _in_filter(values):
+    quoted = ",".join('"' + str(v).replace('"', '') + '"' for v in values)
+    return f"in.({quoted})"
 
 
 # ==============================
-#  HISTORY FOR ONE COIN
+#  HIGH-WATER MARKS
 # ==============================
-def get_history(coin_id: str, start, end):
-    url = f"{SUPABASE_URL}/rest/v1/{TABLE}"
+def get_latest_dates(coin_ids):
+    """
+    Zwraca {coin_id: ostatni date_ (datetime UTC) lub None} – punkt startowy
+    dla przyrostowego pobierania. Jedno zapytanie do wymiaru `coins`.
+    """
+    coin_ids = list(coin_ids)
+    if not coin_ids:
+        return {}
+    url = f"{SUPABASE_URL}/rest/v1/{COINS_TABLE}"
+    params = {"select": "coin_id,last_date", "coin_id": _in_filter(coin_ids)}
+    res = requests.get(url, headers=HEADERS, params=params)
+    res.raise_for_status()
 
-    params = {
-        "select": "coin_id,name,current_price,total_volume,date_",
-        "coin_id": f"eq.{coin_id}",
-        "and": f"(date_.gte.{start.isoformat()},date_.lte.{end.isoformat()})",
-        "order": "date_.asc"
+    found = {
+        r["coin_id"]: pd.to_datetime(r["last_date"], utc=True).to_pydatetime()
+        for r in res.json() if r.get("last_date")
     }
+    return {c: found.get(c) for c in coin_ids}
 
-    res = requests.get(url, headers=HEADERS, params=params)
-    res.raise_for_status()
 
-    df = pd.DataFrame(res.json())
+# ==============================
+#  PAGINATED READS
+# ==============================
+def _rename_history(df):
     if df.empty:
         return df
-
     return df.rename(columns={
         "current_price": "price",
         "total_volume": "volume",
@@ -79,34 +202,307 @@ def get_history(coin_id: str, start, end):
     })
 
 
+def _history_params(start, end, coin_id=None):
+    params = {
+        "select": "coin_id,name,current_price,total_volume,date_",
+        "and": f"(date_.gte.{start.isoformat()},date_.lte.{end.isoformat()})",
+        # pełny porządek (date_, coin_id) – strony nie mogą się nakładać
+        "order": "date_.asc,coin_id.asc"
+    }
+    if coin_id is not None:
+        params["coin_id"] = f"eq.{coin_id}"
+    return params
+
+
+def frame_to_records(df: pd.DataFrame):
+    """DataFrame → lista słowników gotowa do JSON (daty jako ISO, NaN → None)."""
+    df = df.copy()
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.DatetimeTZDtype):
+            df[col] = df[col].dt.tz_convert("UTC").dt.strftime("%Y-%m-%dT%H:%M:%S.%f+00:00")
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].dt.strftime("%Y-%m-%dT%H:%M:%S.%f")
+    return df.astype(object).where(df.notna(), None).to_dict("records")
+
+
+def _get_page(url, params, offset, limit, count=False):
+    """Jedna strona przez nagłówek Range. Zwraca (wiersze, łączna liczba lub None)."""
+    headers = {**HEADERS, "Range-Unit": "items", "Range": f"{offset}-{offset + limit - 1}"}
+    if count:
+        headers["Prefer"] = "count=exact"
+    res = requests.get(url, headers=headers, params=params, timeout=60)
+    res.raise_for_status()
+    total = None
+    content_range = res.headers.get("Content-Range", "")
+    if "/" in content_range and not content_range.endswith("/*"):
+        total = int(content_range.rsplit("/", 1)[1])
+    return res.json(), total
+
+
+def _iter_pages(params, page_size=None, max_workers=None, table=None, transform=_rename_history, limit=None):
+    """
+    Pierwsza strona zwraca liczbę wierszy (count=exact), kolejne pobierane są
+    równolegle, ale w kolejności i z oknem `max_workers` stron – w pamięci
+    jest naraz co najwyżej kilka stron. `limit` – najwyżej tyle wierszy
+    (zakresy Range kończą się na limicie, nadmiarowe wiersze nie są przesyłane).
+    """
+    url = f"{SUPABASE_URL}/rest/v1/{table or TABLE}"
+    page_size = page_size or PAGE_SIZE
+    if limit is not None:
+        if limit <= 0:
+            return
+        page_size = min(page_size, limit)
+
+    rows, total = _get_page(url, params, 0, page_size, count=True)
+    yield transform(pd.DataFrame(rows))
+    if total is not None and limit is not None:
+        total = min(total, limit)
+    if total is None or len(rows) >= total:
+        return
+    # serwer mógł przyciąć stronę do swojego max-rows
+    if 0 < len(rows) < page_size:
+        page_size = len(rows)
+
+    workers = max(1, max_workers or MAX_WORKERS)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        window = []
+        for off in range(len(rows), total, page_size):
+            window.append(pool.submit(_get_page, url, params, off, min(page_size, total - off)))
+            if len(window) >= workers:
+                yield transform(pd.DataFrame(window.pop(0).result()[0]))
+        for fut in window:
+            yield transform(pd.DataFrame(fut.result()[0]))
+
+
+def _concat_pages(pages):
+    frames = [df for df in pages if not df.empty]
+    if not frames:
+        return pd.DataFrame()
+    return pd.concat(frames, ignore_index=True)
+
+
+# ==============================
+#  HISTORY FOR ONE COIN
+# ==============================
+def iter_history(coin_id: str, start, end, page_size: int = None):
+    """Generator DataFrame'ów (strony po `page_size` wierszy) dla jednej monety."""
+    return _iter_pages(_history_params(start, end, coin_id), page_size)
+
+
+def get_history(coin_id: str, start, end):
+    return _concat_pages(iter_history(coin_id, start, end))
 
 
 # ==============================
 #  HISTORY FOR ALL COINS
 # ==============================
+def iter_history_all(start, end, page_size: int = None):
+    """
+    Generator DataFrame'ów dla wszystkich monet – pozwala przetwarzać
+    wieloletnie zakresy bez trzymania całego wyniku w pamięci.
+    """
+    return _iter_pages(_history_params(start, end), page_size)
+
+
 def get_history_all(start, end):
-    url = f"{SUPABASE_URL}/rest/v1/{TABLE}"
+    return _concat_pages(iter_history_all(start, end))
+
+
+# ==============================
+#  QUERY BUILDER
+# ==============================
+# kubełki day/week/month czytane z agregatów ETL (crypto_rollups) – PostgREST nie grupuje
+_ROLLUP_FIELDS = {"coin_id": "coin_id", "current_price": "close", "total_volume": "volume", "date_": "bucket"}
+
+
+def _order_param(q: HistoryQuery, names=None):
+    names = names or {}
+    # dopełnienie kluczem (date_, coin_id) – pełny porządek, strony nie mogą się nakładać
+    return ",".join(f"{names.get(FIELDS[f], FIELDS[f])}.{'desc' if desc else 'asc'}" for f, desc in q.keyed().order_by)
+
+
+def query_history(q: HistoryQuery) -> pd.DataFrame:
+    """
+    Wykonuje HistoryQuery w PostgREST: coin_id=in.(...), select=, order=,
+    zakres czasu i limit po stronie serwera; kubełki day/week/month z tabeli
+    agregatów, kubełki godzinowe liczone po stronie klienta.
+    """
+    q.check_bucket()
+    if q.coin_ids is not None and not q.coin_ids:
+        return q.finish(None)
+
+    conds = []
+    rollups = q.bucket_unit in ("day", "week", "month")
+    time_col = "bucket" if rollups else "date_"
+    if q.start is not None:
+        conds.append(f"{time_col}.gte.{q.start.isoformat()}")
+    if q.end is not None:
+        conds.append(f"{time_col}.lte.{q.end.isoformat()}")
+    params = {}
+    if conds:
+        params["and"] = f"({','.join(conds)})"
+    if q.coin_ids is not None:
+        params["coin_id"] = _in_filter(q.coin_ids)
+
+    if rollups:
+        params.update({
+            "select": ",".join(dict.fromkeys(_ROLLUP_FIELDS[c] for c in q.columns())),
+            "period": f"eq.{q.bucket_unit}",
+            "order": _order_param(q, _ROLLUP_FIELDS),
+        })
+        back = {v: k for k, v in _ROLLUP_FIELDS.items()}
+        pages = _iter_pages(params, table=ROLLUPS_TABLE, transform=lambda df: df.rename(columns=back),
+                            limit=q.limit_rows)
+        return q.finish(_concat_pages(pages))
+
+    if q.bucket_unit:
+        params.update({"select": "coin_id,current_price,total_volume,date_", "order": "date_.asc,coin_id.asc"})
+        raw = _concat_pages(_iter_pages(params, transform=lambda df: df))
+        return q.finish(bucket_frame(raw, q.bucket_unit))
+
+    params.update({"select": ",".join(dict.fromkeys(q.columns())), "order": _order_param(q)})
+    return q.finish(_concat_pages(_iter_pages(params, transform=lambda df: df, limit=q.limit_rows)))
+
+
+# ==============================
+#  KPI
+# ==============================
+def get_kpis(coin_ids, now):
+    """
+    Ostatnia cena i średnie 7/30 dni dla wielu monet w jednym zapytaniu
+    (coin_id=in.(...), ostatnie 30 dni) zamiast osobnej historii na monetę.
+    """
+    from etl.analytics import kpis
 
     params = {
-        "select": "coin_id,name,current_price,total_volume,date_",
+        "select": "coin_id,current_price,date_",
+        "coin_id": _in_filter(coin_ids),
+        "and": f"(date_.gte.{(now - timedelta(days=30)).isoformat()},date_.lte.{now.isoformat()})",
+        "order": "date_.asc,coin_id.asc",
+    }
+    return kpis(_concat_pages(_iter_pages(params)), now)
+
+
+# ==============================
+#  ROLLUPS
+# ==============================
+ROLLUP_NUMERIC = ["open", "high", "low", "close", "volume", "points", "ret", "ma_short", "ma_long", "vol_long"]
+
+
+def _rollups_frame(df):
+    if df.empty:
+        return df
+    df["bucket"] = pd.to_datetime(df["bucket"], utc=True)
+    for col in ROLLUP_NUMERIC:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def insert_rollups(df: pd.DataFrame):
+    """Upsert agregatów (klucz: coin_id, period, bucket)."""
+    if df.empty:
+        return {"written": 0, "failed": 0, "chunks": 0, "failed_chunks": 0, "errors": []}
+    return insert_data(frame_to_records(df), table=ROLLUPS_TABLE, on_conflict="coin_id,period,bucket")
+
+
+def get_rollups(period: str, start, end, coin_ids=None, columns=None):
+    """
+    Agregaty dla okresu "day" / "week" / "month" z przedziału [start, end]
+    (po `bucket`), opcjonalnie tylko dla wybranych monet i kolumn.
+    """
+    params = {
+        "select": ",".join(columns) if columns else "*",
+        "period": f"eq.{period}",
+        "and": f"(bucket.gte.{start.isoformat()},bucket.lte.{end.isoformat()})",
+        "order": "bucket.asc,coin_id.asc",
+    }
+    if coin_ids is not None:
+        params["coin_id"] = _in_filter(coin_ids)
+    return _concat_pages(_iter_pages(params, table=ROLLUPS_TABLE, transform=_rollups_frame))
+
+
+# ==============================
+#  INDICATORS
+# ==============================
+INDICATOR_NUMERIC = ["ret", "sma7", "sma30", "ema12", "ema26", "vol30"]
+
+
+def _indicators_frame(df):
+    if df.empty:
+        return df
+    df = df.rename(columns={"date_": "ts"})
+    df["ts"] = pd.to_datetime(df["ts"], utc=True)
+    for col in INDICATOR_NUMERIC:
+        if col in df.columns:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+    return df
+
+
+def insert_indicators(df: pd.DataFrame):
+    """Upsert wskaźników (klucz: coin_id, date_) – kolumna ts zapisywana jako date_."""
+    if df.empty:
+        return {"written": 0, "failed": 0, "chunks": 0, "failed_chunks": 0, "errors": []}
+    return insert_data(frame_to_records(df.rename(columns={"ts": "date_"})), table=INDICATORS_TABLE)
+
+
+def get_indicators(coin_id: str, start, end):
+    params = {
+        "select": "coin_id,date_," + ",".join(INDICATOR_NUMERIC),
+        "coin_id": f"eq.{coin_id}",
         "and": f"(date_.gte.{start.isoformat()},date_.lte.{end.isoformat()})",
-        "order": "date_.asc"
+        "order": "date_.asc",
     }
+    return _concat_pages(_iter_pages(params, table=INDICATORS_TABLE, transform=_indicators_frame))
 
+
+def get_indicator_state(coin_ids):
+    """Zwraca {coin_id: stan} dla monet, które mają zapisany stan wskaźników."""
+    coin_ids = list(coin_ids)
+    if not coin_ids:
+        return {}
+    url = f"{SUPABASE_URL}/rest/v1/{STATE_TABLE}"
+    params = {"select": "coin_id,state", "coin_id": _in_filter(coin_ids)}
     res = requests.get(url, headers=HEADERS, params=params)
     res.raise_for_status()
+    return {r["coin_id"]: r["state"] for r in res.json()}
+
+
+def save_indicator_state(states: dict):
+    records = [{"coin_id": c, "state": st} for c, st in states.items()]
+    if not records:
+        return {"written": 0, "failed": 0, "chunks": 0, "failed_chunks": 0, "errors": []}
+    return insert_data(records, table=STATE_TABLE, on_conflict="coin_id")
+
 
-    df = pd.DataFrame(res.json())
+# ==============================
+#  SNAPSHOTS
+# ==============================
+SNAPSHOT_NUMERIC = ["current_price", "total_volume", "market_cap", "high_24h", "low_24h",
+                    "price_change_percentage_24h"]
+
+
+def insert_snapshots(df: pd.DataFrame):
+    """Upsert stanu bieżącego monet (klucz: coin_id) – historia w crypto_prices bez zmian."""
     if df.empty:
-        return df
+        return {"written": 0, "failed": 0, "chunks": 0, "failed_chunks": 0, "errors": []}
+    return insert_data(frame_to_records(df), table=SNAPSHOTS_TABLE, on_conflict="coin_id")
 
-    return df.rename(columns={
-        "current_price": "price",
-        "total_volume": "volume",
-        "date_": "ts"
-    })
 
+def get_snapshots(coin_ids=None):
+    params = {"select": "*", "order": "coin_id.asc"}
+    if coin_ids is not None:
+        params["coin_id"] = _in_filter(coin_ids)
+
+    def frame(df):
+        if df.empty:
+            return df
+        df["updated_at"] = pd.to_datetime(df["updated_at"], utc=True)
+        for col in SNAPSHOT_NUMERIC:
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        return df
 
+    return _concat_pages(_iter_pages(params, table=SNAPSHOTS_TABLE, transform=frame))
 
 
 # ==============================
@@ -116,3 +512,30 @@ def clear_table():
     url = f"{SUPABASE_URL}/rest/v1/{TABLE}?id=neq.0"
     res = requests.delete(url, headers=HEADERS)
     print("🗑️ Tabela wyczyszczona." if res.ok else f"⚠️ Błąd czyszczenia: {res.text}")
+
+
+
+# ==============================
+#  BACKEND
+# ==============================
+# Wszystkie funkcje powyżej to implementacja Supabase/PostgREST. Dla
+# DB_BACKEND=postgres to samo API dostarcza natywny backend (COPY + kursory),
+# a dla DB_BACKEND=parquet – lokalna kopia Parquet (odczyt bez sieci).
+if DB_BACKEND == "postgres":
+    from db.postgres import (  # noqa: E402,F401,F811
+        insert_data, get_latest_dates, list_coins, refresh_coins, ensure_partitions,
+        iter_history, get_history, iter_history_all, get_history_all, query_history,
+        get_kpis, insert_rollups, get_rollups,
+        insert_indicators, get_indicators, get_indicator_state, save_indicator_state,
+        insert_snapshots, get_snapshots, clear_table,
+    )
+elif DB_BACKEND == "parquet":
+    from db.mirror import (  # noqa: E402,F401,F811
+        insert_data, get_latest_dates, list_coins, refresh_coins, ensure_partitions,
+        iter_history, get_history, iter_history_all, get_history_all, query_history,
+        get_kpis, insert_rollups, get_rollups,
+        insert_indicators, get_indicators, get_indicator_state, save_indicator_state,
+        insert_snapshots, get_snapshots, clear_table,
+    )
+elif DB_BACKEND != "supabase":
+    raise ValueError(f"Nieznany DB_BACKEND: {DB_BACKEND!r} (dostępne: supabase, postgres, parquet)")
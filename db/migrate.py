@@ -0,0 +1,106 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import re
+from datetime import datetime, timedelta, timezone
+
+from db.postgres import connection, ensure_partitions
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+MIGRATION_RE = re.compile(r"^(\d{4})_(.+)\.sql$")
+
+
+# ==============================
+#  DISCOVERY
+# ==============================
+def list_migrations(path: str = MIGRATIONS_DIR):
+    """Zwraca [(wersja, nazwa, ścieżka)] posortowane po wersji."""
+    out = []
+    for fname in sorted(os.listdir(path)):
+        m = MIGRATION_RE.match(fname)
+        if m:
+            out.append((int(m.group(1)), m.group(2), os.path.join(path, fname)))
+    versions = [v for v, _, _ in out]
+    if len(versions) != len(set(versions)):
+        raise RuntimeError("❌ Zduplikowany numer migracji w db/migrations.")
+    return out
+
+
+def _ensure_history_table(cur):
+    cur.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+          version INTEGER PRIMARY KEY,
+          name TEXT NOT NULL,
+          applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    """)
+
+
+def applied_versions():
+    with connection() as conn:
+        with conn.cursor() as cur:
+            _ensure_history_table(cur)
+            cur.execute("SELECT version FROM schema_migrations")
+            return {row[0] for row in cur.fetchall()}
+
+
+# ==============================
+#  APPLY
+# ==============================
+def migrate(target: int = None):
+    """
+    Aplikuje brakujące migracje po kolei, każdą w osobnej transakcji
+    (błąd cofa tylko bieżącą migrację). Zwraca listę zaaplikowanych wersji.
+    """
+    done = applied_versions()
+    applied = []
+    for version, name, path in list_migrations():
+        if version in done or (target is not None and version > target):
+            continue
+        with open(path, encoding="utf-8") as f:
+            script = f.read()
+        with connection() as conn:
+            with conn.cursor() as cur:
+                # blokada chroni przed równoległym uruchomieniem migracji
+                cur.execute("SELECT pg_advisory_xact_lock(hashtext('schema_migrations'))")
+                cur.execute("SELECT 1 FROM schema_migrations WHERE version = %s", (version,))
+                if cur.fetchone():
+                    continue
+                cur.execute(script)
+                cur.execute("INSERT INTO schema_migrations (version, name) VALUES (%s, %s)", (version, name))
+        print(f"✅ Migracja {version:04d}_{name} zaaplikowana.")
+        applied.append(version)
+    if not applied:
+        print("✅ Schemat aktualny — brak migracji do wykonania.")
+    return applied
+
+
+def status():
+    done = applied_versions()
+    for version, name, _ in list_migrations():
+        print(f"{'✅' if version in done else '⏳'} {version:04d}_{name}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Migracje schematu crypto_prices (DATABASE_URL).")
+    sub = parser.add_subparsers(dest="cmd")
+    up = sub.add_parser("up", help="zaaplikuj brakujące migracje")
+    up.add_argument("--target", type=int, default=None)
+    sub.add_parser("status", help="pokaż stan migracji")
+    part = sub.add_parser("partitions", help="utwórz partycje miesięczne na zapas")
+    part.add_argument("--months-ahead", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.cmd == "status":
+        status()
+    elif args.cmd == "partitions":
+        now = datetime.now(timezone.utc)
+        created = ensure_partitions(now, now + timedelta(days=31 * args.months_ahead))
+        print(f"📅 Partycje gotowe ({created} nowych).")
+    else:
+        migrate(getattr(args, "target", None))
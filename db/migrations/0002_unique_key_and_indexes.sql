@@ -0,0 +1,18 @@
+-- 0002: klucz naturalny (coin_id, date_) wymagany przez upsert on_conflict
+-- oraz BRIN na date_ dla skanów zakresowych dashboardu.
+
+-- duplikaty z okresu bez ograniczenia: zostaje najnowszy wiersz (max id)
+DELETE FROM crypto_prices a
+USING crypto_prices b
+WHERE a.coin_id = b.coin_id
+  AND a.date_ = b.date_
+  AND a.id < b.id;
+
+-- unikalny indeks (coin_id, date_) jest jednocześnie indeksem złożonym
+-- dla zapytań "moneta + zakres dat"
+ALTER TABLE crypto_prices
+  ADD CONSTRAINT crypto_prices_coin_id_date__key UNIQUE (coin_id, date_);
+
+-- dane wpadają chronologicznie, więc BRIN jest mały i skuteczny
+CREATE INDEX IF NOT EXISTS crypto_prices_date__brin
+  ON crypto_prices USING brin (date_);
@@ -0,0 +1,77 @@
+-- 0003: partycjonowanie miesięczne tabel historycznych (RANGE po date_).
+--
+-- ensure_monthly_partitions(tabela, od, do) tworzy brakujące partycje
+-- <tabela>_pYYYYMM. Wiersze, które wcześniej trafiły do partycji DEFAULT,
+-- są przenoszone do nowej partycji, więc funkcję można wołać w dowolnym momencie.
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(
+  p_table TEXT, p_from TIMESTAMPTZ, p_to TIMESTAMPTZ
+) RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+  m TIMESTAMPTZ := date_trunc('month', p_from AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+  hi TIMESTAMPTZ;
+  part TEXT;
+  dflt TEXT := p_table || '_default';
+  created INTEGER := 0;
+BEGIN
+  WHILE m <= p_to LOOP
+    hi := m + INTERVAL '1 month';
+    part := p_table || '_p' || to_char(m AT TIME ZONE 'UTC', 'YYYYMM');
+    IF to_regclass(part) IS NULL THEN
+      EXECUTE format('CREATE TEMP TABLE _moved AS SELECT * FROM %I WITH NO DATA', dflt);
+      EXECUTE format(
+        'WITH d AS (DELETE FROM %I WHERE date_ >= $1 AND date_ < $2 RETURNING *) '
+        'INSERT INTO _moved SELECT * FROM d', dflt) USING m, hi;
+      EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                     part, p_table, m, hi);
+      EXECUTE format('INSERT INTO %I SELECT * FROM _moved', p_table);
+      DROP TABLE _moved;
+      created := created + 1;
+    END IF;
+    m := hi;
+  END LOOP;
+  RETURN created;
+END;
+$$;
+
+ALTER TABLE crypto_prices RENAME TO crypto_prices_legacy;
+ALTER TABLE crypto_prices_legacy RENAME CONSTRAINT crypto_prices_coin_id_date__key TO crypto_prices_legacy_coin_date_key;
+ALTER INDEX crypto_prices_date__brin RENAME TO crypto_prices_legacy_date_brin;
+
+-- klucz partycjonowania musi wchodzić w skład PK i UNIQUE
+CREATE TABLE crypto_prices (
+  id BIGSERIAL,
+  coin_id TEXT NOT NULL,
+  symbol TEXT,
+  name TEXT,
+  current_price NUMERIC,
+  market_cap NUMERIC,
+  total_volume NUMERIC,
+  high_24h NUMERIC,
+  low_24h NUMERIC,
+  price_change_percentage_24h NUMERIC,
+
+  date_ TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (id, date_),
+  CONSTRAINT crypto_prices_coin_id_date__key UNIQUE (coin_id, date_)
+) PARTITION BY RANGE (date_);
+
+CREATE INDEX crypto_prices_date__brin ON crypto_prices USING brin (date_);
+
+-- siatka bezpieczeństwa: wiersze spoza utworzonych miesięcy
+CREATE TABLE crypto_prices_default PARTITION OF crypto_prices DEFAULT;
+
+SELECT ensure_monthly_partitions(
+  'crypto_prices',
+  COALESCE((SELECT min(date_) FROM crypto_prices_legacy), now()),
+  now() + INTERVAL '3 months'
+);
+
+INSERT INTO crypto_prices (coin_id, symbol, name, current_price, market_cap, total_volume,
+                           high_24h, low_24h, price_change_percentage_24h, date_)
+SELECT coin_id, symbol, name, current_price, market_cap, total_volume,
+       high_24h, low_24h, price_change_percentage_24h, date_
+FROM crypto_prices_legacy
+ORDER BY date_, coin_id;
+
+DROP TABLE crypto_prices_legacy;
@@ -0,0 +1,41 @@
+-- 0004: wymiar monet – list_coins() czyta O(liczba monet) zamiast całej historii.
+CREATE TABLE IF NOT EXISTS coins (
+  coin_id TEXT PRIMARY KEY,
+  symbol TEXT,
+  name TEXT,
+  first_date TIMESTAMPTZ,
+  last_date TIMESTAMPTZ,
+  row_count BIGINT NOT NULL DEFAULT 0,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Przelicza wiersze wymiaru dla podanych monet (NULL = wszystkie).
+-- Agregaty per moneta korzystają z indeksu (coin_id, date_). Wołane przez ETL
+-- po każdym zapisie (PostgREST: POST /rest/v1/rpc/refresh_coins).
+CREATE OR REPLACE FUNCTION refresh_coins(p_coin_ids TEXT[] DEFAULT NULL)
+RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+  n INTEGER;
+BEGIN
+  INSERT INTO coins AS c (coin_id, symbol, name, first_date, last_date, row_count, updated_at)
+  SELECT coin_id,
+         (array_agg(symbol ORDER BY date_ DESC))[1],
+         (array_agg(name ORDER BY date_ DESC))[1],
+         min(date_), max(date_), count(*), now()
+  FROM crypto_prices
+  WHERE p_coin_ids IS NULL OR coin_id = ANY(p_coin_ids)
+  GROUP BY coin_id
+  ON CONFLICT (coin_id) DO UPDATE SET
+    symbol = EXCLUDED.symbol,
+    name = EXCLUDED.name,
+    first_date = EXCLUDED.first_date,
+    last_date = EXCLUDED.last_date,
+    row_count = EXCLUDED.row_count,
+    updated_at = EXCLUDED.updated_at;
+  GET DIAGNOSTICS n = ROW_COUNT;
+  RETURN n;
+END;
+$$;
+
+SELECT refresh_coins();
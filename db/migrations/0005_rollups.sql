@@ -0,0 +1,21 @@
+-- 0005: agregaty liczone w ETL (dzień / tydzień / miesiąc) dla dashboardu.
+CREATE TABLE IF NOT EXISTS crypto_rollups (
+  coin_id TEXT NOT NULL,
+  period TEXT NOT NULL CHECK (period IN ('day', 'week', 'month')),
+  bucket TIMESTAMPTZ NOT NULL,
+  open NUMERIC,
+  high NUMERIC,
+  low NUMERIC,
+  close NUMERIC,
+  volume NUMERIC,
+  points INTEGER NOT NULL DEFAULT 0,
+  ret DOUBLE PRECISION,
+  ma_short NUMERIC,
+  ma_long NUMERIC,
+  vol_long DOUBLE PRECISION,
+  PRIMARY KEY (coin_id, period, bucket)
+);
+
+-- zapytania dashboardu: jeden okres, zakres czasu, wszystkie monety
+CREATE INDEX IF NOT EXISTS crypto_rollups_period_bucket_idx
+  ON crypto_rollups (period, bucket);
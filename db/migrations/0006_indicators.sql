@@ -0,0 +1,19 @@
+-- 0006: wskaźniki kroczące liczone przyrostowo w ETL (etl/indicators.py)
+-- oraz ich zwarty stan per moneta (bufory okien + sumy bieżące).
+CREATE TABLE IF NOT EXISTS crypto_indicators (
+  coin_id TEXT NOT NULL,
+  date_ TIMESTAMPTZ NOT NULL,
+  ret DOUBLE PRECISION,
+  sma7 NUMERIC,
+  sma30 NUMERIC,
+  ema12 NUMERIC,
+  ema26 NUMERIC,
+  vol30 DOUBLE PRECISION,
+  PRIMARY KEY (coin_id, date_)
+);
+
+CREATE TABLE IF NOT EXISTS indicator_state (
+  coin_id TEXT PRIMARY KEY,
+  state JSONB NOT NULL,
+  updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
@@ -0,0 +1,45 @@
+-- 0007: tabele danych śródziennych (etl/backfill.py) – godzinowe i 5-minutowe.
+-- Ten sam układ kolumn i klucz (coin_id, date_) co crypto_prices, więc zapis
+-- idzie tą samą ścieżką upsert; partycje miesięczne jak w 0003.
+CREATE TABLE IF NOT EXISTS crypto_prices_hourly (
+  id BIGSERIAL,
+  coin_id TEXT NOT NULL,
+  symbol TEXT,
+  name TEXT,
+  current_price NUMERIC,
+  market_cap NUMERIC,
+  total_volume NUMERIC,
+  high_24h NUMERIC,
+  low_24h NUMERIC,
+  price_change_percentage_24h NUMERIC,
+
+  date_ TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (id, date_),
+  CONSTRAINT crypto_prices_hourly_coin_id_date__key UNIQUE (coin_id, date_)
+) PARTITION BY RANGE (date_);
+
+CREATE INDEX IF NOT EXISTS crypto_prices_hourly_date__brin ON crypto_prices_hourly USING brin (date_);
+CREATE TABLE IF NOT EXISTS crypto_prices_hourly_default PARTITION OF crypto_prices_hourly DEFAULT;
+
+CREATE TABLE IF NOT EXISTS crypto_prices_5m (
+  id BIGSERIAL,
+  coin_id TEXT NOT NULL,
+  symbol TEXT,
+  name TEXT,
+  current_price NUMERIC,
+  market_cap NUMERIC,
+  total_volume NUMERIC,
+  high_24h NUMERIC,
+  low_24h NUMERIC,
+  price_change_percentage_24h NUMERIC,
+
+  date_ TIMESTAMPTZ NOT NULL,
+  PRIMARY KEY (id, date_),
+  CONSTRAINT crypto_prices_5m_coin_id_date__key UNIQUE (coin_id, date_)
+) PARTITION BY RANGE (date_);
+
+CREATE INDEX IF NOT EXISTS crypto_prices_5m_date__brin ON crypto_prices_5m USING brin (date_);
+CREATE TABLE IF NOT EXISTS crypto_prices_5m_default PARTITION OF crypto_prices_5m DEFAULT;
+
+SELECT ensure_monthly_partitions('crypto_prices_hourly', now() - INTERVAL '1 month', now() + INTERVAL '3 months');
+SELECT ensure_monthly_partitions('crypto_prices_5m', now() - INTERVAL '1 month', now() + INTERVAL '3 months');
@@ -0,0 +1,16 @@
+-- 0008: stan bieżący monet z /coins/markets (tryb snapshot, etl/fetch_data.py).
+-- Osobna tabela, jeden wiersz na monetę: snapshot nie zapisuje punktów
+-- w crypto_prices, więc nie przesuwa last_date w wymiarze coins (punkt
+-- startowy przyrostowego pobierania) i nie nadpisuje dziennych cen historii.
+CREATE TABLE IF NOT EXISTS coin_snapshots (
+  coin_id TEXT PRIMARY KEY,
+  symbol TEXT,
+  name TEXT,
+  current_price NUMERIC,
+  total_volume NUMERIC,
+  market_cap NUMERIC,
+  high_24h NUMERIC,
+  low_24h NUMERIC,
+  price_change_percentage_24h NUMERIC,
+  updated_at TIMESTAMPTZ NOT NULL
+);
@@ -0,0 +1,38 @@
+-- 0009: ensure_monthly_partitions bezpieczne przy równoległym wołaniu.
+-- Loader (etl/pipeline.py, DAG) i backfill wołają funkcję z wielu workerów
+-- naraz dla tych samych miesięcy; bez blokady druga transakcja czeka na
+-- CREATE TABLE pierwszej i kończy się "relation already exists".
+-- Blokada doradcza per tabela (do końca transakcji) szereguje wywołania,
+-- a to_regclass sprawdzany po jej uzyskaniu widzi partycje utworzone przez
+-- poprzednika, więc druga transakcja po prostu je pomija.
+CREATE OR REPLACE FUNCTION ensure_monthly_partitions(
+  p_table TEXT, p_from TIMESTAMPTZ, p_to TIMESTAMPTZ
+) RETURNS INTEGER
+LANGUAGE plpgsql AS $$
+DECLARE
+  m TIMESTAMPTZ := date_trunc('month', p_from AT TIME ZONE 'UTC') AT TIME ZONE 'UTC';
+  hi TIMESTAMPTZ;
+  part TEXT;
+  dflt TEXT := p_table || '_default';
+  created INTEGER := 0;
+BEGIN
+  PERFORM pg_advisory_xact_lock(hashtext(p_table));
+  WHILE m <= p_to LOOP
+    hi := m + INTERVAL '1 month';
+    part := p_table || '_p' || to_char(m AT TIME ZONE 'UTC', 'YYYYMM');
+    IF to_regclass(part) IS NULL THEN
+      EXECUTE format('CREATE TEMP TABLE _moved AS SELECT * FROM %I WITH NO DATA', dflt);
+      EXECUTE format(
+        'WITH d AS (DELETE FROM %I WHERE date_ >= $1 AND date_ < $2 RETURNING *) '
+        'INSERT INTO _moved SELECT * FROM d', dflt) USING m, hi;
+      EXECUTE format('CREATE TABLE %I PARTITION OF %I FOR VALUES FROM (%L) TO (%L)',
+                     part, p_table, m, hi);
+      EXECUTE format('INSERT INTO %I SELECT * FROM _moved', p_table);
+      DROP TABLE _moved;
+      created := created + 1;
+    END IF;
+    m := hi;
+  END LOOP;
+  RETURN created;
+END;
+$$;
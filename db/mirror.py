@@ -0,0 +1,352 @@
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from dotenv import load_dotenv
+
+from db.query import HistoryQuery, bucket_frame
+
+# Wczytanie .env
+load_dotenv("etl/.env", encoding="utf-8")
+
+# Lokalna kopia kolumnowa: <MIRROR_DIR>/coin_id=<id>/month=<YYYY-MM>/data.parquet
+MIRROR_DIR = os.getenv("LOCAL_MIRROR_DIR", "data/mirror")
+TABLE = "crypto_prices"
+
+NUMERIC_COLUMNS = [
+    "current_price", "market_cap", "total_volume",
+    "high_24h", "low_24h", "price_change_percentage_24h",
+]
+HISTORY_COLUMNS = ["coin_id", "name", "current_price", "total_volume", "date_"]
+
+_write_lock = threading.Lock()
+
+
+# ==============================
+#  WRITE
+# ==============================
+def _normalize(df: pd.DataFrame) -> pd.DataFrame:
+    df = df.copy()
+    # kolumny kategoryczne (stałe monety z fetch_data) → zwykłe napisy, jak w istniejących plikach
+    for col in df.select_dtypes("category").columns:
+        df[col] = df[col].astype(str)
+    df["coin_id"] = df["coin_id"].astype(str)
+    df["date_"] = pd.to_datetime(df["date_"], utc=True)
+    # brakujące kolumny (np. pola stanu bieżącego w paczce z market_chart) jako NaN – jeden schemat plików
+    for col in NUMERIC_COLUMNS:
+        df[col] = pd.to_numeric(df[col], errors="coerce").astype("float64") if col in df.columns else np.nan
+    return df
+
+
+def _partition_path(root, coin_id, month):
+    return os.path.join(root, f"coin_id={coin_id}", f"month={month}", "data.parquet")
+
+
+def table_root(root: str = None, table: str = None) -> str:
+    """Katalog kopii tabeli: crypto_prices w MIRROR_DIR, inne (np. śródzienne) obok – <MIRROR_DIR>_<tabela>."""
+    root = (root or MIRROR_DIR).rstrip("/\\")
+    return root if table in (None, TABLE) else f"{root}_{table}"
+
+
+def insert_data(records, root: str = None, table: str = None, **_):
+    """
+    Dopisuje rekordy do lokalnej kopii. Każda partycja (moneta, miesiąc) jest
+    scalana z istniejącym plikiem (per date_ wygrywa ostatnia niepusta wartość
+    każdej kolumny) i zapisywana atomowo – jak upsert tylko wysłanych kolumn,
+    ponowny zapis tych samych dni jest idempotentny.
+    """
+    root = table_root(root, table)
+    df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(records)
+    if df.empty:
+        return {"written": 0, "failed": 0, "chunks": 0, "failed_chunks": 0, "errors": []}
+
+    df = _normalize(df)
+    months = df["date_"].dt.strftime("%Y-%m")
+    partitions = 0
+    with _write_lock:
+        for (coin_id, month), part in df.groupby([df["coin_id"], months], sort=False):
+            path = _partition_path(root, coin_id, month)
+            if os.path.exists(path):
+                part = pd.concat([pd.read_parquet(path), part.drop(columns=["coin_id"])], ignore_index=True)
+            else:
+                part = part.drop(columns=["coin_id"])
+            part = part.groupby("date_", sort=True, as_index=False).last()
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp = path + ".tmp"
+            pq.write_table(pa.Table.from_pandas(part, preserve_index=False), tmp)
+            os.replace(tmp, path)
+            partitions += 1
+
+    print(f"💾 Kopia lokalna — {len(df)} rekordów w {partitions} partycjach ({root}).")
+    return {"written": len(df), "failed": 0, "chunks": partitions, "failed_chunks": 0, "errors": []}
+
+
+# ==============================
+#  READ
+# ==============================
+def _dataset(root=None):
+    root = root or MIRROR_DIR
+    if not os.path.isdir(root):
+        return None
+    # use_mmap=True – pliki są mapowane w pamięć zamiast kopiowane do buforów
+    return ds.dataset(
+        root, format="parquet",
+        filesystem=fs.LocalFileSystem(use_mmap=True),
+        partitioning=ds.partitioning(
+            pa.schema([("coin_id", pa.string()), ("month", pa.string())]), flavor="hive"
+        ),
+    )
+
+
+def _utc(ts) -> pd.Timestamp:
+    ts = pd.Timestamp(ts)
+    return ts.tz_convert("UTC") if ts.tzinfo else ts.tz_localize("UTC")
+
+
+def _filter(start=None, end=None, coin_ids=None):
+    expr = None
+
+    def add(e):
+        return e if expr is None else expr & e
+
+    if coin_ids is not None:
+        expr = add(ds.field("coin_id").isin(list(coin_ids)))
+    # najpierw filtr po partycji month (pomija całe katalogi), potem dokładny po date_
+    if start is not None:
+        start = _utc(start)
+        expr = add(ds.field("month") >= start.strftime("%Y-%m"))
+        expr = add(ds.field("date_") >= pa.scalar(start.to_pydatetime(), pa.timestamp("us", "UTC")))
+    if end is not None:
+        end = _utc(end)
+        expr = add(ds.field("month") <= end.strftime("%Y-%m"))
+        expr = add(ds.field("date_") <= pa.scalar(end.to_pydatetime(), pa.timestamp("us", "UTC")))
+    return expr
+
+
+def read_table(start=None, end=None, coin_ids=None, columns=None, root=None) -> pa.Table:
+    """Czyta z kopii tylko potrzebne partycje i kolumny jako tabelę Arrow."""
+    dataset = _dataset(root)
+    if dataset is None:
+        return pa.table({c: [] for c in (columns or HISTORY_COLUMNS)})
+    return dataset.to_table(columns=columns, filter=_filter(start, end, coin_ids))
+
+
+def _rename_history(df):
+    if df.empty:
+        return df
+    return df.rename(columns={
+        "current_price": "price",
+        "total_volume": "volume",
+        "date_": "ts"
+    })
+
+
+def get_history(coin_id: str, start, end):
+    table = read_table(start, end, [coin_id] if coin_id is not None else None, HISTORY_COLUMNS)
+    df = table.to_pandas()
+    if df.empty:
+        return df
+    return _rename_history(df.sort_values(["date_", "coin_id"]).reset_index(drop=True))
+
+
+def get_history_all(start, end):
+    return get_history(None, start, end)
+
+
+def iter_history(coin_id: str, start, end, page_size: int = None):
+    dataset = _dataset()
+    if dataset is None:
+        return
+    scanner = dataset.scanner(
+        columns=HISTORY_COLUMNS,
+        filter=_filter(start, end, [coin_id] if coin_id is not None else None),
+        batch_size=page_size or 65536,
+    )
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield _rename_history(batch.to_pandas())
+
+
+def iter_history_all(start, end, page_size: int = None):
+    return iter_history(None, start, end, page_size)
+
+
+def query_history(q: HistoryQuery) -> pd.DataFrame:
+    """HistoryQuery na kopii: filtr monet i czasu pomija partycje, czytane są tylko potrzebne kolumny."""
+    q.check_bucket()
+    if q.coin_ids is not None and not q.coin_ids:
+        return q.finish(None)
+    columns = ["coin_id", "current_price", "total_volume", "date_"] if q.bucket_unit else \
+        list(dict.fromkeys(q.columns()))
+    df = read_table(q.start, q.end, q.coin_ids, columns).to_pandas()
+    if q.bucket_unit:
+        df = bucket_frame(df, q.bucket_unit)
+    return q.finish(df)
+
+
+def list_coins():
+    table = read_table(columns=["coin_id", "name", "date_"])
+    df = table.to_pandas()
+    if df.empty:
+        return pd.DataFrame(columns=["coin_id", "name", "first_date", "last_date", "row_count"])
+    return (df.groupby("coin_id", as_index=False)
+              .agg(name=("name", "last"), first_date=("date_", "min"),
+                   last_date=("date_", "max"), row_count=("date_", "size"))
+              .sort_values("coin_id")
+              .reset_index(drop=True))
+
+
+def get_latest_dates(coin_ids):
+    coin_ids = list(coin_ids)
+    table = read_table(coin_ids=coin_ids, columns=["coin_id", "date_"])
+    df = table.to_pandas()
+    found = df.groupby("coin_id")["date_"].max().to_dict() if not df.empty else {}
+    return {c: (found[c].to_pydatetime() if c in found else None) for c in coin_ids}
+
+
+def insert_rollups(df: pd.DataFrame):
+    # agregaty kopii lokalnej liczone są przy odczycie (get_rollups)
+    return {"written": 0, "failed": 0, "chunks": 0, "failed_chunks": 0, "errors": []}
+
+
+def get_rollups(period: str, start, end, coin_ids=None, columns=None):
+    """Agregaty liczone w locie z kopii (z zapasem na statystyki kroczące)."""
+    from etl.rollups import compute_rollups, lookback_start, bucket_start
+
+    lo = lookback_start(bucket_start(_utc(start), period), period)
+    table = read_table(lo, end, coin_ids, ["coin_id", "current_price", "total_volume", "date_"])
+    history = _rename_history(table.to_pandas())
+    if history.empty:
+        return pd.DataFrame(columns=columns)
+    df = compute_rollups(history, periods=[period])
+    df = df[(df["bucket"] >= _utc(start)) & (df["bucket"] <= _utc(end))].reset_index(drop=True)
+    return df[columns] if columns else df
+
+
+def get_kpis(coin_ids, now):
+    from etl.analytics import kpis
+
+    lo = _utc(now) - pd.Timedelta(days=30)
+    history = _rename_history(read_table(lo, now, coin_ids, HISTORY_COLUMNS).to_pandas())
+    return kpis(history, now)
+
+
+def insert_indicators(df: pd.DataFrame):
+    # wskaźniki kopii lokalnej liczone są przy odczycie (get_indicators)
+    return {"written": 0, "failed": 0, "chunks": 0, "failed_chunks": 0, "errors": []}
+
+
+def get_indicators(coin_id: str, start, end):
+    from etl.indicators import compute_indicators
+
+    # pełna historia monety – okna kroczące muszą się "rozgrzać" przed `start`
+    history = _rename_history(read_table(None, end, [coin_id], HISTORY_COLUMNS).to_pandas())
+    if history.empty:
+        return history
+    df = compute_indicators(history)
+    return df[df["ts"] >= _utc(start)].reset_index(drop=True)
+
+
+def _state_path(root=None):
+    # prefiks "_" – pyarrow.dataset pomija plik przy odczycie partycji historii
+    return os.path.join(root or MIRROR_DIR, "_indicator_state.json")
+
+
+def get_indicator_state(coin_ids):
+    path = _state_path()
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        states = json.load(f)
+    return {c: states[c] for c in coin_ids if c in states}
+
+
+def save_indicator_state(states: dict):
+    path = _state_path()
+    with _write_lock:
+        current = {}
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                current = json.load(f)
+        current.update(states)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(current, f, separators=(",", ":"))
+        os.replace(path + ".tmp", path)
+    return {"written": len(states), "failed": 0, "chunks": 1, "failed_chunks": 0, "errors": []}
+
+
+def _snapshots_path(root=None):
+    # prefiks "_" – pyarrow.dataset pomija plik przy odczycie partycji historii
+    return os.path.join(root or MIRROR_DIR, "_coin_snapshots.parquet")
+
+
+def insert_snapshots(df: pd.DataFrame, root: str = None):
+    """Stan bieżący monet w jednym pliku obok partycji historii (per coin_id wygrywa nowszy wiersz)."""
+    if df.empty:
+        return {"written": 0, "failed": 0, "chunks": 0, "failed_chunks": 0, "errors": []}
+    path = _snapshots_path(root)
+    df = df.assign(coin_id=df["coin_id"].astype(str), updated_at=pd.to_datetime(df["updated_at"], utc=True))
+    with _write_lock:
+        if os.path.exists(path):
+            df = pd.concat([pd.read_parquet(path), df], ignore_index=True)
+        df = df.drop_duplicates(subset=["coin_id"], keep="last").sort_values("coin_id")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        pq.write_table(pa.Table.from_pandas(df, preserve_index=False), path + ".tmp")
+        os.replace(path + ".tmp", path)
+    return {"written": len(df), "failed": 0, "chunks": 1, "failed_chunks": 0, "errors": []}
+
+
+def get_snapshots(coin_ids=None, root: str = None):
+    path = _snapshots_path(root)
+    if not os.path.exists(path):
+        return pd.DataFrame()
+    df = pd.read_parquet(path)
+    if coin_ids is not None:
+        df = df[df["coin_id"].isin(list(coin_ids))]
+    return df.reset_index(drop=True)
+
+
+def refresh_coins(coin_ids=None):
+    # wymiar monet liczony jest w locie z partycji
+    return 0
+
+
+def ensure_partitions(start, end, tables=None):
+    # partycje (moneta, miesiąc) kopii powstają przy zapisie
+    return 0
+
+
+def query(sql: str, root: str = None) -> pd.DataFrame:
+    """
+    Zapytanie SQL (DuckDB) do kopii, dostępnej jako widok `crypto_prices`.
+    DuckDB jest opcjonalny – potrzebny tylko dla tej funkcji.
+    """
+    try:
+        import duckdb
+    except ImportError as e:
+        raise RuntimeError("❌ Zapytania SQL do kopii lokalnej wymagają pakietu duckdb (pip install duckdb).") from e
+
+    pattern = os.path.join(root or MIRROR_DIR, "*", "*", "*.parquet")
+    con = duckdb.connect()
+    try:
+        con.execute(
+            "CREATE VIEW crypto_prices AS "
+            f"SELECT * FROM read_parquet('{pattern}', hive_partitioning = true)"
+        )
+        return con.execute(sql).df()
+    finally:
+        con.close()
+
+
+def clear_table(root: str = None):
+    root = root or MIRROR_DIR
+    shutil.rmtree(root, ignore_errors=True)
+    print(f"🗑️ Kopia lokalna wyczyszczona ({root}).")
@@ -0,0 +1,132 @@
+# query.py
+import copy
+
+import pandas as pd
+
+# Nazwy w wyniku (jak w get_history) → kolumny tabeli crypto_prices
+FIELDS = {
+    "coin_id": "coin_id",
+    "name": "name",
+    "symbol": "symbol",
+    "price": "current_price",
+    "volume": "total_volume",
+    "market_cap": "market_cap",
+    "ts": "date_",
+}
+DEFAULT_FIELDS = ["coin_id", "name", "price", "volume", "ts"]
+
+# Kubełki czasu: cena = ostatnia w kubełku (close), wolumen = suma, ts = początek kubełka
+BUCKETS = ("hour", "day", "week", "month")
+BUCKET_FIELDS = ("coin_id", "price", "volume", "ts")
+# okresy pandas: tydzień kończy się w niedzielę, czyli zaczyna w poniedziałek (jak date_trunc)
+_FREQ = {"hour": "h", "day": "D", "week": "W-SUN", "month": "M"}
+
+
+class HistoryQuery:
+    """
+    Zapytanie o historię cen niezależne od backendu: filtr monet, projekcja
+    kolumn, porządek, limit i kubełki czasu. Każdy backend (db.db, db.postgres,
+    db.mirror) wykonuje je po swojej stronie funkcją query_history(q) –
+    do klienta trafiają tylko wybrane wiersze i kolumny.
+
+        HistoryQuery(start, end).coins(["bitcoin"]).select("ts", "price").fetch()
+
+    Metody zwracają nową kopię, więc zapytanie bazowe można współdzielić.
+    """
+
+    def __init__(self, start=None, end=None):
+        self.start = start
+        self.end = end
+        self.coin_ids = None
+        self.fields = list(DEFAULT_FIELDS)
+        self.order_by = [("ts", False), ("coin_id", False)]
+        self.limit_rows = None
+        self.bucket_unit = None
+
+    def _copy(self, **changes):
+        q = copy.copy(self)
+        q.__dict__.update(changes)
+        return q
+
+    # ---- budowanie ----
+    def coins(self, coin_ids):
+        return self._copy(coin_ids=None if coin_ids is None else list(coin_ids))
+
+    def select(self, *fields):
+        unknown = [f for f in fields if f not in FIELDS]
+        if unknown:
+            raise ValueError(f"❌ Nieznane kolumny {unknown} (dostępne: {', '.join(FIELDS)}).")
+        return self._copy(fields=list(fields))
+
+    def order(self, *fields):
+        """Kolejność wyniku, np. order("-ts") – malejąco po czasie."""
+        order_by = [(f.lstrip("-"), f.startswith("-")) for f in fields]
+        unknown = [f for f, _ in order_by if f not in FIELDS]
+        if unknown:
+            raise ValueError(f"❌ Nieznane kolumny sortowania {unknown}.")
+        return self._copy(order_by=order_by)
+
+    def limit(self, n: int):
+        return self._copy(limit_rows=int(n) if n is not None else None)
+
+    def bucket(self, unit: str):
+        if unit is not None and unit not in BUCKETS:
+            raise ValueError(f"❌ Nieznany kubełek {unit!r} (dostępne: {', '.join(BUCKETS)}).")
+        return self._copy(bucket_unit=unit)
+
+    # ---- dla backendów ----
+    def keyed(self):
+        """Kopia z porządkiem dopełnionym kluczem (ts, coin_id) – pełny porządek, także dla order()."""
+        used = [f for f, _ in self.order_by]
+        return self._copy(order_by=self.order_by + [(f, False) for f in ("ts", "coin_id") if f not in used])
+
+    def columns(self) -> list:
+        """Kolumny tabeli do odczytu: projekcja plus kolumny sortowania."""
+        wanted = self.fields + [f for f, _ in self.order_by if f not in self.fields]
+        return [FIELDS[f] for f in wanted]
+
+    def check_bucket(self):
+        extra = [f for f in self.fields + [f for f, _ in self.order_by] if f not in BUCKET_FIELDS]
+        if self.bucket_unit and extra:
+            raise ValueError(f"❌ Kolumny {extra} nie są dostępne w kubełkach (dostępne: {', '.join(BUCKET_FIELDS)}).")
+
+    def finish(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Nazwy jak w get_history, typy, porządek, limit i projekcja – wspólne dla backendów."""
+        if df is None or df.empty:
+            return pd.DataFrame(columns=self.fields)
+        df = df.rename(columns={v: k for k, v in FIELDS.items()})
+        if "ts" in df.columns:
+            df["ts"] = pd.to_datetime(df["ts"], utc=True)
+        for col in ("price", "volume", "market_cap"):
+            if col in df.columns:
+                df[col] = pd.to_numeric(df[col], errors="coerce")
+        if self.order_by:
+            df = df.sort_values([f for f, _ in self.order_by],
+                                ascending=[not desc for _, desc in self.order_by], kind="stable")
+        if self.limit_rows is not None:
+            df = df.head(self.limit_rows)
+        return df[self.fields].reset_index(drop=True)
+
+    def fetch(self) -> pd.DataFrame:
+        """Wykonuje zapytanie w backendzie wybranym przez DB_BACKEND."""
+        from db.db import query_history
+        return query_history(self)
+
+
+def bucket_frame(df: pd.DataFrame, unit: str) -> pd.DataFrame:
+    """
+    Kubełki czasu po stronie klienta (dla backendów bez agregacji po stronie
+    serwera): ostatnia cena i suma wolumenu per (moneta, kubełek).
+    Wejście w nazwach tabeli (coin_id, current_price, total_volume, date_).
+    """
+    if df.empty:
+        return df
+    ts = pd.to_datetime(df["date_"], utc=True)
+    start = ts.dt.tz_localize(None).dt.to_period(_FREQ[unit]).dt.start_time.dt.tz_localize("UTC")
+    frame = df.assign(date_=ts, _bucket=start).sort_values("date_", kind="stable")
+    g = frame.groupby(["coin_id", "_bucket"], sort=False)
+    out = pd.DataFrame({
+        "current_price": g["current_price"].last(),
+        "total_volume": g["total_volume"].sum(min_count=1),
+    }).reset_index()
+    return out.rename(columns={"_bucket": "date_"})
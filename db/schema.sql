@@ -1,3 +1,5 @@
+-- Schemat bazowy (= db/migrations/0001_baseline.sql).
+-- Klucz (coin_id, date_), indeksy i partycje miesięczne: python db/migrate.py up
 DROP TABLE IF EXISTS crypto_prices;
 
 CREATE TABLE crypto_prices (
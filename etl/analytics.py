@@ -0,0 +1,172 @@
+# analytics.py
+import numpy as np
+import pandas as pd
+
+
+# ==============================
+#  WIDE MATRIX
+# ==============================
+class PriceMatrix:
+    """
+    Wyrównana macierz (czas × moneta) budowana raz z tabeli długiej.
+    values[t, c] = cena monety c w chwili ts[t] (NaN, gdy brak punktu).
+    """
+
+    def __init__(self, ts: pd.DatetimeIndex, coins: list, values: np.ndarray):
+        self.ts = ts
+        self.coins = coins
+        self.values = values
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    def frame(self, values: np.ndarray = None) -> pd.DataFrame:
+        """Widok szeroki jako DataFrame (index=ts, columns=coin_id)."""
+        return pd.DataFrame(self.values if values is None else values, index=self.ts, columns=self.coins)
+
+    def to_long(self, values: np.ndarray, name: str) -> pd.DataFrame:
+        """Macierz → tabela długa (ts, coin_id, name) bez pustych punktów, np. dla px.line."""
+        t_idx, c_idx = np.nonzero(~np.isnan(values))
+        return pd.DataFrame({
+            "ts": self.ts[t_idx],
+            "coin_id": np.asarray(self.coins, dtype=object)[c_idx],
+            name: values[t_idx, c_idx],
+        }).sort_values(["coin_id", "ts"], kind="stable").reset_index(drop=True)
+
+
+def build_matrix(df: pd.DataFrame, value_col: str = "price", ts_col: str = "ts",
+                 group_col: str = "coin_id") -> PriceMatrix:
+    """Jedno przejście po tabeli długiej: kody czasu i monet → scatter do macierzy."""
+    ts = pd.to_datetime(df[ts_col], utc=True, errors="coerce")
+    values = pd.to_numeric(df[value_col], errors="coerce").to_numpy(dtype="float64")
+    ok = ts.notna().to_numpy()
+    t_codes, t_uniques = pd.factorize(ts[ok], sort=True)
+    c_codes, c_uniques = pd.factorize(df[group_col].to_numpy()[ok], sort=True)
+
+    out = np.full((len(t_uniques), len(c_uniques)), np.nan)
+    out[t_codes, c_codes] = values[ok]
+    return PriceMatrix(pd.DatetimeIndex(t_uniques), list(c_uniques), out)
+
+
+# ==============================
+#  DERIVED SERIES
+# ==============================
+def first_valid(values: np.ndarray) -> np.ndarray:
+    """Pierwsza nie-NaN wartość w każdej kolumnie (NaN dla pustych kolumn)."""
+    mask = ~np.isnan(values)
+    idx = mask.argmax(axis=0)
+    base = values[idx, np.arange(values.shape[1])]
+    base[~mask.any(axis=0)] = np.nan
+    return base
+
+
+def index_100(values: np.ndarray) -> np.ndarray:
+    """Cena / pierwsza cena w okresie * 100 (per kolumna)."""
+    base = first_valid(values)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        base = np.where(base == 0, np.nan, base)
+        return values / base * 100.0
+
+
+def returns(values: np.ndarray) -> np.ndarray:
+    """Proste stopy zwrotu między kolejnymi wierszami (jak DataFrame.pct_change())."""
+    out = np.full_like(values, np.nan)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out[1:] = values[1:] / values[:-1] - 1.0
+    out[~np.isfinite(out)] = np.nan
+    return out
+
+
+def cum_returns(rets: np.ndarray) -> np.ndarray:
+    """(1 + r).cumprod() - 1; luki (NaN) nie przerywają iloczynu, jak w pandas."""
+    out = np.nancumprod(1.0 + rets, axis=0) - 1.0
+    out[np.isnan(rets)] = np.nan
+    return out
+
+
+def corr(rets: np.ndarray, min_periods: int = 1) -> np.ndarray:
+    """
+    Korelacja Pearsona na parach kompletnych obserwacji (jak DataFrame.corr()),
+    policzona kilkoma mnożeniami macierzy zamiast pętli po parach.
+    """
+    mask = (~np.isnan(rets)).astype("float64")
+    # centrowanie średnią kolumny ogranicza utratę precyzji w sumach kwadratów
+    x = np.where(mask > 0, rets - np.nanmean(np.where(mask > 0, rets, np.nan), axis=0), 0.0)
+    x = np.nan_to_num(x)
+    n = mask.T @ mask
+    sx = x.T @ mask             # suma x_i po wierszach, gdzie jest też x_j
+    sxx = (x * x).T @ mask
+    sxy = x.T @ x
+    with np.errstate(divide="ignore", invalid="ignore"):
+        cov = sxy - sx * sx.T / n
+        var_i = sxx - sx * sx / n
+        out = cov / np.sqrt(var_i * var_i.T)
+    out[n < max(min_periods, 2)] = np.nan
+    return np.clip(out, -1.0, 1.0)
+
+
+def risk_return(rets: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Średni zwrot i odchylenie standardowe (ddof=1) per kolumna."""
+    counts = (~np.isnan(rets)).sum(axis=0)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nansum(rets, axis=0) / counts
+        dev = np.where(np.isnan(rets), 0.0, rets - mean)
+        std = np.sqrt((dev * dev).sum(axis=0) / (counts - 1))
+    mean[counts == 0] = np.nan
+    std[counts < 2] = np.nan
+    return mean, std
+
+
+# ==============================
+#  ONE-SHOT ANALYSIS
+# ==============================
+class Analysis:
+    """Wszystkie wskaźniki dashboardu policzone z jednej macierzy cen."""
+
+    def __init__(self, df: pd.DataFrame, value_col: str = "price"):
+        self.matrix = build_matrix(df, value_col)
+        prices = self.matrix.values
+        self.index100 = index_100(prices)
+        self.returns = returns(prices)
+        self.cum_returns = cum_returns(self.returns)
+        # wiersze z co najmniej jednym zwrotem (pct_change().dropna(how="all"))
+        self.n_return_rows = int((~np.isnan(self.returns)).any(axis=1).sum())
+
+    def index100_long(self) -> pd.DataFrame:
+        return self.matrix.to_long(self.index100, "price_norm")
+
+    def cum_returns_long(self) -> pd.DataFrame:
+        return self.matrix.to_long(self.cum_returns, "cum_return")
+
+    def corr(self) -> pd.DataFrame:
+        coins = self.matrix.coins
+        return pd.DataFrame(corr(self.returns), index=coins, columns=coins)
+
+    def risk_return(self) -> pd.DataFrame:
+        mean, std = risk_return(self.returns)
+        return pd.DataFrame({"coin_id": self.matrix.coins, "avg_return": mean, "volatility": std})
+
+
+# ==============================
+#  KPI
+# ==============================
+def kpis(df: pd.DataFrame, now, value_col: str = "price") -> pd.DataFrame:
+    """
+    KPI kafelków dla wszystkich monet naraz: ostatnia cena (cur) oraz średnie
+    z ostatnich 7 i 30 dni względem `now`. Wejście: tabela długa coin_id, ts, price.
+    """
+    if df.empty:
+        return pd.DataFrame(columns=["coin_id", "cur", "avg7", "avg30"])
+    now = pd.Timestamp(now)
+    now = now.tz_convert("UTC") if now.tzinfo else now.tz_localize("UTC")
+    ts = pd.to_datetime(df["ts"], utc=True, errors="coerce")
+    price = pd.to_numeric(df[value_col], errors="coerce")
+    frame = pd.DataFrame({"coin_id": df["coin_id"].to_numpy(), "ts": ts, "price": price})
+    frame = frame.dropna(subset=["ts", "price"]).sort_values("ts", kind="stable")
+
+    g = frame.groupby("coin_id", sort=True)["price"]
+    out = pd.DataFrame({"cur": g.last()})
+    out["avg7"] = frame[frame["ts"] >= now - pd.Timedelta(days=7)].groupby("coin_id")["price"].mean()
+    out["avg30"] = frame[frame["ts"] >= now - pd.Timedelta(days=30)].groupby("coin_id")["price"].mean()
+    return out.reset_index()
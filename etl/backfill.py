@@ -0,0 +1,214 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from db.db import DB_BACKEND, insert_data, ensure_partitions
+from etl import fetch_data as fd
+
+load_dotenv("etl/.env", encoding="utf-8")
+
+# Rozdzielczości śródzienne. market_chart/range dobiera ziarnistość po długości
+# zakresu (≤1 dzień → 5 min, do 90 dni → godzinowe), więc okno pobrania
+# mieści się w tych limitach, a punkty są wyrównywane do siatki `step_ms`.
+GRANULARITIES = {
+    "5m":     {"table": "crypto_prices_5m",     "window": timedelta(days=1),  "step_ms": 300_000},
+    "hourly": {"table": "crypto_prices_hourly", "window": timedelta(days=30), "step_ms": 3_600_000},
+}
+
+# Plany płatne przyjmują jawny parametr interval=5m/hourly
+SEND_INTERVAL = os.getenv("COINGECKO_SEND_INTERVAL", "0") == "1"
+
+# Punkty kontrolne: {rozdzielczość: {coin_id: [[od, do], ...]}} – zapisane przedziały
+STATE_PATH = os.getenv("BACKFILL_STATE", "data/backfill_state.json")
+
+_state_lock = threading.Lock()
+
+
+# ==============================
+#  CHECKPOINTS
+# ==============================
+def load_checkpoints(path: str = None) -> dict:
+    path = path or STATE_PATH
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _spans(state: dict, granularity: str, coin_id: str):
+    spans = state.get(granularity, {}).get(coin_id) or []
+    if isinstance(spans, str):
+        return []  # dawny format (sam koniec ostatniego okna, bez początku) – zakres do ponowienia
+    return [(datetime.fromisoformat(lo), datetime.fromisoformat(hi)) for lo, hi in spans]
+
+
+def covered_ranges(granularity: str, coin_id: str, path: str = None):
+    """Zapisane przedziały [od, do) monety – posortowane i rozłączne."""
+    return _spans(load_checkpoints(path), granularity, coin_id)
+
+
+def save_checkpoint(granularity: str, coin_id: str, lo: datetime, hi: datetime, path: str = None):
+    """Dopisuje atomowo zapisane okno [lo, hi) do przedziałów monety (sąsiednie są scalane)."""
+    path = path or STATE_PATH
+    with _state_lock:
+        state = load_checkpoints(path)
+        merged = []
+        for a, b in sorted(_spans(state, granularity, coin_id) + [(lo, hi)]):
+            if merged and a <= merged[-1][1]:
+                merged[-1] = (merged[-1][0], max(merged[-1][1], b))
+            else:
+                merged.append((a, b))
+        state.setdefault(granularity, {})[coin_id] = [[a.isoformat(), b.isoformat()] for a, b in merged]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(state, f, indent=2)
+        os.replace(path + ".tmp", path)
+
+
+def missing_ranges(start: datetime, end: datetime, covered):
+    """Części [start, end) nie pokryte przez posortowane przedziały `covered`."""
+    gaps, lo = [], start
+    for c_lo, c_hi in covered:
+        if c_hi <= lo:
+            continue
+        if c_lo >= end:
+            break
+        if c_lo > lo:
+            gaps.append((lo, c_lo))
+        lo = max(lo, c_hi)
+    if lo < end:
+        gaps.append((lo, end))
+    return gaps
+
+
+# ==============================
+#  WINDOWS
+# ==============================
+def windows(start: datetime, end: datetime, size: timedelta):
+    """Kolejne okna [lo, hi) pokrywające [start, end)."""
+    lo = start
+    while lo < end:
+        hi = min(lo + size, end)
+        yield lo, hi
+        lo = hi
+
+
+def grid_points(ts_ms, prices, volumes, step_ms: int, lo_ms: int, hi_ms: int):
+    """
+    Pierwszy punkt w każdym kroku siatki, wyrównany do jego początku; tylko
+    kroki z [lo_ms, hi_ms) – sąsiednie okna nie dublują punktów na granicy.
+    """
+    slots = np.asarray(ts_ms, dtype="int64") // step_ms * step_ms
+    idx = np.flatnonzero((slots >= lo_ms) & (slots < hi_ms))
+    _, first = np.unique(slots[idx], return_index=True)
+    idx = idx[first]
+    return slots[idx], np.asarray(prices)[idx], np.asarray(volumes)[idx]
+
+
+def _fetch_window(coin, lo, hi, granularity, bucket):
+    cfg = GRANULARITIES[granularity]
+    url = f"{fd.COINGECKO_BASE}/coins/{coin}/market_chart/range"
+    params = {"vs_currency": "usd", "from": int(lo.timestamp()), "to": int(hi.timestamp())}
+    if SEND_INTERVAL:
+        params["interval"] = granularity
+    data = fd._get_json(url, params, bucket)
+    points = grid_points(*fd._chart_arrays(data), cfg["step_ms"],
+                         int(lo.timestamp() * 1000), int(hi.timestamp() * 1000))
+    return fd._frame_from_chart(coin, *points)
+
+
+# ==============================
+#  BACKFILL
+# ==============================
+def backfill_coin(coin, start, end, granularity, bucket, resume=True, state_path=None):
+    """
+    Pobiera i zapisuje historię jednej monety okno po oknie. Po każdym
+    zapisanym oknie dopisuje je do zapisanych przedziałów, więc ponowne
+    uruchomienie pobiera tylko niepokryte części [start, end) – także gdy
+    wcześniej zapisano późniejszy zakres. W pamięci jest jedno okno naraz.
+    """
+    cfg = GRANULARITIES[granularity]
+    gaps = missing_ranges(start, end, covered_ranges(granularity, coin, state_path)) if resume else [(start, end)]
+
+    written = 0
+    for lo, hi in (w for gap in gaps for w in windows(*gap, cfg["window"])):
+        batch = _fetch_window(coin, lo, hi, granularity, bucket)
+        if len(batch):
+            # okna historyczne leżą poza partycjami "na zapas" – bez tego trafiłyby do DEFAULT
+            ensure_partitions(lo, hi, [cfg["table"]])
+            stats = insert_data(batch, table=cfg["table"])
+            if stats and stats.get("failed"):
+                raise RuntimeError(f"zapis okna {lo:%Y-%m-%d %H:%M} nieudany: {stats['errors'][:1]}")
+            if fd.LOCAL_MIRROR and DB_BACKEND != "parquet":
+                from db import mirror
+                mirror.insert_data(batch, table=cfg["table"])
+            written += len(batch)
+        save_checkpoint(granularity, coin, lo, hi, state_path)
+    return written
+
+
+def backfill(coin_ids=None, start=None, end=None, granularity="hourly", max_workers=None,
+             rate_per_min=None, resume=True, state_path=None):
+    """
+    Backfill danych śródziennych (`granularity`: "hourly" lub "5m") dla
+    [start, end) do tabeli crypto_prices_<granularity>. Monety idą równolegle
+    przez wspólny limiter, okna jednej monety – po kolei.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"❌ Nieznana rozdzielczość {granularity!r} (dostępne: {', '.join(GRANULARITIES)}).")
+    coin_ids = coin_ids or fd.DEFAULT_COIN_IDS
+    end = end or datetime.now(timezone.utc)
+    start = start or end - timedelta(days=30)
+
+    bucket = fd.make_bucket(rate_per_min)
+    workers = max(1, min(max_workers or fd.MAX_WORKERS, len(coin_ids)))
+    results = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(backfill_coin, coin, start, end, granularity, bucket, resume, state_path): coin
+            for coin in coin_ids
+        }
+        for idx, fut in enumerate(as_completed(futures), start=1):
+            coin = futures[fut]
+            try:
+                results[coin] = fut.result()
+                print(f"[{idx}/{len(coin_ids)}] ✅ {coin}: {results[coin]} punktów ({granularity})")
+            except Exception as e:
+                print(f"[{idx}/{len(coin_ids)}] ❌ Błąd dla {coin}: {e} – wznowienie od ostatniego okna")
+    return results
+
+
+def _utc(value: str) -> datetime:
+    ts = pd.Timestamp(value)
+    return (ts.tz_convert("UTC") if ts.tzinfo else ts.tz_localize("UTC")).to_pydatetime()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Backfill danych śródziennych z CoinGecko market_chart/range.")
+    parser.add_argument("--granularity", choices=sorted(GRANULARITIES), default="hourly")
+    parser.add_argument("--start", required=True, help="początek zakresu, np. 2024-01-01")
+    parser.add_argument("--end", default=None, help="koniec zakresu (domyślnie teraz)")
+    parser.add_argument("--coins", default=None, help="lista ID oddzielona przecinkami")
+    parser.add_argument("--no-resume", action="store_true", help="ignoruj punkty kontrolne")
+    args = parser.parse_args()
+
+    backfill(
+        coin_ids=args.coins.split(",") if args.coins else None,
+        start=_utc(args.start),
+        end=_utc(args.end) if args.end else None,
+        granularity=args.granularity,
+        resume=not args.no_resume,
+    )
@@ -0,0 +1,242 @@
+# correlation.py
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+# Szerokość bloku kolumn: pamięć pośrednia O(T × BLOCK + BLOCK²) zamiast O(T × N + N²) naraz
+BLOCK = int(os.getenv("CORR_BLOCK", "256"))
+
+
+# ==============================
+#  MATRIX
+# ==============================
+def corr_blocked(rets: np.ndarray, min_periods: int = 2, block: int = None, dtype=np.float32) -> np.ndarray:
+    """
+    Korelacja Pearsona (pary kompletnych obserwacji, jak DataFrame.corr())
+    liczona blokami kolumn w float32. Bez luk w danych każdy blok to jedno
+    mnożenie macierzy standaryzowanych zwrotów; z lukami – sumy po maskach.
+    """
+    block = block or BLOCK
+    x = np.asarray(rets, dtype="float64")
+    t, n_cols = x.shape
+    mask = ~np.isnan(x)
+    out = np.empty((n_cols, n_cols), dtype=dtype)
+    if n_cols == 0:
+        return out
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean = np.nanmean(np.where(mask, x, np.nan), axis=0) if t else np.full(n_cols, np.nan)
+    # centrowanie w float64, dalej float32 – mniejsza utrata precyzji w sumach kwadratów
+    xc = np.where(mask, x - mean, 0.0).astype(dtype)
+    complete = bool(mask.all())
+
+    if complete:
+        with np.errstate(invalid="ignore", divide="ignore"):
+            z = xc / np.sqrt((xc * xc).sum(axis=0))
+        for a in range(0, n_cols, block):
+            for b in range(a, n_cols, block):
+                blk = z[:, a:a + block].T @ z[:, b:b + block]
+                out[a:a + block, b:b + block] = blk
+                out[b:b + block, a:a + block] = blk.T
+        if t < max(min_periods, 2):
+            out[:] = np.nan
+    else:
+        m = mask.astype(dtype)
+        xx = xc * xc
+        for a in range(0, n_cols, block):
+            A = slice(a, a + block)
+            for b in range(a, n_cols, block):
+                B = slice(b, b + block)
+                n = m[:, A].T @ m[:, B]
+                sx = xc[:, A].T @ m[:, B]   # suma x_i w wierszach, gdzie jest też x_j
+                sy = m[:, A].T @ xc[:, B]
+                sxx = xx[:, A].T @ m[:, B]
+                syy = m[:, A].T @ xx[:, B]
+                sxy = xc[:, A].T @ xc[:, B]
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    blk = (sxy - sx * sy / n) / np.sqrt((sxx - sx * sx / n) * (syy - sy * sy / n))
+                blk[n < max(min_periods, 2)] = np.nan
+                out[A, B] = blk
+                out[B, A] = blk.T
+    return np.clip(out, -1.0, 1.0, out=out)
+
+
+def rolling_corr(rets: np.ndarray, pairs, window: int, min_periods: int = None) -> np.ndarray:
+    """
+    Korelacja krocząca wybranych par (T × len(pairs)) z sum prefiksowych:
+    każde okno to różnica dwóch sum, więc koszt nie zależy od `window`.
+    """
+    min_periods = max(min_periods or window, 2)
+    x = np.asarray(rets, dtype="float64")
+    pairs = np.asarray(pairs, dtype="int64").reshape(-1, 2)
+    a, b = x[:, pairs[:, 0]], x[:, pairs[:, 1]]
+    both = ~np.isnan(a) & ~np.isnan(b)
+    a, b = np.where(both, a, 0.0), np.where(both, b, 0.0)
+
+    def windowed(v):
+        c = np.cumsum(np.vstack([np.zeros((1, v.shape[1])), v]), axis=0)
+        return c[1:] - c[np.maximum(np.arange(1, len(c)) - window, 0)]
+
+    n, sa, sb = windowed(both.astype("float64")), windowed(a), windowed(b)
+    saa, sbb, sab = windowed(a * a), windowed(b * b), windowed(a * b)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        out = (sab - sa * sb / n) / np.sqrt((saa - sa * sa / n) * (sbb - sb * sb / n))
+    out[n < min_periods] = np.nan
+    return np.clip(out, -1.0, 1.0)
+
+
+# ==============================
+#  STRUCTURE
+# ==============================
+def cluster_order(c: np.ndarray) -> np.ndarray:
+    """
+    Kolejność liści aglomeracyjnego grupowania (average linkage, odległość
+    1 - corr) – monety podobne do siebie lądują obok siebie na heatmapie.
+    """
+    n = len(c)
+    if n <= 2:
+        return np.arange(n)
+    d = 1.0 - np.nan_to_num(np.asarray(c, dtype="float64"), nan=0.0)
+    np.fill_diagonal(d, np.inf)
+    size = np.ones(n)
+    members = [[k] for k in range(n)]
+    for _ in range(n - 1):
+        i, j = divmod(int(np.argmin(d)), n)
+        row = (size[i] * d[i] + size[j] * d[j]) / (size[i] + size[j])
+        d[i, :] = row
+        d[:, i] = row
+        d[i, i] = np.inf
+        d[j, :] = np.inf
+        d[:, j] = np.inf
+        size[i] += size[j]
+        members[i] += members[j]
+        members[j] = []
+    return np.asarray(members[i])
+
+
+def top_pairs(c: np.ndarray, coins, k: int = 10, largest: bool = True) -> pd.DataFrame:
+    """`k` par o najwyższej (largest=True) albo najniższej korelacji, bez przekątnej i duplikatów."""
+    iu, ju = np.triu_indices(len(coins), k=1)
+    vals = np.asarray(c, dtype="float64")[iu, ju]
+    ok = np.flatnonzero(~np.isnan(vals))
+    if len(ok) == 0:
+        return pd.DataFrame(columns=["coin_a", "coin_b", "corr"])
+    key = -vals[ok] if largest else vals[ok]
+    k = min(k, len(ok))
+    pick = ok[np.argpartition(key, k - 1)[:k]]
+    pick = pick[np.argsort(-vals[pick] if largest else vals[pick], kind="stable")]
+    coins = np.asarray(coins, dtype=object)
+    return pd.DataFrame({"coin_a": coins[iu[pick]], "coin_b": coins[ju[pick]], "corr": vals[pick]})
+
+
+class CorrResult:
+    """Macierz korelacji (float32) z monetami i kolejnością klastrów."""
+
+    def __init__(self, matrix: np.ndarray, coins: list, rets: np.ndarray = None):
+        self.matrix = matrix
+        self.coins = list(coins)
+        self.rets = rets
+        self._order = None
+
+    @property
+    def order(self) -> np.ndarray:
+        if self._order is None:
+            self._order = cluster_order(self.matrix)
+        return self._order
+
+    def frame(self, clustered: bool = True) -> pd.DataFrame:
+        idx = self.order if clustered else np.arange(len(self.coins))
+        coins = [self.coins[k] for k in idx]
+        return pd.DataFrame(self.matrix[np.ix_(idx, idx)], index=coins, columns=coins)
+
+    def top_pairs(self, k: int = 10, largest: bool = True) -> pd.DataFrame:
+        return top_pairs(self.matrix, self.coins, k, largest)
+
+    def submatrix(self, max_coins: int = 50) -> pd.DataFrame:
+        """
+        Do `max_coins` monet z najsilniejszych par (|corr|), w kolejności
+        klastrów – czytelny wycinek struktury dużego uniwersum.
+        """
+        if len(self.coins) <= max_coins:
+            return self.frame()
+        iu, ju = np.triu_indices(len(self.coins), k=1)
+        strength = np.nan_to_num(np.abs(self.matrix[iu, ju].astype("float64")), nan=-1.0)
+        chosen = {}
+        for p in np.argsort(-strength, kind="stable"):
+            for k in (iu[p], ju[p]):
+                chosen.setdefault(int(k), None)
+            if len(chosen) >= max_coins:
+                break
+        idx = np.asarray(list(chosen)[:max_coins])
+        sub = self.matrix[np.ix_(idx, idx)]
+        idx = idx[cluster_order(sub)]
+        coins = [self.coins[k] for k in idx]
+        return pd.DataFrame(self.matrix[np.ix_(idx, idx)], index=coins, columns=coins)
+
+    def rolling(self, pairs: pd.DataFrame, window: int, ts=None, names: dict = None) -> pd.DataFrame:
+        """Korelacja krocząca par (coin_a, coin_b) w formie długiej: ts, pair, corr."""
+        pos = {c: k for k, c in enumerate(self.coins)}
+        idx = [(pos[a], pos[b]) for a, b in zip(pairs["coin_a"], pairs["coin_b"])]
+        values = rolling_corr(self.rets, idx, window)
+        ts = ts if ts is not None else np.arange(len(values))
+        names = names or {}
+        labels = [f"{names.get(a, a)} / {names.get(b, b)}" for a, b in zip(pairs["coin_a"], pairs["coin_b"])]
+        out = pd.DataFrame(values, index=ts, columns=labels).rename_axis("ts").reset_index()
+        return out.melt(id_vars="ts", var_name="pair", value_name="corr").dropna(subset=["corr"])
+
+
+def correlate(rets: np.ndarray, coins, window: int = None, min_periods: int = 2) -> CorrResult:
+    """Korelacja całego zakresu albo ostatnich `window` wierszy zwrotów."""
+    rets = np.asarray(rets)
+    part = rets[-window:] if window else rets
+    return CorrResult(corr_blocked(part, min_periods), coins, rets)
+
+
+# ==============================
+#  CACHE
+# ==============================
+def fingerprint(rets: np.ndarray) -> tuple:
+    """Kształt i skrót zwrotów – nowe lub poprawione dane ETL dają inny klucz cache."""
+    rets = np.ascontiguousarray(rets)
+    return rets.shape, hashlib.blake2b(rets.tobytes(), digest_size=16).hexdigest()
+
+
+class CorrelationCache:
+    """
+    LRU wyników per (zakres, okno, monety, fingerprint zwrotów) – zmiana widoku
+    nie przelicza macierzy ponownie. Wpisy starsze niż `ttl` sekund wygasają.
+    """
+
+    def __init__(self, max_entries: int = 32, ttl: float = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._items = OrderedDict()  # klucz -> (czas wstawienia, wynik)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, compute):
+        with self._lock:
+            if key in self._items:
+                stored_at, value = self._items[key]
+                if self.ttl is None or time.monotonic() - stored_at < self.ttl:
+                    self._items.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._items[key]
+        value = compute()
+        with self._lock:
+            self.misses += 1
+            self._items[key] = (time.monotonic(), value)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
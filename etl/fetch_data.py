@@ -6,17 +6,41 @@ if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
 import time
+import random
 import requests
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime, timezone
 from dotenv import load_dotenv
-from db.db import insert_data
+from db.db import (
+    DB_BACKEND, TABLE, insert_data, insert_snapshots, get_latest_dates, refresh_coins, ensure_partitions,
+)
+from etl.utils import TokenBucket, parse_retry_after
+from etl.http_cache import CacheMiss, ResponseCache
+from etl.metrics import METRICS
+from etl.rollups import update_rollups
+from etl.indicators import update_indicators
 
 # === Wczytaj konfigurację ===
 load_dotenv("etl/.env", encoding="utf-8")
 
-COINGECKO_BASE = "https://api.coingecko.com/api/v3/"
+# Adres API (np. lokalny zamiennik z benchmarks/stubs.py do testów obciążeniowych)
+COINGECKO_BASE = os.getenv("COINGECKO_BASE", "https://api.coingecko.com/api/v3/")
 API_KEY = os.getenv("COINGECKO_API_KEY")
 
+# Limit zapytań i równoległość (plan demo: ~30 zapytań / min)
+RATE_PER_MIN = float(os.getenv("COINGECKO_RATE_PER_MIN", "30"))
+MAX_WORKERS = int(os.getenv("COINGECKO_MAX_WORKERS", "4"))
+MAX_RETRIES = int(os.getenv("COINGECKO_MAX_RETRIES", "5"))
+
+# Dodatkowy zapis do lokalnej kopii Parquet (db/mirror.py), np. LOCAL_MIRROR=1
+LOCAL_MIRROR = os.getenv("LOCAL_MIRROR", "0") == "1"
+
+# Cache surowych odpowiedzi na dysku (etl/http_cache.py), np. HTTP_CACHE=on / replay
+RESPONSE_CACHE = ResponseCache.from_env()
+
 headers = {
     "accept": "application/json",
     "x-cg-demo-api-key": API_KEY,  # działa również dla kont demo
@@ -29,78 +53,385 @@ DEFAULT_COIN_IDS = [
 ]
 
 
-def fetch_data(coin_ids=None, days_back=365):
+def make_bucket(rate_per_min=None):
+    """Tworzy limiter współdzielony przez wszystkie wątki jednego uruchomienia."""
+    rate = (rate_per_min or RATE_PER_MIN) / 60.0
+    return TokenBucket(rate=rate, capacity=max(1.0, rate * 2))
+
+
+def _get_json(url, params, bucket, max_retries=MAX_RETRIES):
+    """
+    GET do CoinGecko przez limiter. Na 429 respektuje Retry-After
+    (lub wykładniczy backoff), na 5xx/błędy sieci ponawia zapytanie.
+    Z włączonym RESPONSE_CACHE świeża odpowiedź z dysku nie zużywa limitu,
+    a nieświeża jest rewalidowana zapytaniem warunkowym (304 = bez zmian).
+    """
+    endpoint = url.rstrip("/").rsplit("/", 1)[-1]
+    cache = RESPONSE_CACHE
+    entry = cache.lookup(url, params) if cache else None
+    if cache and (cache.replay or cache.fresh(entry)):
+        if entry is None:
+            raise CacheMiss(f"❌ Brak odpowiedzi w cache (tryb replay): {url} {params}")
+        METRICS.inc("crypto_etl_http_cache_total", 1, "Odpowiedzi CoinGecko wg źródła",
+                    endpoint=endpoint, result="replay" if cache.replay else "hit")
+        return cache.body(entry)
+    request_headers = {**headers, **ResponseCache.conditional_headers(entry)}
+
+    for attempt in range(max_retries + 1):
+        bucket.acquire()
+        t0 = time.perf_counter()
+        try:
+            r = requests.get(url, headers=request_headers, params=params, timeout=30)
+        except requests.RequestException:
+            METRICS.inc("crypto_etl_http_retries_total", 1, "Ponowienia zapytań HTTP",
+                        source="coingecko", reason="network")
+            if attempt == max_retries:
+                raise
+            time.sleep(min(2 ** attempt, 30) + random.random())
+            continue
+        METRICS.observe("crypto_etl_http_request_seconds", time.perf_counter() - t0,
+                        "Czas pojedynczego zapytania HTTP", source="coingecko", endpoint=endpoint)
+        METRICS.inc("crypto_etl_http_bytes_total", len(r.content), "Pobrane bajty odpowiedzi",
+                    source="coingecko", endpoint=endpoint)
+
+        # Obsługa błędów API
+        if r.status_code == 401:
+            raise RuntimeError("❌ CoinGecko 401 Unauthorized – sprawdź COINGECKO_API_KEY w .env.")
+        if r.status_code == 429 or r.status_code >= 500:
+            if attempt == max_retries:
+                r.raise_for_status()
+            delay = parse_retry_after(r.headers.get("Retry-After"),
+                                      default=min(2 ** (attempt + 2), 60))
+            METRICS.inc("crypto_etl_http_retries_total", 1, "Ponowienia zapytań HTTP", source="coingecko",
+                        reason="429" if r.status_code == 429 else "5xx")
+            if r.status_code == 429:
+                print(f"⚠️ Zbyt wiele zapytań – czekam {delay:.0f} s (próba {attempt + 1}/{max_retries})...")
+                bucket.backoff(delay)
+            else:
+                time.sleep(delay)
+            continue
+
+        if r.status_code == 304 and entry is not None:
+            bucket.success()
+            METRICS.inc("crypto_etl_http_cache_total", 1, "Odpowiedzi CoinGecko wg źródła",
+                        endpoint=endpoint, result="revalidated")
+            return cache.body(cache.touch(url, params, entry))
+
+        r.raise_for_status()
+        bucket.success()
+        if cache:
+            METRICS.inc("crypto_etl_http_cache_total", 1, "Odpowiedzi CoinGecko wg źródła",
+                        endpoint=endpoint, result="miss")
+            cache.store(url, params, r.content, r.headers)
+        return r.json()
+
+
+# Kolumny paczki z market_chart – tylko to, co ta odpowiedź zawiera. Pola
+# bieżącego stanu (market_cap, high/low 24h, zmiana 24h) pisze tryb snapshot
+# do osobnej tabeli coin_snapshots.
+BATCH_COLUMNS = [
+    "coin_id", "symbol", "name",
+    "current_price", "total_volume",
+    "date_",
+]
+# stałe monety – w paczce zapisane raz (kategorie), nie w każdym wierszu
+CONST_COLUMNS = ["coin_id", "symbol", "name"]
+
+# Kolumny paczki z /coins/markets (snapshot całego uniwersum, tabela coin_snapshots)
+SNAPSHOT_COLUMNS = [
+    "coin_id", "symbol", "name",
+    "current_price", "total_volume", "market_cap",
+    "high_24h", "low_24h", "price_change_percentage_24h",
+    "updated_at",
+]
+# maksymalny rozmiar strony /coins/markets
+MARKETS_PAGE_SIZE = 250
+
+
+def _chart_arrays(data):
+    """Odpowiedź market_chart → tablice (ts w ms, cena, wolumen) równej długości."""
+    prices = np.asarray(data.get("prices") or [], dtype="float64").reshape(-1, 2)
+    volumes = np.asarray(data.get("total_volumes") or [], dtype="float64").reshape(-1, 2)
+    n = min(len(prices), len(volumes))
+    return prices[:n, 0].astype("int64"), prices[:n, 1], volumes[:n, 1]
+
+
+def _frame_from_chart(coin, ts_ms, prices, volumes):
+    """
+    Zamienia tablice z market_chart na paczkę kolumnową tabeli crypto_prices:
+    czas i zaokrąglenia liczone wektorowo, stałe monety jako kategorie.
+    """
+    n = len(ts_ms)
+
+    def const(value):
+        return pd.Categorical.from_codes(np.zeros(n, dtype="int8"), categories=[value])
+
+    return pd.DataFrame({
+        "coin_id": const(coin),
+        "symbol": const(coin[:3].upper()),
+        "name": const(coin.capitalize()),
+
+        "current_price": np.round(prices, 6),
+        "total_volume": np.round(volumes, 2),
+
+        "date_": pd.to_datetime(ts_ms, unit="ms", utc=True),
+    }, columns=BATCH_COLUMNS)
+
+
+def concat_batches(frames):
+    """Łączy paczki monet, zachowując kategorie (bez rozwijania stałych do napisów)."""
+    frames = [f for f in frames if len(f)]
+    if not frames:
+        return pd.DataFrame(columns=BATCH_COLUMNS)
+    out = {}
+    for col in BATCH_COLUMNS:
+        parts = [f[col] for f in frames]
+        out[col] = union_categoricals(parts) if col in CONST_COLUMNS else pd.concat(parts, ignore_index=True)
+    return pd.DataFrame(out, columns=BATCH_COLUMNS)
+
+
+def _daily_points(ts_ms, prices, volumes, after=None):
+    """
+    market_chart/range dla krótkich zakresów zwraca dane godzinowe – zostawiamy
+    pierwszy punkt z każdego dnia UTC i wyrównujemy go do północy, tak jak
+    punkty z `interval=daily`. `after` odrzuca dni już zapisane w bazie.
+    """
+    day_ms = 86_400_000
+    days = np.asarray(ts_ms, dtype="int64") // day_ms
+    keep = np.ones(len(days), dtype=bool)
+    if after is not None:
+        keep &= days > int(after.timestamp() * 1000) // day_ms
+    idx = np.flatnonzero(keep)
+    # pierwszy punkt każdego dnia (dane rosnąco po czasie)
+    _, first = np.unique(days[idx], return_index=True)
+    idx = idx[first]
+    return days[idx] * day_ms, np.asarray(prices)[idx], np.asarray(volumes)[idx]
+
+
+def _fetch_coin(coin, days_back, bucket):
+    """Pobiera i parsuje historię jednej kryptowaluty."""
+    # === endpoint CoinGecko ===
+    url = f"{COINGECKO_BASE}/coins/{coin}/market_chart"
+    params = {"vs_currency": "usd", "days": days_back, "interval": "daily"}
+    data = _get_json(url, params, bucket)
+    with METRICS.timer("crypto_etl_parse_seconds", "Czas parsowania odpowiedzi monety", coin=coin):
+        return _frame_from_chart(coin, *_chart_arrays(data))
+
+
+def _fetch_coin_since(coin, since, bucket, until=None):
+    """
+    Pobiera tylko brakujący zakres (market_chart/range) od ostatniego
+    zapisanego dnia `since` do teraz. Domyślny koniec zakresu jest
+    zaokrąglany w górę do pełnej godziny, więc ponowienia w tej samej
+    godzinie mają ten sam klucz w cache odpowiedzi.
+    """
+    until = until or pd.Timestamp.now(tz="UTC").ceil("h").to_pydatetime()
+    url = f"{COINGECKO_BASE}/coins/{coin}/market_chart/range"
+    params = {
+        "vs_currency": "usd",
+        "from": int(since.timestamp()),
+        "to": int(until.timestamp()),
+    }
+    data = _get_json(url, params, bucket)
+    with METRICS.timer("crypto_etl_parse_seconds", "Czas parsowania odpowiedzi monety", coin=coin):
+        return _frame_from_chart(coin, *_daily_points(*_chart_arrays(data), after=since))
+
+
+def _derived_history(batch):
+    """Paczka crypto_prices w układzie historii (coin_id, ts, price, volume) dla agregatów i wskaźników."""
+    history = pd.DataFrame({
+        "coin_id": batch["coin_id"].astype(str).to_numpy(),
+        "ts": batch["date_"].to_numpy(),
+        "price": batch["current_price"].to_numpy(),
+        "volume": batch["total_volume"].to_numpy(),
+    })
+    history["ts"] = pd.to_datetime(history["ts"], utc=True)
+    return history
+
+
+def _update_derived(batch):
+    """
+    Agregaty dzień/tydzień/miesiąc i wskaźniki kroczące dla załadowanej
+    paczki (błąd nie przerywa ETL – ceny są już zapisane).
+    """
+    history = _derived_history(batch)
+    try:
+        out = update_rollups(history)
+        print(f"📈 Agregaty zaktualizowane — {len(out)} wierszy.")
+    except Exception as e:
+        print(f"⚠️ Błąd aktualizacji agregatów: {e}")
+    try:
+        out = update_indicators(history)
+        print(f"📐 Wskaźniki zaktualizowane — {len(out)} nowych punktów.")
+    except Exception as e:
+        print(f"⚠️ Błąd aktualizacji wskaźników: {e}")
+
+
+def fetch_data(coin_ids=None, days_back=365, max_workers=None, rate_per_min=None, incremental=False):
     """
     Pobiera dane z CoinGecko dla wybranych kryptowalut
     i wysyła je bezpośrednio do bazy Supabase przez REST API.
+
+    Zapytania idą równolegle (`max_workers` wątków), a tempo wyznacza
+    wspólny token bucket (`rate_per_min` zapytań na minutę).
+
+    incremental=True – dla monet, które są już w bazie, pobiera tylko dni
+    po ostatnim zapisanym `date_`; nowe monety dostają pełne `days_back`.
+
+    Zwraca paczkę kolumnową (DataFrame o kolumnach BATCH_COLUMNS).
     """
     if coin_ids is None:
         coin_ids = DEFAULT_COIN_IDS
 
-    all_rows = []
+    bucket = make_bucket(rate_per_min)
+    workers = max(1, min(max_workers or MAX_WORKERS, len(coin_ids) or 1))
+    latest = get_latest_dates(coin_ids) if incremental else {}
+    frames = []
 
-    for idx, coin in enumerate(coin_ids, start=1):
-        try:
-            # === endpoint CoinGecko ===
-            url = f"{COINGECKO_BASE}/coins/{coin}/market_chart"
-            params = {"vs_currency": "usd", "days": days_back, "interval": "daily"}
+    def task(coin):
+        since = latest.get(coin)
+        with METRICS.timer("crypto_etl_fetch_seconds", "Czas pobrania monety (z ponowieniami)", coin=coin):
+            if since is not None:
+                return _fetch_coin_since(coin, since, bucket)
+            return _fetch_coin(coin, days_back, bucket)
 
-            r = requests.get(url, headers=headers, params=params, timeout=30)
-
-            # Obsługa błędów API
-            if r.status_code == 401:
-                raise RuntimeError("❌ CoinGecko 401 Unauthorized – sprawdź COINGECKO_API_KEY w .env.")
-            if r.status_code == 429:
-                print("⚠️ Zbyt wiele zapytań – czekam 15 sekund...")
-                time.sleep(15)
-                continue
-
-            r.raise_for_status()
-            data = r.json()
-
-            prices = data.get("prices", [])
-            volumes = data.get("total_volumes", [])
-            n = min(len(prices), len(volumes))
-            market_cap = data.get("market_cap", {}).get("usd")
-            high_24h = data.get("high_24h", {}).get("usd")
-            low_24h = data.get("low_24h", {}).get("usd")
-            change_24h = data.get("price_change_percentage_24h")
-
-            # === Zbierz dane ===
-            for i in range(n):
-                ts, price = prices[i]
-                _, volume = volumes[i]
-                ts_iso = datetime.fromtimestamp(ts / 1000, tz=timezone.utc).isoformat()
-
-                all_rows.append({
-                "coin_id": coin,
-                "symbol": coin[:3].upper(),
-                "name": coin.capitalize(),
-
-                "current_price": round(price, 6),
-                "total_volume": round(volume, 2),
-                "market_cap": market_cap,
-                "high_24h": high_24h,
-                "low_24h": low_24h,
-                "price_change_percentage_24h": change_24h,
-
-                "date_": ts_iso
-            })
-            print(f"[{idx}/{len(coin_ids)}] ✅ {coin}: {n} punktów")
-            time.sleep(1.2)  # ograniczenie zapytań (API limit)
-
-        except Exception as e:
-            print(f"[{idx}/{len(coin_ids)}] ❌ Błąd dla {coin}: {e}")
+    stage = "crypto_etl_stage_seconds"
+    stage_help = "Czas etapów uruchomienia ETL"
+    with METRICS.timer(stage, stage_help, stage="fetch"), ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(task, coin): coin for coin in coin_ids}
+        for idx, fut in enumerate(as_completed(futures), start=1):
+            coin = futures[fut]
+            try:
+                frame = fut.result()
+                frames.append(frame)
+                METRICS.inc("crypto_etl_rows_fetched_total", len(frame), "Pobrane punkty", coin=coin)
+                print(f"[{idx}/{len(coin_ids)}] ✅ {coin}: {len(frame)} punktów")
+            except Exception as e:
+                METRICS.inc("crypto_etl_fetch_errors_total", 1, "Monety pominięte po błędzie", coin=coin)
+                print(f"[{idx}/{len(coin_ids)}] ❌ Błąd dla {coin}: {e}")
 
     # === Zapis do Supabase ===
-    if all_rows:
-        print(f"\n📊 Łącznie pobrano: {len(all_rows)} rekordów")
-        insert_data(all_rows)
+    batch = concat_batches(frames)
+    if len(batch):
+        print(f"\n📊 Łącznie pobrano: {len(batch)} rekordów")
+        with METRICS.timer(stage, stage_help, stage="partitions"):
+            ensure_partitions(batch["date_"].min(), batch["date_"].max(), [TABLE])
+        with METRICS.timer(stage, stage_help, stage="insert"):
+            insert_data(batch)
+        with METRICS.timer(stage, stage_help, stage="refresh_coins"):
+            refresh_coins(sorted(batch["coin_id"].cat.categories))
+        with METRICS.timer(stage, stage_help, stage="derived"):
+            _update_derived(batch)
+        if LOCAL_MIRROR and DB_BACKEND != "parquet":
+            from db import mirror
+            with METRICS.timer(stage, stage_help, stage="mirror"):
+                mirror.insert_data(batch)
     else:
         print("⚠️ Brak danych do zapisu.")
 
-    return all_rows
+    return batch
+
+
+def _frame_from_markets(rows, now=None):
+    """
+    Wiersze /coins/markets → paczka SNAPSHOT_COLUMNS, jeden wiersz na monetę
+    z czasem ostatniej aktualizacji CoinGecko (`now`, gdy go brak).
+    """
+    if not rows:
+        return pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+    df = pd.DataFrame(rows).drop_duplicates(subset=["id"])
+    now = pd.Timestamp(now or datetime.now(timezone.utc))
+
+    def num(col, decimals=None):
+        values = pd.to_numeric(df[col], errors="coerce") if col in df else pd.Series(np.nan, index=df.index)
+        return values.round(decimals) if decimals is not None else values
+
+    updated = pd.to_datetime(df["last_updated"] if "last_updated" in df else pd.Series(pd.NaT, index=df.index),
+                             utc=True, errors="coerce", format="ISO8601")
+    return pd.DataFrame({
+        "coin_id": df["id"].astype(str),
+        "symbol": df["symbol"].astype(str).str.upper(),
+        "name": df["name"].astype(str),
+
+        "current_price": num("current_price", 6),
+        "total_volume": num("total_volume", 2),
+        "market_cap": num("market_cap", 2),
+        "high_24h": num("high_24h", 6),
+        "low_24h": num("low_24h", 6),
+        "price_change_percentage_24h": num("price_change_percentage_24h"),
+
+        "updated_at": updated.fillna(now),
+    }, columns=SNAPSHOT_COLUMNS).reset_index(drop=True)
+
+
+def fetch_markets(coin_ids=None, top=None, bucket=None, per_page=MARKETS_PAGE_SIZE):
+    """
+    Stan bieżący z /coins/markets, do `per_page` (≤250) monet na zapytanie:
+    `coin_ids` – wybrane monety (po 250 ID w parametrze ids),
+    `top` – pierwsze `top` monet wg kapitalizacji (kolejne strony);
+    bez obu – DEFAULT_COIN_IDS, jak w fetch_snapshot.
+    """
+    if coin_ids is None and not top:
+        coin_ids = DEFAULT_COIN_IDS
+    bucket = bucket or make_bucket()
+    per_page = min(per_page, MARKETS_PAGE_SIZE)
+    url = f"{COINGECKO_BASE}/coins/markets"
+    base = {"vs_currency": "usd", "order": "market_cap_desc", "per_page": per_page}
+
+    if coin_ids is not None:
+        coin_ids = list(coin_ids)
+        requests_params = [{**base, "page": 1, "ids": ",".join(coin_ids[i:i + per_page])}
+                           for i in range(0, len(coin_ids), per_page)]
+    else:
+        requests_params = [{**base, "page": page} for page in range(1, -(-top // per_page) + 1)]
+
+    rows = []
+    for params in requests_params:
+        page = _get_json(url, params, bucket) or []
+        rows.extend(page)
+        if coin_ids is None and len(page) < per_page:
+            break  # koniec listy CoinGecko
+    if coin_ids is None:
+        rows = rows[:top]
+    return _frame_from_markets(rows)
+
+
+def fetch_snapshot(coin_ids=None, top=None, rate_per_min=None):
+    """
+    Tryb snapshot: market_cap, high/low 24h, zmiana 24h i cena bieżąca dla
+    całego uniwersum w kilku zapytaniach (np. top 1000 = 4 strony zamiast
+    1000 zapytań market_chart). Upsert do coin_snapshots – crypto_prices
+    i wymiar coins bez zmian, więc snapshot nie przesuwa punktu startowego
+    przyrostowego pobierania historii ani nie nadpisuje jej cen dziennych.
+    """
+    if coin_ids is None and not top:
+        coin_ids = DEFAULT_COIN_IDS
+
+    stage = "crypto_etl_stage_seconds"
+    stage_help = "Czas etapów uruchomienia ETL"
+    with METRICS.timer(stage, stage_help, stage="snapshot"):
+        snap = fetch_markets(coin_ids, top, make_bucket(rate_per_min))
+
+    if not len(snap):
+        print("⚠️ Brak danych do zapisu.")
+        return snap
+    print(f"📸 Snapshot: {len(snap)} monet")
+    with METRICS.timer(stage, stage_help, stage="insert"):
+        insert_snapshots(snap)
+    if LOCAL_MIRROR and DB_BACKEND != "parquet":
+        from db import mirror
+        with METRICS.timer(stage, stage_help, stage="mirror"):
+            mirror.insert_snapshots(snap)
+    return snap
 
 
 if __name__ == "__main__":
-    fetch_data(days_back=30)
+    try:
+        # ETL_MODE=snapshot – tylko stan bieżący z /coins/markets (SNAPSHOT_TOP monet lub domyślne ID)
+        if os.getenv("ETL_MODE", "history") == "snapshot":
+            top = int(os.getenv("SNAPSHOT_TOP", "0"))
+            fetch_snapshot(top=top or None)
+        else:
+            fetch_data(days_back=30, incremental=os.getenv("ETL_INCREMENTAL", "1") == "1")
+    finally:
+        METRICS.export("etl_run")
@@ -0,0 +1,226 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import argparse
+import gzip
+import hashlib
+import json
+import shutil
+import time
+from datetime import datetime, timezone
+
+from dotenv import load_dotenv
+
+load_dotenv("etl/.env", encoding="utf-8")
+
+# Tryb: off – bez cache, on – cache + rewalidacja, replay – tylko z dysku (bez sieci)
+MODE = os.getenv("HTTP_CACHE", "off")
+CACHE_DIR = os.getenv("HTTP_CACHE_DIR", "data/http_cache")
+# Po tylu sekundach wpis jest rewalidowany (If-None-Match / If-Modified-Since)
+TTL = float(os.getenv("HTTP_CACHE_TTL", "3600"))
+# Okno czasu w kluczu – odpowiedzi "do teraz" z innego okna to inne wpisy
+BUCKET = int(os.getenv("HTTP_CACHE_BUCKET", "86400"))
+# Ile ostatnich okien zostawia prune()
+KEEP_BUCKETS = int(os.getenv("HTTP_CACHE_KEEP", "7"))
+
+MODES = ("off", "on", "replay")
+
+# Parametry zależne od chwili uruchomienia (zakres "od ostatniego zapisu do teraz"
+# w market_chart/range) – replay bez dokładnego trafienia bierze najnowszą
+# odpowiedź dla tego samego endpointu i pozostałych parametrów
+VOLATILE_PARAMS = ("from", "to")
+
+
+class CacheMiss(LookupError):
+    """Brak odpowiedzi w cache w trybie replay."""
+
+
+# ==============================
+#  KEYS
+# ==============================
+def request_key(url: str, params: dict = None, ignore=()) -> str:
+    """
+    Skrót (endpoint, parametry) niezależny od kolejności parametrów i końcowego '/'.
+    `ignore` – parametry pominięte w kluczu (np. VOLATILE_PARAMS).
+    """
+    endpoint = "/".join(part for part in url.split("/") if part)
+    items = sorted((str(k), str(v)) for k, v in (params or {}).items() if str(k) not in ignore)
+    canon = json.dumps([endpoint, items])
+    return hashlib.sha256(canon.encode()).hexdigest()
+
+
+def loose_key(url: str, params: dict = None):
+    """Klucz bez VOLATILE_PARAMS albo None, gdy zapytanie ich nie ma."""
+    if not any(str(k) in VOLATILE_PARAMS for k in (params or {})):
+        return None
+    return request_key(url, params, VOLATILE_PARAMS)
+
+
+def bucket_label(now: float = None, size: int = None) -> str:
+    size = size or BUCKET
+    start = int((time.time() if now is None else now) // size * size)
+    return datetime.fromtimestamp(start, tz=timezone.utc).strftime("%Y%m%dT%H%M")
+
+
+# ==============================
+#  CACHE
+# ==============================
+class ResponseCache:
+    """
+    Surowe odpowiedzi API na dysku: <root>/<okno czasu>/<sha256>.json.gz.
+    Wpis to koperta JSON (url, parametry, czas pobrania, ETag, Last-Modified)
+    z treścią odpowiedzi, skompresowana gzipem. Zapis atomowy (tmp + replace),
+    więc współbieżne wątki widzą stary albo nowy wpis, nigdy częściowy.
+    Zapytania z zakresem czasu mają też odnośnik <klucz bez from/to>.ref
+    do ostatniego wpisu – dla replay przy innym zakresie.
+    """
+
+    def __init__(self, root: str = None, mode: str = None, ttl: float = None, bucket: int = None):
+        self.root = root or CACHE_DIR
+        self.mode = mode or MODE
+        if self.mode not in MODES:
+            raise ValueError(f"❌ Nieznany tryb cache {self.mode!r} (dostępne: {', '.join(MODES)}).")
+        self.ttl = TTL if ttl is None else ttl
+        self.bucket = bucket or BUCKET
+
+    @classmethod
+    def from_env(cls):
+        """Cache wg HTTP_CACHE albo None, gdy wyłączony."""
+        return None if MODE == "off" else cls()
+
+    @property
+    def replay(self) -> bool:
+        return self.mode == "replay"
+
+    def _path(self, label: str, key: str) -> str:
+        return os.path.join(self.root, label, f"{key}.json.gz")
+
+    def _read(self, path: str):
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None  # brak albo uszkodzony wpis = chybienie
+
+    def _write(self, path: str, entry: dict):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{id(entry)}.tmp"
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+
+    def _save(self, url: str, params: dict, entry: dict) -> dict:
+        label, key = bucket_label(size=self.bucket), request_key(url, params)
+        self._write(self._path(label, key), entry)
+        loose = loose_key(url, params)
+        if loose is not None:
+            ref = os.path.join(self.root, label, f"{loose}.ref")
+            with open(f"{ref}.{os.getpid()}.{id(entry)}.tmp", "w", encoding="utf-8") as f:
+                f.write(key)
+            os.replace(f"{ref}.{os.getpid()}.{id(entry)}.tmp", ref)
+        return entry
+
+    def lookup(self, url: str, params: dict = None):
+        """
+        Wpis z bieżącego okna czasu; w trybie replay – najnowszy wpis
+        z dowolnego okna, a bez dokładnego trafienia – najnowszy wpis tego
+        samego zapytania z innym zakresem from/to. None, gdy brak.
+        """
+        key = request_key(url, params)
+        if not self.replay:
+            return self._read(self._path(bucket_label(size=self.bucket), key))
+        if not os.path.isdir(self.root):
+            return None
+        labels = sorted(os.listdir(self.root), reverse=True)
+        for label in labels:
+            entry = self._read(self._path(label, key))
+            if entry is not None:
+                return entry
+        loose = loose_key(url, params)
+        for label in labels if loose is not None else ():
+            try:
+                with open(os.path.join(self.root, label, f"{loose}.ref"), encoding="utf-8") as f:
+                    entry = self._read(self._path(label, f.read().strip()))
+            except OSError:
+                continue
+            if entry is not None:
+                return entry
+        return None
+
+    def fresh(self, entry: dict) -> bool:
+        return entry is not None and time.time() - entry["fetched_at"] < self.ttl
+
+    @staticmethod
+    def conditional_headers(entry: dict) -> dict:
+        """Nagłówki rewalidacji dla nieświeżego wpisu (serwer odpowie 304, jeśli bez zmian)."""
+        if entry is None:
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, params: dict, body: bytes, headers=None) -> dict:
+        headers = headers or {}
+        entry = {
+            "url": url,
+            "params": {str(k): v for k, v in (params or {}).items()},
+            "fetched_at": time.time(),
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "body": body.decode("utf-8") if isinstance(body, bytes) else body,
+        }
+        return self._save(url, params, entry)
+
+    def touch(self, url: str, params: dict, entry: dict) -> dict:
+        """Po 304: ten sam wpis, nowy czas pobrania (w bieżącym oknie)."""
+        return self._save(url, params, {**entry, "fetched_at": time.time()})
+
+    @staticmethod
+    def body(entry: dict):
+        return json.loads(entry["body"])
+
+    # ---- utrzymanie ----
+    def stats(self) -> dict:
+        buckets, files, size = 0, 0, 0
+        if os.path.isdir(self.root):
+            for label in os.listdir(self.root):
+                buckets += 1
+                for name in os.listdir(os.path.join(self.root, label)):
+                    files += name.endswith(".json.gz")
+                    size += os.path.getsize(os.path.join(self.root, label, name))
+        return {"buckets": buckets, "entries": files, "mb": round(size / 2**20, 2)}
+
+    def prune(self, keep: int = None) -> int:
+        """Usuwa okna czasu starsze niż `keep` ostatnich. Zwraca liczbę usuniętych."""
+        keep = KEEP_BUCKETS if keep is None else keep
+        if not os.path.isdir(self.root):
+            return 0
+        old = sorted(os.listdir(self.root), reverse=True)[keep:]
+        for label in old:
+            shutil.rmtree(os.path.join(self.root, label), ignore_errors=True)
+        return len(old)
+
+    def clear(self):
+        shutil.rmtree(self.root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cache surowych odpowiedzi CoinGecko na dysku.")
+    parser.add_argument("action", choices=["stats", "prune", "clear"])
+    parser.add_argument("--keep", type=int, default=None, help="ile ostatnich okien zostawić (prune)")
+    args = parser.parse_args()
+
+    cache = ResponseCache(mode="on")
+    if args.action == "prune":
+        print(f"🧹 Usunięto {cache.prune(args.keep)} starych okien z {cache.root}")
+    elif args.action == "clear":
+        cache.clear()
+        print(f"🧹 Wyczyszczono {cache.root}")
+    print(f"📦 {cache.root}: {cache.stats()}")
@@ -0,0 +1,223 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import math
+from collections import deque
+
+import pandas as pd
+
+# Okna wskaźników (w punktach)
+SMA_SHORT = 7
+SMA_LONG = 30
+EMA_FAST = 12
+EMA_SLOW = 26
+VOL_WINDOW = 30
+
+INDICATOR_COLUMNS = ["ret", "sma7", "sma30", "ema12", "ema26", "vol30"]
+
+# co ile aktualizacji przeliczyć sumy bieżące od zera (dryf zmiennoprzecinkowy)
+_RESYNC_EVERY = 1000
+
+# Moneta bez zapisanego stanu (np. pierwsze uruchomienie po wdrożeniu) dostaje
+# stan odtworzony z tylu dni zapisanej historii – EMA26 zbiega po ~10 × span punktów
+SEED_DAYS = int(os.getenv("INDICATORS_SEED_DAYS", "365"))
+
+
+# ==============================
+#  STATE
+# ==============================
+class IndicatorState:
+    """
+    Stan kroczący jednej monety: bufory ostatnich cen i zwrotów oraz sumy
+    bieżące. Każdy nowy punkt aktualizuje wszystkie wskaźniki w O(1).
+    Wyniki zgodne z pandas: rolling(n, min_periods=1).mean(),
+    ewm(span=n, adjust=False).mean(), pct_change().rolling(30, min_periods=2).std().
+    """
+
+    def __init__(self, last_ts=None, prices=(), rets=(), ema_fast=None, ema_slow=None):
+        self.last_ts = last_ts
+        self.prices = deque(prices, maxlen=max(SMA_LONG, SMA_SHORT))
+        self.rets = deque(rets, maxlen=VOL_WINDOW)
+        self.ema_fast = ema_fast
+        self.ema_slow = ema_slow
+        self._resync()
+
+    def _resync(self):
+        prices = list(self.prices)
+        self.sum_short = math.fsum(prices[-SMA_SHORT:])
+        self.sum_long = math.fsum(prices[-SMA_LONG:])
+        valid = [r for r in self.rets if r is not None]
+        self.ret_n = len(valid)
+        self.ret_sum = math.fsum(valid)
+        self.ret_sumsq = math.fsum(r * r for r in valid)
+        self._updates = 0
+
+    def update(self, ts, price: float) -> dict:
+        """Dodaje punkt (ts rosnąco) i zwraca wskaźniki dla tego punktu."""
+        prev = self.prices[-1] if self.prices else None
+        ret = price / prev - 1.0 if prev not in (None, 0) else None
+
+        # średnie kroczące: odejmij punkt wypadający z okna, dodaj nowy
+        if len(self.prices) >= SMA_SHORT:
+            self.sum_short -= self.prices[-SMA_SHORT]
+        if len(self.prices) >= SMA_LONG:
+            self.sum_long -= self.prices[-SMA_LONG]
+        self.prices.append(price)
+        self.sum_short += price
+        self.sum_long += price
+
+        # zmienność zwrotów: to samo dla bufora zwrotów
+        if len(self.rets) == self.rets.maxlen and self.rets[0] is not None:
+            old = self.rets[0]
+            self.ret_n -= 1
+            self.ret_sum -= old
+            self.ret_sumsq -= old * old
+        self.rets.append(ret)
+        if ret is not None:
+            self.ret_n += 1
+            self.ret_sum += ret
+            self.ret_sumsq += ret * ret
+
+        a_fast = 2.0 / (EMA_FAST + 1)
+        a_slow = 2.0 / (EMA_SLOW + 1)
+        self.ema_fast = price if self.ema_fast is None else a_fast * price + (1 - a_fast) * self.ema_fast
+        self.ema_slow = price if self.ema_slow is None else a_slow * price + (1 - a_slow) * self.ema_slow
+        self.last_ts = ts
+
+        self._updates += 1
+        if self._updates >= _RESYNC_EVERY:
+            self._resync()
+
+        n = len(self.prices)
+        vol = None
+        if self.ret_n >= 2:
+            var = (self.ret_sumsq - self.ret_sum * self.ret_sum / self.ret_n) / (self.ret_n - 1)
+            vol = math.sqrt(max(var, 0.0))
+        return {
+            "ret": ret,
+            "sma7": self.sum_short / min(n, SMA_SHORT),
+            "sma30": self.sum_long / min(n, SMA_LONG),
+            "ema12": self.ema_fast,
+            "ema26": self.ema_slow,
+            "vol30": vol,
+        }
+
+    def to_dict(self) -> dict:
+        """Zwarta postać do zapisu (JSON): ~60 liczb na monetę."""
+        return {
+            "last_ts": self.last_ts,
+            "prices": list(self.prices),
+            "rets": list(self.rets),
+            "ema_fast": self.ema_fast,
+            "ema_slow": self.ema_slow,
+        }
+
+    @classmethod
+    def from_dict(cls, d: dict) -> "IndicatorState":
+        return cls(d.get("last_ts"), d.get("prices", ()), d.get("rets", ()),
+                   d.get("ema_fast"), d.get("ema_slow"))
+
+
+# ==============================
+#  ENGINE
+# ==============================
+def apply_points(state: IndicatorState, coin_id: str, ts_list, prices):
+    """
+    Przepuszcza punkty (posortowane rosnąco po ts, ts w ms) przez stan.
+    Punkty nie nowsze niż state.last_ts są pomijane – już mają wskaźniki.
+    Zwraca listę rekordów tabeli wskaźników.
+    """
+    out = []
+    for ts, price in zip(ts_list, prices):
+        if price is None or (isinstance(price, float) and math.isnan(price)):
+            continue
+        if state.last_ts is not None and ts <= state.last_ts:
+            continue
+        values = state.update(ts, float(price))
+        out.append({"coin_id": coin_id, "ts": ts, **values})
+    return out
+
+
+def _replay(history: pd.DataFrame, stored: dict = None):
+    """Przepuszcza historię (coin_id, ts, price) przez stany monet. Zwraca (wskaźniki, nowe stany)."""
+    stored = stored or {}
+    records, states = [], {}
+    if not history.empty:
+        df = history.assign(ts=pd.to_datetime(history["ts"], utc=True)).sort_values(["coin_id", "ts"])
+        for coin_id, g in df.groupby("coin_id", sort=False):
+            state = IndicatorState.from_dict(stored[coin_id]) if coin_id in stored else IndicatorState()
+            ts_ms = g["ts"].dt.as_unit("ms").astype("int64").tolist()
+            records.extend(apply_points(state, coin_id, ts_ms, g["price"].astype(float).tolist()))
+            states[coin_id] = state.to_dict()
+
+    out = pd.DataFrame(records, columns=["coin_id", "ts"] + INDICATOR_COLUMNS)
+    out["ts"] = pd.to_datetime(out["ts"], unit="ms", utc=True)
+    return out, states
+
+
+def _seed_history(history: pd.DataFrame, coin_ids) -> pd.DataFrame:
+    """
+    Historia monet bez stanu: zapisane punkty z SEED_DAYS przed pierwszym
+    nowym punktem, uzupełnione nową paczką (ten sam ts – wygrywa paczka).
+    """
+    from db.db import query_history
+    from db.query import HistoryQuery
+
+    new = history[history["coin_id"].isin(coin_ids)].assign(ts=lambda d: pd.to_datetime(d["ts"], utc=True))
+    q = (HistoryQuery(new["ts"].min() - pd.Timedelta(days=SEED_DAYS), new["ts"].max())
+         .coins(sorted(coin_ids)).select("coin_id", "ts", "price"))
+    stored = query_history(q)
+    return (pd.concat([stored, new[["coin_id", "ts", "price"]]], ignore_index=True)
+              .drop_duplicates(subset=["coin_id", "ts"], keep="last"))
+
+
+def compute_indicators(history: pd.DataFrame) -> pd.DataFrame:
+    """Pełne przeliczenie od zera – np. dla kopii lokalnej."""
+    return _replay(history)[0]
+
+
+def update_indicators(history: pd.DataFrame) -> pd.DataFrame:
+    """
+    Aktualizacja przyrostowa po załadowaniu `history` (coin_id, ts, price):
+    wczytuje stan monet, przepuszcza tylko nowe punkty, zapisuje wskaźniki
+    i nowy stan. Koszt: O(liczba nowych punktów), niezależnie od długości historii.
+    Monety bez stanu są najpierw "rozgrzewane" zapisaną historią (_seed_history),
+    a zapisywane są tylko wskaźniki punktów z `history`.
+    """
+    from db.db import get_indicator_state, save_indicator_state, insert_indicators
+
+    if history.empty:
+        return _replay(history)[0]
+    coin_ids = sorted(history["coin_id"].astype(str).unique())
+    stored = get_indicator_state(coin_ids)
+    missing = [c for c in coin_ids if c not in stored]
+    batch = history
+    if missing:
+        history = pd.concat([history[~history["coin_id"].isin(missing)], _seed_history(history, missing)],
+                            ignore_index=True)
+    out, states = _replay(history, stored)
+    if missing and not out.empty:
+        # wskaźniki punktów rozgrzewki nie są zapisywane – tylko punkty z paczki
+        first_new = pd.to_datetime(batch["ts"], utc=True).groupby(batch["coin_id"].astype(str)).min()
+        out = out[out["ts"] >= out["coin_id"].map(first_new)].reset_index(drop=True)
+    if not out.empty:
+        insert_indicators(out)
+    save_indicator_state(states)
+    return out
+
+
+if __name__ == "__main__":
+    # jednorazowe przeliczenie wskaźników i stanu z zapisanej historii
+    from datetime import datetime, timedelta, timezone
+    from db.db import get_history_all, insert_indicators, save_indicator_state
+
+    end = datetime.now(timezone.utc)
+    history = get_history_all(end - timedelta(days=int(os.getenv("INDICATORS_DAYS_BACK", "3650"))), end)
+    out, states = _replay(history)
+    insert_indicators(out)
+    save_indicator_state(states)
+    print(f"📐 Przeliczono wskaźniki — {len(out)} wierszy, {len(states)} monet.")
@@ -0,0 +1,200 @@
+# metrics.py
+import json
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+# Katalog raportów: <METRICS_DIR>/<nazwa>.json i <nazwa>.prom (textfile collector node_exportera)
+METRICS_DIR = os.getenv("METRICS_DIR", "data/metrics")
+
+# Przedziały histogramów czasu (sekundy)
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+# ile ostatnich próbek trzymać do percentyli w raporcie JSON
+_SAMPLES = 10_000
+
+
+# ==============================
+#  REGISTRY
+# ==============================
+def _escape(value) -> str:
+    """Wartość etykiety Prometheusa: \\ i " poprzedzone ukośnikiem, nowa linia jako \\n."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class _Histogram:
+    def __init__(self):
+        self.count = 0
+        self.sum = 0.0
+        self.min = None
+        self.max = None
+        self.buckets = [0] * len(BUCKETS)
+        self.samples = deque(maxlen=_SAMPLES)
+
+    def observe(self, value: float):
+        self.count += 1
+        self.sum += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        for i, le in enumerate(BUCKETS):
+            if value <= le:
+                self.buckets[i] += 1
+        self.samples.append(value)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def q(p):
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 6) if ordered else None
+
+        return {"count": self.count, "sum": round(self.sum, 6), "min": self.min, "max": self.max,
+                "p50": q(0.50), "p95": q(0.95), "p99": q(0.99)}
+
+
+class Metrics:
+    """
+    Liczniki i histogramy z etykietami (thread-safe), eksportowane jako raport
+    JSON uruchomienia oraz tekst w formacie Prometheusa.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters = {}    # (nazwa, etykiety) -> wartość
+        self._histograms = {}  # (nazwa, etykiety) -> _Histogram
+        self._help = {}
+        self.started_at = datetime.now(timezone.utc)
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, help: str = None, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            if help:
+                self._help.setdefault(name, help)
+
+    def observe(self, name: str, value: float, help: str = None, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._histograms.setdefault(key, _Histogram()).observe(value)
+            if help:
+                self._help.setdefault(name, help)
+
+    @contextmanager
+    def timer(self, name: str, help: str = None, **labels):
+        """Mierzy czas bloku (także zakończonego wyjątkiem) w histogramie `name`."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0, help, **labels)
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self.started_at = datetime.now(timezone.utc)
+
+    # ---- eksport ----
+    def snapshot(self) -> dict:
+        """Raport JSON: liczniki i podsumowania histogramów (count/sum/min/max/p50/p95/p99)."""
+        with self._lock:
+            counters = [{"name": n, "labels": dict(l), "value": v} for (n, l), v in sorted(self._counters.items())]
+            histograms = [{"name": n, "labels": dict(l), **h.summary()}
+                          for (n, l), h in sorted(self._histograms.items())]
+        now = datetime.now(timezone.utc)
+        return {
+            "started_at": self.started_at.isoformat(),
+            "finished_at": now.isoformat(),
+            "duration_s": round((now - self.started_at).total_seconds(), 3),
+            "counters": counters,
+            "histograms": histograms,
+        }
+
+    def prometheus(self) -> str:
+        """Tekstowy format ekspozycji Prometheusa (counter + histogram)."""
+        def fmt(labels, extra=()):
+            items = list(labels) + list(extra)
+            if not items:
+                return ""
+            return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+        lines, typed = [], set()
+        with self._lock:
+            for (name, labels), value in sorted(self._counters.items()):
+                if name not in typed:
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} counter")
+                    typed.add(name)
+                lines.append(f"{name}{fmt(labels)} {value}")
+            for (name, labels), h in sorted(self._histograms.items()):
+                if name not in typed:
+                    if name in self._help:
+                        lines.append(f"# HELP {name} {self._help[name]}")
+                    lines.append(f"# TYPE {name} histogram")
+                    typed.add(name)
+                for le, n in zip(BUCKETS, h.buckets):
+                    lines.append(f"{name}_bucket{fmt(labels, [('le', le)])} {n}")
+                lines.append(f"{name}_bucket{fmt(labels, [('le', '+Inf')])} {h.count}")
+                lines.append(f"{name}_sum{fmt(labels)} {h.sum}")
+                lines.append(f"{name}_count{fmt(labels)} {h.count}")
+        return "\n".join(lines) + "\n"
+
+    def export(self, name: str = "etl_run", directory: str = None) -> dict:
+        """Zapisuje <name>.json i <name>.prom (atomowo). Zwraca raport."""
+        directory = directory or METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        report = self.snapshot()
+        for ext, text in (("json", json.dumps(report, indent=2)), ("prom", self.prometheus())):
+            path = os.path.join(directory, f"{name}.{ext}")
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(path + ".tmp", path)
+        print(f"📏 Metryki zapisane — {os.path.join(directory, name)}.json / .prom")
+        return report
+
+
+METRICS = Metrics()
+
+
+# ==============================
+#  CACHE HIT / MISS
+# ==============================
+_miss = threading.local()
+
+
+def cache_miss():
+    """Wołane wewnątrz ciała funkcji cache'owanej – wykonuje się tylko przy chybieniu."""
+    _miss.flag = True
+
+
+def track_cache(name: str, metrics: Metrics = None):
+    """
+    Dekorator nakładany na funkcję z cache (np. st.cache_data): mierzy czas
+    wywołania i zapisuje go jako trafienie lub chybienie (wg cache_miss()).
+    """
+    metrics = metrics or METRICS
+
+    def deco(fn):
+        def wrapper(*args, **kwargs):
+            _miss.flag = False
+            t0 = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                result = "miss" if _miss.flag else "hit"
+                metrics.observe("crypto_dashboard_cache_seconds", time.perf_counter() - t0,
+                                "Czas wywołań funkcji z cache dashboardu", fn=name, result=result)
+                metrics.inc("crypto_dashboard_cache_total", 1, "Trafienia i chybienia cache dashboardu",
+                            fn=name, result=result)
+
+        wrapper.__wrapped__ = fn
+        wrapper.__name__ = getattr(fn, "__name__", name)
+        return wrapper
+
+    return deco
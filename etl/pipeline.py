@@ -0,0 +1,277 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import json
+import shutil
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import pandas as pd
+from dotenv import load_dotenv
+
+from db.db import DB_BACKEND, TABLE, insert_data, get_latest_dates, refresh_coins, ensure_partitions
+from etl import fetch_data as fd
+from etl.indicators import update_indicators
+from etl.metrics import METRICS
+from etl.rollups import update_rollups
+
+load_dotenv("etl/.env", encoding="utf-8")
+
+# Punkty kontrolne uruchomień: <PIPELINE_DIR>/<run_id>/<zadanie>.done (+ pliki pośrednie .parquet).
+# Zadania jednego uruchomienia wymieniają dane przez ten katalog – przy zadaniach na wielu
+# maszynach (dags/crypto_etl_dag.py z Celery/Kubernetes) musi to być wspólny wolumen.
+PIPELINE_DIR = os.getenv("PIPELINE_DIR", "data/pipeline")
+# Ile ostatnich ukończonych uruchomień zostawić na dysku (same znaczniki, bez plików pośrednich)
+KEEP_RUNS = int(os.getenv("PIPELINE_KEEP_RUNS", "7"))
+
+# Graf zadań: per moneta extract → transform → load, na końcu jedno finalize
+STAGES = ["extract", "transform", "load"]
+FINALIZE = "finalize"
+
+
+# ==============================
+#  CHECKPOINTS
+# ==============================
+class Checkpoints:
+    """Znaczniki ukończonych zadań i ich wyniki pośrednie w katalogu uruchomienia."""
+
+    def __init__(self, run_id: str, root: str = None):
+        self.run_id = run_id
+        self.root = root or PIPELINE_DIR
+        self.dir = os.path.join(self.root, run_id)
+        os.makedirs(self.dir, exist_ok=True)
+
+    def _marker(self, task):
+        return os.path.join(self.dir, f"{task}.done")
+
+    def frame_path(self, task):
+        return os.path.join(self.dir, f"{task}.parquet")
+
+    def done(self, task) -> bool:
+        return os.path.exists(self._marker(task))
+
+    def info(self, task) -> dict:
+        with open(self._marker(task), encoding="utf-8") as f:
+            return json.load(f)
+
+    def mark(self, task, **info):
+        info["finished_at"] = datetime.now(timezone.utc).isoformat()
+        tmp = self._marker(task) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(info, f)
+        os.replace(tmp, self._marker(task))
+
+    def save_frame(self, task, df: pd.DataFrame):
+        tmp = self.frame_path(task) + ".tmp"
+        df.to_parquet(tmp, index=False)
+        os.replace(tmp, self.frame_path(task))
+
+    def load_frame(self, task) -> pd.DataFrame:
+        return pd.read_parquet(self.frame_path(task))
+
+    def drop_frames(self):
+        """Usuwa pliki pośrednie – po finalize potrzebne są już tylko znaczniki."""
+        for name in os.listdir(self.dir):
+            if name.endswith(".parquet"):
+                os.remove(os.path.join(self.dir, name))
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def prune_runs(root: str = None, keep: int = None) -> list:
+    """
+    Usuwa ukończone uruchomienia starsze niż `keep` ostatnich (wg run_id).
+    Nieukończone zostają – można je wznowić. Zwraca usunięte run_id.
+    """
+    root = root or PIPELINE_DIR
+    keep = KEEP_RUNS if keep is None else keep
+    if not os.path.isdir(root):
+        return []
+    finished = sorted(r for r in os.listdir(root) if os.path.exists(os.path.join(root, r, f"{FINALIZE}.done")))
+    old = finished[:max(len(finished) - keep, 0)]
+    for run_id in old:
+        shutil.rmtree(os.path.join(root, run_id), ignore_errors=True)
+    return old
+
+
+def task_id(stage: str, coin: str) -> str:
+    return f"{stage}__{coin}"
+
+
+def default_run_id() -> str:
+    """Jedno uruchomienie na dzień UTC – ponowny start tego samego dnia wznawia pracę."""
+    return os.getenv("PIPELINE_RUN_ID") or datetime.now(timezone.utc).strftime("%Y-%m-%d")
+
+
+# ==============================
+#  TASKS
+# ==============================
+def extract(coin, ckpt: Checkpoints, bucket=None, since=None, days_back=365):
+    """Pobiera surowe punkty monety (od `since`, jeśli moneta jest już w bazie)."""
+    bucket = bucket or fd.make_bucket()
+    with METRICS.timer("crypto_etl_fetch_seconds", "Czas pobrania monety (z ponowieniami)", coin=coin):
+        if since is not None:
+            frame = fd._fetch_coin_since(coin, since, bucket)
+        else:
+            frame = fd._fetch_coin(coin, days_back, bucket)
+    ckpt.save_frame(task_id("extract", coin), frame)
+    ckpt.mark(task_id("extract", coin), rows=len(frame))
+    return frame
+
+
+def transform(coin, ckpt: Checkpoints):
+    """Porządkuje paczkę monety: bez pustych cen, jeden punkt na date_, rosnąco."""
+    frame = ckpt.load_frame(task_id("extract", coin))
+    frame = (frame.dropna(subset=["current_price", "date_"])
+                  .drop_duplicates(subset=["date_"], keep="last")
+                  .sort_values("date_")
+                  .reset_index(drop=True))
+    ckpt.save_frame(task_id("transform", coin), frame)
+    ckpt.mark(task_id("transform", coin), rows=len(frame))
+    return frame
+
+
+def load(coin, ckpt: Checkpoints):
+    """Upsert paczki monety; znacznik tylko, gdy zapisano wszystkie wiersze."""
+    frame = ckpt.load_frame(task_id("transform", coin))
+    if len(frame):
+        ensure_partitions(frame["date_"].min(), frame["date_"].max(), [TABLE])
+    stats = insert_data(frame) if len(frame) else {"written": 0, "failed": 0, "errors": []}
+    if stats.get("failed"):
+        raise RuntimeError(f"zapis {coin} nieudany ({stats['failed']} wierszy): {stats['errors'][:1]}")
+    ckpt.mark(task_id("load", coin), rows=stats.get("written", len(frame)))
+    return stats
+
+
+def finalize(coin_ids, ckpt: Checkpoints):
+    """
+    Wymiar coins, agregaty i wskaźniki oraz kopia lokalna dla monet
+    załadowanych, a jeszcze nie sfinalizowanych. Błąd agregatów lub
+    wskaźników przerywa finalize bez znaczników – ponowienie powtarza całość
+    (agregaty przeliczają dotknięte dni, wskaźniki pomijają ts <= last_ts).
+    Całe uruchomienie jest ukończone, gdy sfinalizowano wszystkie monety.
+    """
+    todo = [c for c in coin_ids if ckpt.done(task_id("load", c)) and not ckpt.done(task_id(FINALIZE, c))]
+    batch = fd.concat_batches([ckpt.load_frame(task_id("transform", c)) for c in todo])
+    if len(batch):
+        refresh_coins(sorted(todo))
+        history = fd._derived_history(batch)
+        out = update_rollups(history)
+        print(f"📈 Agregaty zaktualizowane — {len(out)} wierszy.")
+        out = update_indicators(history)
+        print(f"📐 Wskaźniki zaktualizowane — {len(out)} nowych punktów.")
+        if fd.LOCAL_MIRROR and DB_BACKEND != "parquet":
+            from db import mirror
+            mirror.insert_data(batch)
+    for c in todo:
+        ckpt.mark(task_id(FINALIZE, c))
+    if all(ckpt.done(task_id(FINALIZE, c)) for c in coin_ids):
+        rows = sum(ckpt.info(task_id("load", c))["rows"] for c in coin_ids)
+        ckpt.mark(FINALIZE, coins=len(coin_ids), rows=rows)
+        ckpt.drop_frames()
+        prune_runs(ckpt.root)
+    return batch
+
+
+def run_coin(coin, ckpt: Checkpoints, bucket=None, since=None, days_back=365):
+    """Łańcuch extract → transform → load jednej monety z pominięciem ukończonych zadań."""
+    stage_fns = {
+        "extract": lambda: extract(coin, ckpt, bucket, since, days_back),
+        "transform": lambda: transform(coin, ckpt),
+        "load": lambda: load(coin, ckpt),
+    }
+    for stage in STAGES:
+        if ckpt.done(task_id(stage, coin)):
+            continue
+        with METRICS.timer("crypto_etl_task_seconds", "Czas zadań potoku", stage=stage):
+            stage_fns[stage]()
+    return ckpt.info(task_id("load", coin))["rows"]
+
+
+def run_task(stage, coin=None, run_id=None, coin_ids=None, days_back=365, incremental=True, rate_per_min=None):
+    """
+    Pojedyncze zadanie grafu (np. z Airflow). Już ukończone zadanie jest
+    pomijane, więc ponowienie w schedulerze nie dubluje pracy. Każde zadanie
+    extract ma własny limiter – przy N zadaniach naraz `rate_per_min` powinno
+    być częścią limitu CoinGecko (dags/crypto_etl_dag.py dzieli go przez N).
+    """
+    ckpt = Checkpoints(run_id or default_run_id())
+    if stage == FINALIZE:
+        coin_ids = coin_ids or fd.DEFAULT_COIN_IDS
+        if not ckpt.done(FINALIZE):
+            finalize(coin_ids, ckpt)
+        if not ckpt.done(FINALIZE):
+            missing = [c for c in coin_ids if not ckpt.done(task_id(FINALIZE, c))]
+            raise RuntimeError(f"❌ Niezaładowane monety: {', '.join(missing)} – ponów ich zadania.")
+        return ckpt.info(FINALIZE)
+    if ckpt.done(task_id(stage, coin)):
+        return ckpt.info(task_id(stage, coin))
+    if stage == "extract":
+        since = get_latest_dates([coin]).get(coin) if incremental else None
+        extract(coin, ckpt, fd.make_bucket(rate_per_min), since=since, days_back=days_back)
+    elif stage == "transform":
+        transform(coin, ckpt)
+    elif stage == "load":
+        load(coin, ckpt)
+    else:
+        raise ValueError(f"❌ Nieznane zadanie {stage!r}.")
+    return ckpt.info(task_id(stage, coin))
+
+
+# ==============================
+#  RUNNER
+# ==============================
+def run_pipeline(coin_ids=None, run_id=None, days_back=365, incremental=True, max_workers=None,
+                 rate_per_min=None, root=None):
+    """
+    Uruchamia graf zadań: monety równolegle (`max_workers`), wspólny limiter
+    CoinGecko, punkty kontrolne po każdym zadaniu. Nieudane monety nie
+    blokują pozostałych; ponowne wywołanie z tym samym `run_id` wznawia pracę.
+    """
+    coin_ids = coin_ids or fd.DEFAULT_COIN_IDS
+    ckpt = Checkpoints(run_id or default_run_id(), root)
+    if ckpt.done(FINALIZE):
+        print(f"✅ Uruchomienie {ckpt.run_id} jest już ukończone.")
+        return ckpt.info(FINALIZE)
+
+    pending = [c for c in coin_ids if not ckpt.done(task_id("load", c))]
+    resumed = len(coin_ids) - len(pending)
+    print(f"🚀 Potok {ckpt.run_id}: {len(pending)} monet do zrobienia"
+          + (f", {resumed} ukończonych wcześniej" if resumed else ""))
+
+    need_since = [c for c in pending if not ckpt.done(task_id("extract", c))]
+    latest = get_latest_dates(need_since) if incremental and need_since else {}
+    bucket = fd.make_bucket(rate_per_min)
+    workers = max(1, min(max_workers or fd.MAX_WORKERS, len(pending) or 1))
+    failed = {}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(run_coin, c, ckpt, bucket, latest.get(c), days_back): c for c in pending}
+        for idx, fut in enumerate(as_completed(futures), start=1):
+            coin = futures[fut]
+            try:
+                rows = fut.result()
+                print(f"[{idx}/{len(pending)}] ✅ {coin}: {rows} wierszy zapisanych")
+            except Exception as e:
+                failed[coin] = str(e)
+                print(f"[{idx}/{len(pending)}] ❌ {coin}: {e}")
+
+    # monety załadowane są finalizowane także wtedy, gdy inne zawiodły
+    batch = finalize(coin_ids, ckpt)
+    if failed:
+        print(f"⚠️ {len(failed)} monet z błędem – uruchom ponownie z run_id={ckpt.run_id}, aby wznowić.")
+        return {"run_id": ckpt.run_id, "failed": failed, "rows": len(batch)}
+    print(f"🏁 Potok {ckpt.run_id} zakończony — {len(batch)} nowych wierszy.")
+    return {"run_id": ckpt.run_id, "failed": {}, **ckpt.info(FINALIZE)}
+
+
+if __name__ == "__main__":
+    try:
+        run_pipeline(days_back=int(os.getenv("ETL_DAYS_BACK", "30")),
+                     incremental=os.getenv("ETL_INCREMENTAL", "1") == "1")
+    finally:
+        METRICS.export("etl_run")
@@ -0,0 +1,198 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import pandas as pd
+
+# Okresy agregacji i okna statystyk kroczących (w liczbie okresów)
+PERIODS = {
+    "day":   {"freq": "D", "short": 7, "long": 30},
+    "week":  {"freq": "W", "short": 4, "long": 13},
+    "month": {"freq": "M", "short": 3, "long": 12},
+}
+
+ROLLUP_COLUMNS = [
+    "coin_id", "period", "bucket",
+    "open", "high", "low", "close", "volume", "points",
+    "ret", "ma_short", "ma_long", "vol_long",
+]
+
+
+# ==============================
+#  BUCKETS
+# ==============================
+def bucket_start(ts, period: str):
+    """Początek okresu (UTC) dla znacznika czasu lub serii: dzień, tydzień (pon.), miesiąc."""
+    ts = pd.to_datetime(ts, utc=True)
+    if period == "day":
+        return ts.floor("D") if isinstance(ts, pd.Timestamp) else ts.dt.floor("D")
+    if isinstance(ts, pd.Timestamp):
+        naive = ts.tz_convert("UTC").tz_localize(None)
+        return naive.to_period(PERIODS[period]["freq"]).start_time.tz_localize("UTC")
+    naive = ts.dt.tz_convert("UTC").dt.tz_localize(None)
+    return naive.dt.to_period(PERIODS[period]["freq"]).dt.start_time.dt.tz_localize("UTC")
+
+
+def lookback_start(bucket, period: str):
+    """Początek okna potrzebnego do policzenia statystyk kroczących od `bucket`."""
+    n = PERIODS[period]["long"]
+    if period == "day":
+        return bucket - pd.Timedelta(days=n)
+    if period == "week":
+        return bucket - pd.Timedelta(weeks=n)
+    return bucket - pd.DateOffset(months=n)
+
+
+def next_bucket(bucket, period: str):
+    """Początek następnego okresu."""
+    if period == "day":
+        return bucket + pd.Timedelta(days=1)
+    if period == "week":
+        return bucket + pd.Timedelta(weeks=1)
+    return bucket + pd.DateOffset(months=1)
+
+
+# ==============================
+#  AGGREGATION
+# ==============================
+def _ohlc(parts: pd.DataFrame, period: str) -> pd.DataFrame:
+    """
+    Agreguje wiersze (open/high/low/close/volume/points, ts) do okresów.
+    Ta sama funkcja składa dni z surowych cen i tygodnie/miesiące z dni.
+    """
+    parts = parts.sort_values(["coin_id", "ts"])
+    parts = parts.assign(bucket=bucket_start(parts["ts"], period))
+    g = parts.groupby(["coin_id", "bucket"], sort=True)
+    out = g.agg(
+        open=("open", "first"), high=("high", "max"), low=("low", "min"),
+        close=("close", "last"), volume=("volume", "sum"), points=("points", "sum"),
+    ).reset_index()
+    out["period"] = period
+    return out
+
+
+def raw_to_parts(df: pd.DataFrame) -> pd.DataFrame:
+    """Surowa historia (coin_id, ts, price, volume) → wiersze do agregacji."""
+    ts = pd.to_datetime(df["ts"], utc=True, errors="coerce")
+    price = pd.to_numeric(df["price"], errors="coerce")
+    parts = pd.DataFrame({
+        "coin_id": df["coin_id"].to_numpy(),
+        "ts": ts,
+        "open": price, "high": price, "low": price, "close": price,
+        "volume": pd.to_numeric(df["volume"], errors="coerce").fillna(0.0),
+        "points": 1,
+    })
+    return parts.dropna(subset=["ts", "close"])
+
+
+def add_rolling(df: pd.DataFrame, period: str) -> pd.DataFrame:
+    """Zwrot okresowy, średnie kroczące zamknięć i zmienność zwrotów (per coin)."""
+    cfg = PERIODS[period]
+    df = df.sort_values(["coin_id", "bucket"]).reset_index(drop=True)
+    by = df.groupby("coin_id", sort=False)["close"]
+    df["ret"] = by.pct_change()
+    df["ma_short"] = by.transform(lambda s: s.rolling(cfg["short"], min_periods=1).mean())
+    df["ma_long"] = by.transform(lambda s: s.rolling(cfg["long"], min_periods=1).mean())
+    df["vol_long"] = df.groupby("coin_id", sort=False)["ret"].transform(
+        lambda s: s.rolling(cfg["long"], min_periods=2).std()
+    )
+    return df
+
+
+def compute_rollups(history: pd.DataFrame, periods=None) -> pd.DataFrame:
+    """Pełne przeliczenie agregatów z surowej historii (np. backfill lub kopia lokalna)."""
+    parts = raw_to_parts(history)
+    if parts.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    out = []
+    day = _ohlc(parts, "day")
+    for period in periods or PERIODS:
+        base = day if period == "day" else _ohlc(day.rename(columns={"bucket": "ts"}), period)
+        out.append(add_rolling(base, period))
+    return pd.concat(out, ignore_index=True)[ROLLUP_COLUMNS]
+
+
+# ==============================
+#  INCREMENTAL UPDATE
+# ==============================
+def _touched_days(parts: pd.DataFrame, coin_ids) -> pd.DataFrame:
+    """
+    Wiersze całych dni (coin_id, dzień) dotkniętych paczką: zapisana historia
+    [początek dnia, koniec dnia) uzupełniona paczką (ten sam ts – wygrywa paczka).
+    """
+    from db.db import query_history
+    from db.query import HistoryQuery
+
+    days = bucket_start(parts["ts"], "day")
+    q = (HistoryQuery(days.min(), days.max() + pd.Timedelta(days=1) - pd.Timedelta(microseconds=1))
+         .coins(coin_ids).select("coin_id", "ts", "price", "volume"))
+    stored = raw_to_parts(query_history(q))
+    rows = pd.concat([stored, parts], ignore_index=True).drop_duplicates(["coin_id", "ts"], keep="last")
+    touched = pd.MultiIndex.from_arrays([parts["coin_id"], days]).unique()
+    keep = pd.MultiIndex.from_arrays([rows["coin_id"], bucket_start(rows["ts"], "day")]).isin(touched)
+    return rows[keep]
+
+
+def update_rollups(history: pd.DataFrame, periods=None) -> pd.DataFrame:
+    """
+    Aktualizuje agregaty po załadowaniu nowych wierszy `history`.
+
+    Dni dotknięte ładowaniem liczone są od nowa ze wszystkich zapisanych
+    wierszy tych dni (paczka może pokrywać tylko część dnia – ponowienie,
+    1–2 nowe punkty, okno śródzienne); tygodnie/miesiące – z zapisanych
+    agregatów dziennych dotkniętych okresów plus przeliczonych dni.
+    Statystyki kroczące potrzebują tylko `long` poprzednich okresów z tabeli
+    agregatów, więc koszt zależy od liczby dotkniętych dni, a nie od długości historii.
+    """
+    from db.db import get_rollups, insert_rollups
+
+    parts = raw_to_parts(history)
+    if parts.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    coin_ids = sorted(parts["coin_id"].unique())
+    day_new = _ohlc(_touched_days(parts, coin_ids), "day")
+
+    out = []
+    for period in periods or PERIODS:
+        if period == "day":
+            base = day_new
+        else:
+            lo = bucket_start(day_new["bucket"].min(), period)
+            hi = next_bucket(bucket_start(day_new["bucket"].max(), period), period) - pd.Timedelta(microseconds=1)
+            stored = get_rollups("day", lo, hi, coin_ids)
+            days = pd.concat([stored, day_new], ignore_index=True) if not stored.empty else day_new
+            days = days.drop_duplicates(["coin_id", "bucket"], keep="last")
+            days = days[bucket_start(days["bucket"], period).isin(bucket_start(day_new["bucket"], period))]
+            base = _ohlc(days.rename(columns={"bucket": "ts"})[
+                ["coin_id", "ts", "open", "high", "low", "close", "volume", "points"]
+            ], period)
+
+        first = base["bucket"].min()
+        prev = get_rollups(period, lookback_start(first, period), first - pd.Timedelta(microseconds=1), coin_ids)
+        if not prev.empty:
+            prev = prev[["coin_id", "bucket", "open", "high", "low", "close", "volume", "points"]]
+            full = pd.concat([prev.assign(_new=False), base.assign(_new=True)], ignore_index=True)
+        else:
+            full = base.assign(_new=True)
+        full["period"] = period
+        full = add_rolling(full, period)
+        out.append(full[full["_new"].astype(bool)])
+
+    result = pd.concat(out, ignore_index=True)[ROLLUP_COLUMNS]
+    insert_rollups(result)
+    return result
+
+
+if __name__ == "__main__":
+    # jednorazowe przeliczenie agregatów z całej zapisanej historii
+    from datetime import datetime, timedelta, timezone
+    from db.db import get_history_all, insert_rollups
+
+    end = datetime.now(timezone.utc)
+    history = get_history_all(end - timedelta(days=int(os.getenv("ROLLUPS_DAYS_BACK", "3650"))), end)
+    out = compute_rollups(history)
+    insert_rollups(out)
+    print(f"📈 Przeliczono agregaty — {len(out)} wierszy.")
@@ -0,0 +1,86 @@
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+
+# ==============================
+#  TOKEN BUCKET
+# ==============================
+class TokenBucket:
+    """
+    Współdzielony (thread-safe) limiter zapytań typu token bucket.
+
+    rate     – docelowa liczba zapytań na sekundę,
+    capacity – maksymalny "zapas" tokenów (burst).
+
+    Po 429 limiter wstrzymuje wszystkie wątki do końca okna Retry-After
+    i zmniejsza tempo o połowę; każde udane zapytanie przywraca je stopniowo
+    (AIMD), ale nigdy powyżej skonfigurowanego `rate`.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1.0, min_rate: float = None):
+        if rate <= 0:
+            raise ValueError("rate musi być > 0")
+        self.max_rate = float(rate)
+        self.rate = float(rate)
+        self.min_rate = float(min_rate) if min_rate else self.max_rate / 16
+        self.capacity = max(float(capacity), 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self) -> None:
+        """Blokuje, dopóki nie będzie dostępny token."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    wait = self._blocked_until - now
+                else:
+                    self._refill(now)
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        return
+                    wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def backoff(self, delay: float) -> None:
+        """Reakcja na 429: pauza dla wszystkich wątków + obniżenie tempa."""
+        with self._lock:
+            now = time.monotonic()
+            self._blocked_until = max(self._blocked_until, now + max(delay, 0.0))
+            self.rate = max(self.min_rate, self.rate / 2)
+            self._tokens = 0.0
+            self._updated = max(now, self._blocked_until)
+
+    def success(self) -> None:
+        """Udane zapytanie – addytywny powrót do docelowego tempa."""
+        with self._lock:
+            if self.rate < self.max_rate:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 10)
+
+
+def parse_retry_after(value, default: float = None):
+    """
+    Nagłówek Retry-After może zawierać liczbę sekund albo datę HTTP.
+    Zwraca liczbę sekund (>= 0) lub `default`, jeśli nagłówka nie da się odczytać.
+    """
+    if value is None or value == "":
+        return default
+    try:
+        return max(float(value), 0.0)
+    except (TypeError, ValueError):
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max((when - datetime.now(timezone.utc)).total_seconds(), 0.0)
@@ -1,12 +1,31 @@
-from etl.fetch_data import fetch_data
-from db.db import init_table
-from etl.save import save_to_csv
-import pandas as pd
+import os
+from datetime import datetime, timedelta, timezone
+
+from db.db import DB_BACKEND, ensure_partitions
+from etl.metrics import METRICS
+from etl.pipeline import run_pipeline
+
+# Partycje miesięczne tworzone na zapas przy każdym uruchomieniu
+PARTITION_MONTHS_AHEAD = int(os.getenv("PARTITION_MONTHS_AHEAD", "3"))
+
+
+def run_etl(run_id=None, days_back=30, incremental=True):
+    """
+    Migracje schematu (Postgres) i partycje na PARTITION_MONTHS_AHEAD miesięcy
+    naprzód, potem potok extract → transform → load z punktami kontrolnymi.
+    """
+    if DB_BACKEND == "postgres":
+        from db.migrate import migrate
+        migrate()
+    now = datetime.now(timezone.utc)
+    ensure_partitions(now, now + timedelta(days=31 * PARTITION_MONTHS_AHEAD))
+    try:
+        result = run_pipeline(run_id=run_id, days_back=days_back, incremental=incremental)
+        print(f"Pipeline finished: {result}")
+        return result
+    finally:
+        METRICS.export("etl_run")
 
-def run_etl():
-    init_table()
-    raw_data = fetch_data()
-    print(f"Raw data fetched. Length: {(raw_data)}")
 
 if __name__ == "__main__":
-    run_etl()
\ No newline at end of file
+    run_etl()
@@ -0,0 +1,128 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from dashboard.cache import ALL, SegmentCache
+from dashboard.downsample import bucket_mean, downsample, lttb, minmax
+from dashboard.loader import Prefetch
+
+
+def _history(start, end):
+    ts = pd.date_range(start, end, freq="D")
+    return pd.concat([
+        pd.DataFrame({"coin_id": c, "name": c, "price": 1.0, "volume": 1.0, "ts": ts})
+        for c in ("a", "b")
+    ], ignore_index=True)
+
+
+# =========================
+#     Segment cache
+# =========================
+def test_segment_cache_fetches_only_missing_months():
+    calls = []
+
+    def fetch(scope, start, end):
+        calls.append((scope, start.month, end.month))
+        df = _history(start, end)
+        return df if scope == ALL else df[df["coin_id"] == scope]
+
+    cache = SegmentCache(fetch, ttl_old=10**9, ttl_recent=10**9)
+    utc = timezone.utc
+    jan_mar = cache.get(ALL, datetime(2020, 1, 1, tzinfo=utc), datetime(2020, 4, 1, tzinfo=utc))
+    assert calls == [(ALL, 1, 3)]
+    assert len(jan_mar) == 2 * (31 + 29 + 31)
+
+    # przesunięcie początku o miesiąc – tylko nowy miesiąc z sieci
+    cache.get(ALL, datetime(2020, 2, 1, tzinfo=utc), datetime(2020, 5, 1, tzinfo=utc))
+    assert calls[-1] == (ALL, 4, 4)
+
+    # koniec wyłączny: początek następnego miesiąca nie dociąga całego miesiąca
+    april = cache.get(ALL, datetime(2020, 4, 1, tzinfo=utc), datetime(2020, 5, 1, tzinfo=utc))
+    assert len(calls) == 2 and april["ts"].max() == pd.Timestamp("2020-04-30", tz="UTC")
+
+    # pojedyncza moneta obsłużona z segmentów ALL
+    one = cache.get("a", datetime(2020, 2, 10, tzinfo=utc), datetime(2020, 3, 5, tzinfo=utc))
+    assert len(calls) == 2
+    assert set(one["coin_id"]) == {"a"}
+    assert one["ts"].min() == pd.Timestamp("2020-02-10", tz="UTC")
+
+
+def test_segment_cache_fetches_selected_coins_in_one_query():
+    calls = []
+
+    def fetch(scope, start, end):
+        calls.append(scope)
+        df = _history(start, end)
+        return df[df["coin_id"].isin([scope] if isinstance(scope, str) else scope)]
+
+    cache = SegmentCache(fetch, ttl_old=10**9, ttl_recent=10**9)
+    utc = timezone.utc
+    both = cache.get(("a", "b"), datetime(2020, 1, 1, tzinfo=utc), datetime(2020, 3, 1, tzinfo=utc))
+    assert calls == [("a", "b")] and len(both) == 2 * (31 + 29)
+
+    # segmenty per moneta: widok jednej monety z cache, nowy miesiąc – jedno zapytanie dla obu
+    assert set(cache.get("b", datetime(2020, 1, 1, tzinfo=utc), datetime(2020, 2, 1, tzinfo=utc))["coin_id"]) == {"b"}
+    cache.get(("a", "b"), datetime(2020, 2, 1, tzinfo=utc), datetime(2020, 4, 1, tzinfo=utc))
+    assert calls == [("a", "b"), ("a", "b")]
+
+
+def test_segment_cache_evicts_least_recently_used():
+    cache = SegmentCache(lambda scope, s, e: _history(s, e), max_bytes=1)
+    utc = timezone.utc
+    cache.get(ALL, datetime(2020, 1, 1, tzinfo=utc), datetime(2020, 3, 1, tzinfo=utc))
+    assert cache.stats()["segments"] == 1
+
+
+# =========================
+#     Downsampling
+# =========================
+def test_lttb_keeps_endpoints_and_peaks():
+    y = np.sin(np.linspace(0, 20, 10_000))
+    y[5000] = 10.0
+    idx = lttb(np.arange(len(y)), y, 500)
+    assert len(idx) == 500 and idx[0] == 0 and idx[-1] == len(y) - 1
+    assert np.all(np.diff(idx) > 0)
+    assert 5000 in idx
+    assert {int(y.argmin()), 5000} <= set(minmax(y, 100))
+
+
+def test_downsample_bounds_points_per_series():
+    ts = pd.date_range("2020-01-01", periods=5000, freq="h", tz="UTC")
+    df = pd.concat([pd.DataFrame({"coin_id": c, "ts": ts, "v": np.random.rand(len(ts))})
+                    for c in ("a", "b")], ignore_index=True)
+    out = downsample(df, "ts", "v", "coin_id", n=300)
+    assert out.groupby("coin_id").size().tolist() == [300, 300]
+
+    share = bucket_mean(df, "ts", "v", "coin_id", n=100)
+    assert share["ts"].nunique() <= 100
+    assert share.groupby("ts")["coin_id"].nunique().eq(2).all()
+
+
+# =========================
+#     Prefetch
+# =========================
+def test_prefetch_runs_page_queries_concurrently():
+    calls = []
+
+    def slow(name, delay=0.2):
+        calls.append(name)
+        time.sleep(delay)
+        return name
+
+    t0 = time.perf_counter()
+    load = Prefetch([(slow, "coins"), (slow, "history"), (slow, "rollups"), (slow, "coins")])
+    assert [load(slow, n) for n in ("coins", "history", "rollups")] == ["coins", "history", "rollups"]
+    # czas ≈ najwolniejsze zapytanie, nie suma; duplikaty wykonane raz
+    assert time.perf_counter() - t0 < 0.5
+    assert sorted(calls) == ["coins", "history", "rollups"]
+    # zapytanie spoza planu wykonywane od razu
+    assert load(slow, "other", 0) == "other" and calls[-1] == "other"
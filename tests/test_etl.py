@@ -0,0 +1,772 @@
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+import json
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import db.db as db
+import etl.backfill as bf
+import etl.fetch_data as fd
+import etl.pipeline as pl
+from etl.utils import TokenBucket, parse_retry_after
+
+
+class FakeResponse:
+    def __init__(self, status_code=200, payload=None, headers=None):
+        self.status_code = status_code
+        self._payload = payload or {}
+        self.headers = headers or {}
+        self.text = ""
+        self.content = json.dumps(self._payload).encode()
+
+    def json(self):
+        return self._payload
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"HTTP {self.status_code}")
+
+
+# ==============================
+#  RATE LIMITER
+# ==============================
+def test_token_bucket_limits_rate():
+    bucket = TokenBucket(rate=20, capacity=1)
+    t0 = time.monotonic()
+    for _ in range(5):
+        bucket.acquire()
+    # pierwszy token z zapasu, kolejne 4 co 50 ms
+    assert time.monotonic() - t0 >= 0.18
+
+
+def test_token_bucket_backoff_halves_rate_and_recovers():
+    bucket = TokenBucket(rate=10)
+    bucket.backoff(0)
+    assert bucket.rate == 5
+    for _ in range(10):
+        bucket.success()
+    assert bucket.rate == 10
+
+
+def test_parse_retry_after():
+    assert parse_retry_after("7") == 7.0
+    assert parse_retry_after(None, default=3) == 3
+    assert parse_retry_after("garbage", default=1) == 1
+    assert parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+
+
+# ==============================
+#  FETCH
+# ==============================
+def test_get_json_retries_on_429(monkeypatch):
+    responses = [
+        FakeResponse(429, headers={"Retry-After": "0"}),
+        FakeResponse(200, {"prices": [[0, 1.0]], "total_volumes": [[0, 2.0]]}),
+    ]
+    monkeypatch.setattr(fd.requests, "get", lambda *a, **k: responses.pop(0))
+    bucket = TokenBucket(rate=1000, capacity=10)
+    data = fd._get_json("http://x", {}, bucket)
+    assert data["prices"] == [[0, 1.0]]
+    assert responses == []
+
+
+def test_response_cache_revalidates_and_replays(monkeypatch, tmp_path):
+    from etl.http_cache import CacheMiss, ResponseCache
+
+    chart = {"prices": [[0, 1.0]], "total_volumes": [[0, 2.0]]}
+    sent = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        sent.append(dict(headers))
+        if headers.get("If-None-Match") == '"v1"':
+            return FakeResponse(304)
+        return FakeResponse(200, chart, headers={"ETag": '"v1"'})
+
+    monkeypatch.setattr(fd.requests, "get", fake_get)
+    bucket = TokenBucket(rate=1000, capacity=10)
+    url, params = "http://x/coins/bitcoin/market_chart", {"days": 30, "vs_currency": "usd"}
+
+    monkeypatch.setattr(fd, "RESPONSE_CACHE", ResponseCache(str(tmp_path), mode="on", ttl=3600))
+    assert fd._get_json(url, params, bucket) == chart
+    assert fd._get_json(url, dict(reversed(params.items())), bucket) == chart  # świeży wpis
+    assert len(sent) == 1 and list(tmp_path.rglob("*.json.gz"))
+
+    monkeypatch.setattr(fd, "RESPONSE_CACHE", ResponseCache(str(tmp_path), mode="on", ttl=0))
+    assert fd._get_json(url, params, bucket) == chart
+    assert sent[-1]["If-None-Match"] == '"v1"'
+
+    monkeypatch.setattr(fd.requests, "get", lambda *a, **k: pytest.fail("replay bez sieci"))
+    monkeypatch.setattr(fd, "RESPONSE_CACHE", ResponseCache(str(tmp_path), mode="replay"))
+    assert fd._get_json(url, params, bucket) == chart
+    with pytest.raises(CacheMiss):
+        fd._get_json(url, {"days": 1}, bucket)
+
+    # przyrostowe zapytanie z innym from/to (inna godzina, przesunięty high-water mark)
+    range_url = "http://x/coins/bitcoin/market_chart/range"
+    ResponseCache(str(tmp_path), mode="on").store(range_url, {"vs_currency": "usd", "from": 1, "to": 2},
+                                                  json.dumps(chart).encode())
+    assert fd._get_json(range_url, {"vs_currency": "usd", "from": 5, "to": 9}, bucket) == chart
+    with pytest.raises(CacheMiss):
+        fd._get_json(range_url, {"vs_currency": "eur", "from": 5, "to": 9}, bucket)
+
+
+def test_daily_points_keeps_first_point_per_new_day():
+    day = 86_400_000
+    prices = [[day * 10 + 3_600_000 * h, float(h)] for h in range(0, 48, 6)]
+    volumes = [[ts, 1.0] for ts, _ in prices]
+    since = datetime.fromtimestamp(day * 10 / 1000, tz=timezone.utc)
+    ts, p, v = fd._daily_points([t for t, _ in prices], [x for _, x in prices],
+                                [x for _, x in volumes], after=since)
+    assert ts.tolist() == [day * 11]
+    assert p.tolist() == [24.0]
+    assert v.tolist() == [1.0]
+
+
+def test_fetch_data_builds_one_columnar_batch(monkeypatch, tmp_path):
+    day = 86_400_000
+    chart = {"prices": [[day * i, 1.234567891] for i in range(3)],
+             "total_volumes": [[day * i, 10.005] for i in range(3)]}
+    monkeypatch.setattr(fd, "_get_json", lambda *a, **k: chart)
+    sent = []
+    monkeypatch.setattr(fd, "insert_data", sent.append)
+    monkeypatch.setattr(fd, "refresh_coins", lambda ids: None)
+    monkeypatch.setattr(fd, "_update_derived", lambda batch: None)
+    partitions = []
+    monkeypatch.setattr(fd, "ensure_partitions", lambda *args: partitions.append(args))
+
+    batch = fd.fetch_data(["bitcoin", "ethereum"], days_back=3, rate_per_min=6000)
+    assert sent[0] is batch and len(batch) == 6
+    # partycje miesięczne pokrywają paczkę przed zapisem – nic nie trafia do DEFAULT
+    assert partitions == [(batch["date_"].min(), batch["date_"].max(), ["crypto_prices"])]
+    assert list(batch.columns) == fd.BATCH_COLUMNS
+    assert batch["coin_id"].dtype == "category"
+    assert set(batch["coin_id"].cat.categories) == {"bitcoin", "ethereum"}
+    assert batch["current_price"].iloc[0] == 1.234568
+
+    rec = db.frame_to_records(batch[batch["coin_id"] == "bitcoin"].iloc[:1])[0]
+    assert rec["date_"].startswith("1970-01-01T00:00:00") and rec["date_"].endswith("+00:00")
+    # pola snapshotu nie są wysyłane – upsert historii nie zeruje ich w bazie
+    assert "market_cap" not in rec and rec["name"] == "Bitcoin"
+
+
+def test_fetch_markets_defaults_to_default_coins(monkeypatch):
+    seen = []
+    monkeypatch.setattr(fd, "_get_json", lambda url, params, bucket: seen.append(params) or [])
+
+    snap = fd.fetch_markets(bucket=TokenBucket(rate=1000))
+    assert [p["ids"] for p in seen] == [",".join(fd.DEFAULT_COIN_IDS)] and snap.empty
+
+
+# ==============================
+#  LOAD
+# ==============================
+def test_insert_data_chunks_and_reports_failures(monkeypatch):
+    calls = []
+
+    def fake_post(url, headers=None, json=None, timeout=None):
+        calls.append(len(json))
+        # paczka zawierająca rekord 5 zawsze zwraca błąd walidacji
+        return FakeResponse(400 if any(r["i"] == 5 for r in json) else 201)
+
+    monkeypatch.setattr(db.requests, "post", fake_post)
+    stats = db.insert_data([{"i": i} for i in range(10)], chunk_size=4, max_workers=2, max_retries=1)
+    assert sorted(calls) == [2, 4, 4]
+    assert stats["written"] == 6
+    assert stats["failed"] == 4
+    assert stats["failed_chunks"] == 1
+
+
+def test_postgres_insert_retries_chunk_after_connection_error(monkeypatch):
+    from contextlib import contextmanager
+
+    from psycopg2 import OperationalError
+
+    from db import postgres as pg
+
+    attempts = []
+
+    @contextmanager
+    def fake_connection():
+        yield None
+
+    def flaky_upsert(conn, chunk, columns, table, key):
+        attempts.append(len(chunk))
+        if len(attempts) == 1:
+            raise OperationalError("server closed the connection unexpectedly")
+
+    monkeypatch.setattr(pg, "connection", fake_connection)
+    monkeypatch.setattr(pg, "_copy_upsert", flaky_upsert)
+    monkeypatch.setattr(pg.time, "sleep", lambda s: None)
+    frame = pd.DataFrame({"coin_id": ["bitcoin"] * 3, "date_": pd.date_range("2024-01-01", periods=3, tz="UTC")})
+
+    stats = pg.insert_data(frame, chunk_size=2, max_retries=1)
+    assert stats["written"] == 3 and stats["failed"] == 0
+    assert attempts == [2, 2, 1]  # pierwsza paczka powtórzona po zerwanym połączeniu
+
+    attempts.clear()
+    stats = pg.insert_data(frame, chunk_size=3, max_retries=0)
+    assert stats["failed"] == 3 and "server closed" in stats["errors"][0]
+
+
+# ==============================
+#  READ
+# ==============================
+def test_iter_history_all_pages_with_server_cap(monkeypatch):
+    total = 25
+    seen = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        lo, hi = map(int, headers["Range"].split("-"))
+        hi = min(hi, lo + 9, total - 1)  # serwer przycina strony do 10 wierszy
+        seen.append(lo)
+        rows = [{"coin_id": "btc", "name": "Btc", "current_price": i, "total_volume": 1,
+                 "date_": f"2024-01-01T00:00:{i:02d}+00:00"} for i in range(lo, hi + 1)]
+        return FakeResponse(206, rows, {"Content-Range": f"{lo}-{hi}/{total}"})
+
+    monkeypatch.setattr(db.requests, "get", fake_get)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    pages = list(db.iter_history_all(start, start, page_size=50))
+    assert sorted(seen) == [0, 10, 20]
+    df = db.get_history_all(start, start)
+    assert list(df["price"]) == list(range(total))
+    assert {"ts", "price", "volume"} <= set(df.columns)
+    assert sum(len(p) for p in pages) == total
+
+
+def test_list_coins_and_latest_dates_read_coin_dimension(monkeypatch):
+    calls = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        calls.append((url, params))
+        return FakeResponse(200, [{"coin_id": "bitcoin", "name": "Bitcoin",
+                                   "last_date": "2024-05-01T00:00:00+00:00"}])
+
+    monkeypatch.setattr(db.requests, "get", fake_get)
+    assert list(db.list_coins()["coin_id"]) == ["bitcoin"]
+    latest = db.get_latest_dates(["bitcoin", "solana"])
+    assert latest["bitcoin"] == datetime(2024, 5, 1, tzinfo=timezone.utc)
+    assert latest["solana"] is None
+    assert all(url.endswith(f"/{db.COINS_TABLE}") for url, _ in calls)
+    assert calls[1][1]["coin_id"] == 'in.("bitcoin","solana")'
+
+
+def test_mirror_roundtrip_is_idempotent(tmp_path):
+    from db import mirror
+
+    rows = [
+        {"coin_id": c, "name": c.capitalize(), "current_price": p, "total_volume": 1.0,
+         "date_": f"2024-{m:02d}-15T00:00:00+00:00"}
+        for c, p in (("bitcoin", 100.0), ("solana", 5.0)) for m in (1, 2, 3)
+    ]
+    mirror.insert_data(rows, root=str(tmp_path))
+    mirror.insert_data(rows[:1], root=str(tmp_path))  # ponowny zapis tego samego dnia
+
+    table = mirror.read_table(datetime(2024, 2, 1, tzinfo=timezone.utc), datetime(2024, 3, 31, tzinfo=timezone.utc),
+                              coin_ids=["bitcoin"], root=str(tmp_path))
+    assert table.num_rows == 2
+    full = mirror.read_table(root=str(tmp_path))
+    assert full.num_rows == 6
+
+
+def test_history_query_pushes_down_filters_projection_and_limit(monkeypatch):
+    from db.query import HistoryQuery
+
+    seen = []
+
+    def fake_get(url, headers=None, params=None, timeout=None):
+        lo, hi = map(int, headers["Range"].split("-"))
+        seen.append((headers["Range"], dict(params)))
+        hi = min(hi, lo + 2)  # max-rows serwera: 3
+        rows = [{"date_": f"2024-01-{31 - i:02d}T00:00:00+00:00", "current_price": float(i)} for i in range(lo, hi + 1)]
+        return FakeResponse(206, rows, {"Content-Range": f"{lo}-{hi}/20"})
+
+    monkeypatch.setattr(db.requests, "get", fake_get)
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    q = HistoryQuery(start).coins(["bitcoin", "ethereum"]).select("ts", "price").order("-ts")
+    df = db.query_history(q.limit(8))
+
+    assert [r for r, _ in seen] == ["0-7", "3-5", "6-7"]  # tylko 8 wierszy przez sieć
+    params = seen[0][1]
+    assert params["select"] == "date_,current_price"
+    assert params["coin_id"] == 'in.("bitcoin","ethereum")'
+    assert params["order"] == "date_.desc,coin_id.asc"
+    assert list(df.columns) == ["ts", "price"] and len(df) == 8
+    assert df["ts"].is_monotonic_decreasing
+
+
+def test_mirror_history_query_buckets_and_projects(monkeypatch, tmp_path):
+    from db import mirror
+    from db.query import HistoryQuery
+
+    ts = pd.date_range("2024-01-01", periods=14, freq="D", tz="UTC")  # poniedziałek → dwa tygodnie
+    rows = pd.DataFrame({"coin_id": "bitcoin", "name": "Bitcoin", "current_price": np.arange(14.0),
+                         "total_volume": 1.0, "date_": ts})
+    mirror.insert_data(pd.concat([rows, rows.assign(coin_id="solana")]), root=str(tmp_path))
+    monkeypatch.setattr(mirror, "MIRROR_DIR", str(tmp_path))
+
+    weekly = mirror.query_history(HistoryQuery().coins(["bitcoin"]).select("ts", "price", "volume").bucket("week"))
+    assert list(weekly["ts"]) == [ts[0], ts[7]]
+    assert list(weekly["price"]) == [6.0, 13.0] and list(weekly["volume"]) == [7.0, 7.0]
+    last = mirror.query_history(HistoryQuery().select("coin_id", "price").order("-ts", "coin_id").limit(2))
+    assert list(last["coin_id"]) == ["bitcoin", "solana"] and list(last.columns) == ["coin_id", "price"]
+
+
+def _sql_text(query):
+    from psycopg2 import sql
+
+    if isinstance(query, sql.Composed):
+        return "".join(_sql_text(part) for part in query.seq)
+    if isinstance(query, sql.Identifier):
+        return ".".join(f'"{s}"' for s in query.strings)
+    return query.string
+
+
+def test_postgres_history_sql_buckets_and_pads_order():
+    from db import postgres as pg
+    from db.query import HistoryQuery
+
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    query, params, columns = pg._history_sql(HistoryQuery(start).coins(["bitcoin"]).select("ts", "price").bucket("week"))
+    text = _sql_text(query)
+    assert columns == ["date_", "current_price", "coin_id"]
+    assert "date_trunc(%(unit)s, date_ AT TIME ZONE 'UTC') AT TIME ZONE 'UTC' AS \"date_\"" in text
+    assert "WHERE coin_id = ANY(%(coins)s) AND date_ >= %(start)s GROUP BY coin_id, date_trunc(" in text
+    assert text.endswith('ORDER BY "date_" ASC, "coin_id" ASC')
+    assert params["unit"] == "week" and params["coins"] == ["bitcoin"]
+
+    # order() bez pól: ORDER BY nadal niepusty, LIMIT deterministyczny
+    query, params, _ = pg._history_sql(HistoryQuery().select("price").order().limit(5))
+    assert _sql_text(query).endswith('ORDER BY "date_" ASC, "coin_id" ASC LIMIT %(limit)s')
+    assert params["limit"] == 5
+
+
+# ==============================
+#  ROLLUPS
+# ==============================
+def test_update_rollups_matches_full_recompute(monkeypatch):
+    from etl import rollups
+
+    ts = pd.date_range("2024-01-01", periods=90, freq="D", tz="UTC")
+    history = pd.DataFrame({"coin_id": "bitcoin", "ts": ts,
+                            "price": [100.0 + i for i in range(90)], "volume": 1.0})
+    full = rollups.compute_rollups(history)
+    store = full[full["bucket"] < ts[60]].copy()
+    written = []
+
+    def fake_get(period, start, end, coin_ids=None, columns=None):
+        m = (store["period"] == period) & (store["bucket"] >= start) & (store["bucket"] <= end)
+        return store[m].copy()
+
+    monkeypatch.setattr(db, "get_rollups", fake_get)
+    monkeypatch.setattr(db, "insert_rollups", written.append)
+    monkeypatch.setattr(db, "query_history", _stored_history(history))
+    out = rollups.update_rollups(history.iloc[60:])
+
+    expected = full.set_index(["period", "bucket"]).loc[out.set_index(["period", "bucket"]).index]
+    got = out.set_index(["period", "bucket"])
+    for col in ["open", "close", "volume", "points", "ret", "ma_long", "vol_long"]:
+        assert (got[col].astype(float) - expected[col].astype(float)).abs().max() < 1e-9, col
+    assert written and len(written[0]) == len(out)
+
+
+def _stored_history(history):
+    """query_history nad zapisaną historią (paczka jest już w bazie przed agregatami)."""
+    def query_history(q):
+        m = (history["ts"] >= q.start) & (history["ts"] <= q.end) & history["coin_id"].isin(q.coin_ids)
+        return q.finish(history[m].rename(columns={"ts": "date_", "price": "current_price", "volume": "total_volume"}))
+    return query_history
+
+
+def test_update_rollups_rebuilds_partially_loaded_buckets(monkeypatch):
+    from etl import rollups
+
+    ts = pd.date_range("2024-01-01", periods=72, freq="h", tz="UTC")
+    history = pd.DataFrame({"coin_id": "bitcoin", "ts": ts,
+                            "price": [100.0 + (i * 7) % 13 for i in range(72)], "volume": 1.0})
+    full = rollups.compute_rollups(history)
+    # zapisane agregaty sprzed ostatniego dnia
+    store = full[(full["period"] == "day") & (full["bucket"] < ts[48])].copy()
+
+    def fake_get(period, start, end, coin_ids=None, columns=None):
+        m = (store["period"] == period) & (store["bucket"] >= start) & (store["bucket"] <= end)
+        return store[m].copy()
+
+    monkeypatch.setattr(db, "get_rollups", fake_get)
+    monkeypatch.setattr(db, "insert_rollups", lambda df: None)
+    monkeypatch.setattr(db, "query_history", _stored_history(history))
+    # ponowienie wgrywa tylko 2 ostatnie godziny – dzień, tydzień i miesiąc mimo to kompletne
+    out = rollups.update_rollups(history.iloc[-2:]).set_index(["period", "bucket"])
+
+    expected = full.set_index(["period", "bucket"]).loc[out.index]
+    for col in ["open", "high", "low", "close", "volume", "points"]:
+        np.testing.assert_allclose(out[col].astype(float), expected[col].astype(float), err_msg=col)
+    assert out.loc[("day", ts[48]), "points"] == 24
+
+
+# ==============================
+#  ANALYTICS
+# ==============================
+def test_analysis_matches_pandas_reference():
+    from etl.analytics import Analysis
+
+    rng = np.random.default_rng(0)
+    ts = pd.date_range("2024-01-01", periods=60, freq="D", tz="UTC")
+    frames = []
+    for i, coin in enumerate(["a", "b", "c"]):
+        prices = 100 * np.cumprod(1 + rng.normal(0, 0.02, len(ts)))
+        keep = slice(i * 5, None)  # monety startują w różnych dniach
+        frames.append(pd.DataFrame({"coin_id": coin, "ts": ts[keep], "price": prices[keep]}))
+    df = pd.concat(frames, ignore_index=True)
+
+    an = Analysis(df)
+    pivot = df.pivot(index="ts", columns="coin_id", values="price")
+    rets = pivot.pct_change()
+    np.testing.assert_allclose(an.corr().to_numpy(), rets.corr().to_numpy(), atol=1e-10)
+    np.testing.assert_allclose(an.cum_returns, ((1 + rets).cumprod() - 1).to_numpy(), atol=1e-10)
+    rr = an.risk_return().set_index("coin_id")
+    np.testing.assert_allclose(rr["volatility"], rets.std().to_numpy(), atol=1e-12)
+    norm = an.index100_long()
+    assert norm.groupby("coin_id")["price_norm"].first().eq(100).all()
+
+
+def test_kpis_for_all_coins_in_one_pass():
+    from etl.analytics import kpis
+
+    now = datetime(2024, 3, 1, tzinfo=timezone.utc)
+    ts = pd.date_range(end=now, periods=40, freq="D")
+    df = pd.concat([
+        pd.DataFrame({"coin_id": "a", "ts": ts, "price": np.arange(40, dtype=float)}),
+        pd.DataFrame({"coin_id": "b", "ts": ts[:5], "price": 1.0}),
+    ])
+    out = kpis(df, now).set_index("coin_id")
+    assert out.loc["a", "cur"] == 39
+    assert out.loc["a", "avg7"] == np.mean(np.arange(32, 40))
+    assert out.loc["a", "avg30"] == np.mean(np.arange(9, 40))
+    assert np.isnan(out.loc["b", "avg30"])
+
+
+def test_blocked_correlation_rolling_and_structure():
+    from etl.correlation import CorrelationCache, correlate, corr_blocked, fingerprint, rolling_corr
+
+    rng = np.random.default_rng(2)
+    factor = rng.normal(0, 0.02, (120, 2))
+    # dwie grupy monet: 0-4 podążają za pierwszym czynnikiem, 5-9 za drugim
+    rets = np.repeat(factor, 5, axis=1) + rng.normal(0, 0.01, (120, 10))
+    rets[rng.random(rets.shape) < 0.05] = np.nan
+    ref = pd.DataFrame(rets).corr()
+
+    np.testing.assert_allclose(corr_blocked(rets, block=3), ref.to_numpy(), atol=1e-5)
+    roll = rolling_corr(rets, [(0, 7)], window=20)[:, 0]
+    expected = pd.Series(rets[:, 0]).rolling(20).corr(pd.Series(rets[:, 7]))
+    np.testing.assert_allclose(roll, expected.to_numpy(), atol=1e-9)
+
+    coins = [f"c{i}" for i in range(10)]
+    res = correlate(rets, coins)
+    top = res.top_pairs(3)
+    assert top["corr"].is_monotonic_decreasing and len(top) == 3
+    assert all((int(a[1:]) < 5) == (int(b[1:]) < 5) for a, b in zip(top["coin_a"], top["coin_b"]))
+    assert res.top_pairs(1, largest=False)["corr"].iloc[0] == pytest.approx(np.nanmin(ref.to_numpy()), abs=1e-5)
+    groups = [int(c[1:]) < 5 for c in res.frame().index]
+    assert groups in ([True] * 5 + [False] * 5, [False] * 5 + [True] * 5)
+    assert res.submatrix(4).shape == (4, 4)
+
+    cache, calls = CorrelationCache(max_entries=1), []
+    for key in ("a", "a", "b", "a"):
+        cache.get(key, lambda: calls.append(key))
+    assert calls == ["a", "b", "a"]
+    expiring = CorrelationCache(ttl=0)
+    expiring.get("a", lambda: calls.append("x")), expiring.get("a", lambda: calls.append("x"))
+    assert calls[-2:] == ["x", "x"]
+    assert fingerprint(rets) == fingerprint(rets.copy()) != fingerprint(rets[:-1])
+
+
+# ==============================
+#  INDICATORS
+# ==============================
+def test_incremental_indicators_match_full_replay(monkeypatch):
+    from etl import indicators
+
+    rng = np.random.default_rng(1)
+    ts = pd.date_range("2024-01-01", periods=120, freq="D", tz="UTC")
+    price = pd.Series(100 * np.cumprod(1 + rng.normal(0, 0.02, len(ts))))
+    history = pd.DataFrame({"coin_id": "a", "ts": ts, "price": price})
+
+    store = {}
+    monkeypatch.setattr(db, "get_indicator_state", lambda ids: {c: store[c] for c in ids if c in store})
+    monkeypatch.setattr(db, "save_indicator_state", store.update)
+    monkeypatch.setattr(db, "insert_indicators", lambda df: None)
+    monkeypatch.setattr(db, "query_history", lambda q: q.finish(None))  # pusta baza przed pierwszym ładowaniem
+
+    indicators.update_indicators(history.iloc[:100])
+    # drugi przebieg zawiera też stare punkty – powinny zostać pominięte
+    new = indicators.update_indicators(history.iloc[90:])
+    assert len(new) == 20
+
+    ref = price.rolling(30, min_periods=1).mean().iloc[100:]
+    np.testing.assert_allclose(new["sma30"], ref, rtol=1e-12)
+    vol = price.pct_change().rolling(30, min_periods=2).std().iloc[100:]
+    np.testing.assert_allclose(new["vol30"], vol, rtol=1e-9)
+    ema = price.ewm(span=26, adjust=False).mean().iloc[100:]
+    np.testing.assert_allclose(new["ema26"], ema, rtol=1e-12)
+
+
+def test_indicators_without_state_seed_from_stored_history(monkeypatch):
+    from etl import indicators
+
+    rng = np.random.default_rng(2)
+    ts = pd.date_range("2024-01-01", periods=120, freq="D", tz="UTC")
+    price = pd.Series(100 * np.cumprod(1 + rng.normal(0, 0.02, len(ts))))
+    history = pd.DataFrame({"coin_id": "a", "ts": ts, "price": price})
+
+    store, queries = {}, []
+
+    def query_history(q):
+        queries.append(q)
+        rows = history[(history["ts"] >= q.start) & (history["ts"] <= q.end)].iloc[:-2]
+        return q.finish(rows.rename(columns={"ts": "date_", "price": "current_price"}))
+
+    monkeypatch.setattr(db, "get_indicator_state", lambda ids: {c: store[c] for c in ids if c in store})
+    monkeypatch.setattr(db, "save_indicator_state", store.update)
+    monkeypatch.setattr(db, "insert_indicators", lambda df: None)
+    monkeypatch.setattr(db, "query_history", query_history)
+
+    # pierwsze przyrostowe uruchomienie po wdrożeniu: 2 nowe punkty, brak stanu
+    new = indicators.update_indicators(history.iloc[-2:])
+    assert len(new) == 2 and queries[0].coin_ids == ["a"]
+    ref = indicators.compute_indicators(history).iloc[-2:].reset_index(drop=True)
+    pd.testing.assert_frame_equal(new, ref)
+    assert len(store["a"]["prices"]) == 30
+
+    # stan już jest – kolejna paczka nie czyta historii
+    indicators.update_indicators(history.iloc[-1:])
+    assert len(queries) == 1
+
+
+# ==============================
+#  INTRADAY BACKFILL
+# ==============================
+def test_backfill_resumes_from_last_completed_window(monkeypatch, tmp_path):
+    hour = 3_600_000
+
+    def fake_get_json(url, params, bucket, max_retries=None):
+        lo, hi = params["from"] * 1000, params["to"] * 1000
+        # punkty co 30 min z lekkim przesunięciem – wyrównane do siatki godzinowej
+        pts = [[t + 60_000, 1.0] for t in range(lo, hi + hour, hour // 2)]
+        return {"prices": pts, "total_volumes": pts}
+
+    written, fail_at = [], {"n": 1}
+
+    def fake_insert(rows, table=None):
+        if len(written) == fail_at["n"]:
+            fail_at["n"] = None
+            return {"failed": len(rows), "errors": ["boom"]}
+        written.append((table, rows["date_"].tolist()))
+        return {"failed": 0}
+
+    monkeypatch.setattr(fd, "_get_json", fake_get_json)
+    monkeypatch.setattr(bf, "insert_data", fake_insert)
+    partitions = []
+    monkeypatch.setattr(bf, "ensure_partitions", lambda lo, hi, tables: partitions.append((lo, tables)))
+    state = str(tmp_path / "state.json")
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    end = datetime(2024, 3, 1, tzinfo=timezone.utc)  # 60 dni → 2 okna po 30 dni
+
+    with_error = bf.backfill(["bitcoin"], start, end, "hourly", rate_per_min=6000, state_path=state)
+    assert with_error == {} and len(written) == 1  # drugie okno nie zapisane
+
+    bf.backfill(["bitcoin"], start, end, "hourly", rate_per_min=6000, state_path=state)
+    dates = [d for _, ds in written for d in ds]
+    assert {t for t, _ in written} == {"crypto_prices_hourly"}
+    assert len(dates) == len(set(dates)) == 60 * 24
+    assert bf.load_checkpoints(state)["hourly"]["bitcoin"] == [[start.isoformat(), end.isoformat()]]
+    assert partitions[0] == (start, ["crypto_prices_hourly"])
+
+    # wcześniejszy zakres po późniejszym – pobierana jest tylko niepokryta część
+    earlier = datetime(2023, 12, 1, tzinfo=timezone.utc)
+    written.clear()
+    bf.backfill(["bitcoin"], earlier, end, "hourly", rate_per_min=6000, state_path=state)
+    assert len([d for _, ds in written for d in ds]) == 31 * 24
+    assert bf.covered_ranges("hourly", "bitcoin", state) == [(earlier, end)]
+
+
+# ==============================
+#  LOCAL API STAND-INS
+# ==============================
+def test_etl_roundtrip_against_local_stubs(monkeypatch):
+    from benchmarks.stubs import CoinGeckoStub, Faults, PostgRESTStub
+
+    cg = CoinGeckoStub(faults=Faults(p429=0.3, retry_after=0, seed=3)).start()
+    rest = PostgRESTStub(max_rows=7).start()
+    try:
+        monkeypatch.setattr(fd, "COINGECKO_BASE", cg.url + "/api/v3/")
+        monkeypatch.setattr(db, "SUPABASE_URL", rest.url)
+        monkeypatch.setattr(fd, "_update_derived", lambda batch: None)
+
+        batch = fd.fetch_data(["bitcoin", "ethereum"], days_back=10, rate_per_min=6000)
+        assert len(batch) == 22 and len(rest.tables["crypto_prices"]) == 22
+
+        end = datetime.now(timezone.utc)
+        hist = db.get_history_all(end - pd.Timedelta(days=30), end)
+        assert len(hist) == 22 and hist["ts"].is_monotonic_increasing
+        assert set(db.list_coins()["coin_id"]) == {"bitcoin", "ethereum"}
+    finally:
+        cg.stop()
+        rest.stop()
+    assert cg.stats.summary()["injected_429"] > 0
+
+
+def test_snapshot_leaves_history_high_water_mark_and_prices(monkeypatch):
+    from benchmarks.stubs import DAY_MS, CoinGeckoStub, PostgRESTStub
+
+    now = int(time.time() * 1000)
+    cg = CoinGeckoStub(universe=600, now_ms=now - 10 * DAY_MS).start()
+    rest = PostgRESTStub().start()
+    try:
+        monkeypatch.setattr(fd, "COINGECKO_BASE", cg.url + "/api/v3/")
+        monkeypatch.setattr(db, "SUPABASE_URL", rest.url)
+        monkeypatch.setattr(fd, "_update_derived", lambda batch: None)
+
+        fd.fetch_data(["coin0001"], days_back=3, rate_per_min=6000)  # historia sprzed 10 dni
+        before = db.get_latest_dates(["coin0001"])
+        cg.now_ms = None
+        sent = cg.stats.summary()["requests"]
+
+        snap = fd.fetch_snapshot(top=1000, rate_per_min=6000)
+        assert len(snap) == 600 and cg.stats.summary()["requests"] - sent == 3
+        assert list(snap.columns) == fd.SNAPSHOT_COLUMNS and snap["market_cap"].notna().all()
+        assert len(rest.tables["coin_snapshots"]) == 600
+        assert db.get_latest_dates(["coin0001"]) == before
+
+        fd.fetch_data(["coin0001"], rate_per_min=6000, incremental=True)
+        dates = rest.frame("crypto_prices").sort_values("date_")["date_"]
+        today = pd.Timestamp.now(tz="UTC").floor("D")
+        assert list(dates) == list(pd.date_range(today - pd.Timedelta(days=13), today, freq="D"))
+        assert "market_cap" not in rest.frame("crypto_prices").columns
+        stored = db.get_snapshots(["coin0001"]).iloc[0]
+        assert stored["market_cap"] == snap.set_index("coin_id").loc["coin0001", "market_cap"]
+    finally:
+        cg.stop()
+        rest.stop()
+
+
+# ==============================
+#  METRICS
+# ==============================
+def test_metrics_record_retries_and_export(monkeypatch, tmp_path):
+    from etl.metrics import METRICS, Metrics, cache_miss, track_cache
+
+    METRICS.reset()
+    responses = [FakeResponse(429, headers={"Retry-After": "0"}), FakeResponse(200, {"prices": []})]
+    monkeypatch.setattr(fd.requests, "get", lambda *a, **k: responses.pop(0))
+    fd._get_json("http://x/coins/bitcoin/market_chart", {}, TokenBucket(rate=1000), max_retries=2)
+    prom = METRICS.prometheus()
+    assert 'crypto_etl_http_retries_total{reason="429",source="coingecko"} 1' in prom
+    assert 'crypto_etl_http_request_seconds_count{endpoint="market_chart",source="coingecko"} 2' in prom
+
+    m = Metrics()
+    store = {}
+
+    @track_cache("f", metrics=m)
+    def cached(x):
+        if x in store:
+            return store[x]
+        cache_miss()
+        store[x] = x * 2
+        return store[x]
+
+    cached(1), cached(1), cached(2)
+    report = m.export("dash", str(tmp_path))
+    counts = {c["labels"]["result"]: c["value"] for c in report["counters"]}
+    assert counts == {"hit": 1, "miss": 2}
+    assert (tmp_path / "dash.prom").read_text().count("# TYPE") == 2
+
+
+# ==============================
+#  PIPELINE
+# ==============================
+def test_pipeline_resumes_failed_tasks_from_checkpoints(monkeypatch, tmp_path):
+    fetched, loaded, finalized = [], [], []
+
+    def fake_fetch(coin, days_back, bucket):
+        fetched.append(coin)
+        ts = np.arange(3, dtype="int64") * 86_400_000
+        return fd._frame_from_chart(coin, ts, np.ones(3), np.ones(3))
+
+    def fake_insert(frame):
+        coin = frame["coin_id"].iloc[0]
+        if coin == "b" and "b-failed" not in loaded:
+            loaded.append("b-failed")
+            return {"written": 0, "failed": len(frame), "errors": ["boom"]}
+        loaded.append(coin)
+        return {"written": len(frame), "failed": 0, "errors": []}
+
+    monkeypatch.setattr(fd, "_fetch_coin", fake_fetch)
+    monkeypatch.setattr(pl, "insert_data", fake_insert)
+    monkeypatch.setattr(pl, "refresh_coins", lambda ids: None)
+    monkeypatch.setattr(pl, "ensure_partitions", lambda *args: 0)
+    monkeypatch.setattr(pl, "update_rollups", lambda history: finalized.extend(history["coin_id"].unique()) or [])
+    monkeypatch.setattr(pl, "update_indicators", lambda history: [])
+    kwargs = dict(run_id="r1", incremental=False, rate_per_min=6000, root=str(tmp_path))
+
+    first = pl.run_pipeline(["a", "b", "c"], **kwargs)
+    assert set(first["failed"]) == {"b"}
+    assert sorted(finalized) == ["a", "c"]
+
+    second = pl.run_pipeline(["a", "b", "c"], **kwargs)
+    assert second["failed"] == {} and second["rows"] == 9
+    assert sorted(fetched) == ["a", "b", "c"]  # "b" nie jest pobierane ponownie – tylko zapis
+    assert sorted(finalized) == ["a", "b", "c"]
+    # po finalize zostają same znaczniki; starsze ukończone uruchomienia są usuwane
+    assert not list((tmp_path / "r1").glob("*.parquet")) and (tmp_path / "r1" / "finalize.done").exists()
+    for run_id in ["r0", "q9"]:
+        pl.Checkpoints(run_id, str(tmp_path)).mark(pl.FINALIZE)
+    pl.Checkpoints("a0", str(tmp_path))  # nieukończone – do wznowienia
+    assert pl.prune_runs(str(tmp_path), keep=1) == ["q9", "r0"]
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["a0", "r1"]
+
+
+def test_pipeline_retries_finalize_after_derived_failure(monkeypatch, tmp_path):
+    updated = []
+
+    def flaky_indicators(history):
+        if not updated:
+            updated.append("failed")
+            raise RuntimeError("boom")
+        updated.extend(history["coin_id"].unique())
+        return []
+
+    monkeypatch.setattr(fd, "_fetch_coin", lambda coin, days_back, bucket: fd._frame_from_chart(
+        coin, np.arange(3, dtype="int64") * 86_400_000, np.ones(3), np.ones(3)))
+    monkeypatch.setattr(pl, "insert_data", lambda frame: {"written": len(frame), "failed": 0, "errors": []})
+    monkeypatch.setattr(pl, "refresh_coins", lambda ids: None)
+    monkeypatch.setattr(pl, "ensure_partitions", lambda *args: 0)
+    monkeypatch.setattr(pl, "update_rollups", lambda history: [])
+    monkeypatch.setattr(pl, "update_indicators", flaky_indicators)
+    kwargs = dict(run_id="r1", incremental=False, rate_per_min=6000, root=str(tmp_path))
+
+    with pytest.raises(RuntimeError):
+        pl.run_pipeline(["a", "b"], **kwargs)
+    assert not list((tmp_path / "r1").glob("finalize*.done"))  # nieudane finalize nie jest ukończone
+
+    assert pl.run_pipeline(["a", "b"], **kwargs)["failed"] == {}
+    assert sorted(updated[1:]) == ["a", "b"]
+
+
+def test_pipeline_task_uses_given_rate(monkeypatch, tmp_path):
+    rates = []
+    monkeypatch.setattr(pl, "PIPELINE_DIR", str(tmp_path))
+    monkeypatch.setattr(fd, "make_bucket", lambda rate=None: rates.append(rate) or TokenBucket(rate=1000))
+    monkeypatch.setattr(fd, "_fetch_coin", lambda coin, days_back, bucket: fd._frame_from_chart(
+        coin, np.zeros(1, dtype="int64"), np.ones(1), np.ones(1)))
+
+    pl.run_task("extract", "a", run_id="r1", incremental=False, rate_per_min=7.5)
+    assert rates == [7.5]